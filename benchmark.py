@@ -0,0 +1,321 @@
+"""
+Benchmark suite for the pyTanks server
+
+Times the server's hot paths in a set of seeded scenarios and prints the results as JSON:
+    gameTick/<n>tanks-<m>shells - One frame of gameManager.gameTick() for 2, 15, and 50 tanks with 0, 100, and 1000
+        shells in flight
+    startGame/<n>players - Map generation with mapPool.generateMap() and spawning in gameManager.startGame() (Every
+        sample generates its map from its own seed instead of taking one from the map pool's thread)
+    updateClients/<format> - Encoding and queueing one game state update in each update format with 15 players and
+        5 viewers
+    command/<action> - Parsing a player command with dataModels.command
+
+Every sample is set up from its own seed (seed + the sample's index) so two runs with the same args time exactly the
+same work. Each scenario is run a number of times untimed to warm up before the timed samples are taken. Times are
+in microseconds per call.
+
+Usage:
+    python benchmark.py > results.json
+
+    These command line args can be appended to change how the benchmarks are run:
+        samples=n - The number of timed samples per scenario (Default 200)
+        warmup=n - The number of untimed runs per scenario before the samples are taken (Default 20)
+        seed=n - The base seed for the scenarios (Default 1)
+        only=text - Only runs the scenarios with text in their name
+        baseline=file - Compares the p50 times to the results of an earlier run saved in file and exits with an error
+            code if any scenario is slower by more than the tolerance
+        tolerance=n - The percent slowdown allowed by baseline= (Default 25)
+
+    config.py is used as is so set useNumPy there to benchmark the NumPy shell backend.
+"""
+
+import collections
+import json
+import math
+import platform
+import random
+import sys
+import time
+
+import config
+import dataModels
+from gameLogic import collisionDetector, gameData, gameManager, mapPool, matchmaker
+from serverLogic import serverData
+
+def buildArena(tankCount, shellCount, seed, updateFormat=config.server.updateFormats.json, viewerCount=0):
+    """
+    Sets up an arena with a game in progress
+        The walls come from mapPool.generateMap(). The tanks are put at random spots clear of the walls and each
+        other but without startGame()'s spawn padding so up to 50 of them fit on the map. Every other tank is moving
+        and each one has a fire command queued. The shells start at random spots clear of the walls.
+
+        The clients are registered with serverData so closeArena() must be called once the arena isn't needed.
+    :param updateFormat: The update format of the clients
+    :param viewerCount: The number of viewers to add (Their clientIDs start at 1000)
+    """
+    random.seed(seed)
+    anArena = dataModels.arena("benchmark")
+    gameManager.startGame(anArena, mapPool.generateMap(random.getrandbits(32)))
+
+    halfWidth = (config.game.map.width / 2) - config.game.tank.width
+    halfHeight = (config.game.map.height / 2) - config.game.tank.height
+
+    for clientID in range(0, tankCount):
+        player = dataModels.client(None, config.server.clientTypes.player, updateFormat)
+        tank = player.tank
+        tank.spawn()
+
+        isValidLocation = False
+        while not isValidLocation:
+            tank.x = (config.game.map.width / 2) + random.uniform(-halfWidth, halfWidth)
+            tank.y = (config.game.map.height / 2) + random.uniform(-halfHeight, halfHeight)
+            isValidLocation = True
+
+            for other in anArena.walls + [anArena.clients[otherID].tank for otherID in range(0, clientID)]:
+                if collisionDetector.hasCollided(tank.toPoly(), other.toPoly()):
+                    isValidLocation = False
+                    break
+
+        tank.heading = random.uniform(0, 2 * math.pi)
+        tank.moving = clientID % 2 == 0
+        player.incoming.push(dataModels.command(json.dumps({"action": config.server.commands.fire,
+                                                              "arg": random.uniform(0, 2 * math.pi)})))
+        matchmaker.joinArena(anArena, clientID, player)
+
+    for clientID in range(1000, 1000 + viewerCount):
+        matchmaker.joinArena(anArena, clientID, dataModels.client(None, config.server.clientTypes.viewer,
+                                                                  updateFormat))
+
+    origin = dataModels.tank()
+    while len(anArena.shells) < shellCount:
+        origin.x = random.uniform(0, config.game.map.width)
+        origin.y = random.uniform(0, config.game.map.height)
+        if anArena.wallGrid.isBlocked(origin.x, origin.y):
+            continue
+
+        heading = random.uniform(0, 2 * math.pi)
+        maxDistance = anArena.wallGrid.castRay(origin.x, origin.y, math.cos(heading), -math.sin(heading))
+        anArena.shells.append(dataModels.shell(random.randrange(0, max(tankCount, 1)), origin, heading, maxDistance))
+
+    return anArena
+
+def closeArena(anArena):
+    """
+    Removes an arena's clients from serverData
+    """
+    for clientID in anArena.clients:
+        serverData.removeClient(clientID)
+
+def drainClients(anArena):
+    """
+    Takes every message waiting to be sent to an arena's clients off their queues
+    """
+    for client in anArena.clients.values():
+        while client.nextMessage() is not None:
+            pass
+
+def gameTickScenario(tankCount, shellCount):
+    """
+    :return: The prepare function for timing one frame of gameTick()
+    """
+    def prepare(seed):
+        anArena = buildArena(tankCount, shellCount, seed)
+        return lambda: gameManager.gameTick(anArena, 1 / config.server.framesPerSecond), lambda: closeArena(anArena)
+
+    return prepare
+
+def startGameScenario(playerCount):
+    """
+    :return: The prepare function for timing generateMap() and startGame()
+    """
+    def prepare(seed):
+        random.seed(seed)
+        anArena = dataModels.arena("benchmark")
+        for clientID in range(0, playerCount):
+            anArena.clients[clientID] = dataModels.client(None, config.server.clientTypes.player)
+
+        anArena.playerCount = playerCount
+        return lambda: gameManager.startGame(anArena, mapPool.generateMap(random.getrandbits(32))), None
+
+    return prepare
+
+def updateClientsScenario(updateFormat):
+    """
+    :return: The prepare function for timing updateClients()
+        One update is sent and a frame is run before the timed update so delta clients get a delta instead of their
+        first keyframe.
+    """
+    def prepare(seed):
+        anArena = buildArena(15, 100, seed, updateFormat, viewerCount=5)
+        gameData.updateClients(anArena)
+        gameManager.gameTick(anArena, 1 / config.server.framesPerSecond)
+        drainClients(anArena)
+        return lambda: gameData.updateClients(anArena), lambda: closeArena(anArena)
+
+    return prepare
+
+def commandScenario(message):
+    """
+    :return: The prepare function for timing the parsing of a command message (Invalid commands are expected to
+        raise a ValueError)
+    """
+    def parse():
+        try:
+            dataModels.command(message)
+        except ValueError:
+            pass
+
+    return lambda seed: (parse, None)
+
+def getScenarios():
+    """
+    :return: A list of (name, prepare, batchSize) tuples for every scenario
+        prepare(seed) sets up a sample and returns a tuple of (run, cleanup) where run is the function to time and
+        cleanup is None or a function to call afterwards. run is called batchSize times per sample.
+    """
+    scenarios = list()
+
+    for tankCount in [2, 15, 50]:
+        for shellCount in [0, 100, 1000]:
+            scenarios.append(("gameTick/" + str(tankCount) + "tanks-" + str(shellCount) + "shells",
+                              gameTickScenario(tankCount, shellCount), 1))
+
+    for playerCount in [2, 15]:
+        scenarios.append(("startGame/" + str(playerCount) + "players", startGameScenario(playerCount), 1))
+
+    for updateFormat in [config.server.updateFormats.json, config.server.updateFormats.delta,
+                         config.server.updateFormats.binary]:
+        scenarios.append(("updateClients/" + updateFormat, updateClientsScenario(updateFormat), 1))
+
+    commands = config.server.commands
+    messages = [("fire", {"action": commands.fire, "arg": 1.25}),
+                ("turn", {"action": commands.turn, "arg": 3.5}),
+                ("go", {"action": commands.go}),
+                ("info", {"action": commands.setInfo, "arg": "A tank by someone\nSee https://github.com/JoelEager"}),
+                ("invalid", {"action": "Command_Unknown"})]
+    for name, message in messages:
+        scenarios.append(("command/" + name, commandScenario(json.dumps(message)), 100))
+
+    return scenarios
+
+def timeSample(prepare, seed, batchSize):
+    """
+    :return: The time taken per call of the sample's run function in microseconds
+    """
+    run, cleanup = prepare(seed)
+
+    start = time.perf_counter()
+    for count in range(0, batchSize):
+        run()
+    elapsed = time.perf_counter() - start
+
+    if cleanup is not None:
+        cleanup()
+
+    return elapsed / batchSize * 1e6
+
+def percentile(sortedTimes, percent):
+    """
+    :return: The nearest-rank percentile of a sorted list of times
+    """
+    rank = max(int(math.ceil(percent / 100 * len(sortedTimes))), 1)
+    return sortedTimes[rank - 1]
+
+def runScenario(prepare, batchSize, samples, warmup, seed):
+    """
+    Runs the warm-up and then the timed samples for a scenario
+    :return: A dict of the scenario's stats
+    """
+    for count in range(0, warmup):
+        timeSample(prepare, seed + count % samples, batchSize)
+
+    times = sorted([timeSample(prepare, seed + index, batchSize) for index in range(0, samples)])
+
+    return collections.OrderedDict([
+        ("p50", round(percentile(times, 50), 2)),
+        ("p99", round(percentile(times, 99), 2)),
+        ("mean", round(sum(times) / len(times), 2)),
+        ("min", round(times[0], 2)),
+        ("max", round(times[-1], 2))
+    ])
+
+def findRegressions(results, baseline, tolerance):
+    """
+    :param baseline: The JSON output of an earlier run as a dict
+    :return: A list of messages for the scenarios whose p50 is more than tolerance percent slower than in baseline
+        (Scenarios that aren't in baseline are skipped.)
+    """
+    regressions = list()
+    for name, stats in results.items():
+        oldStats = baseline.get("results", dict()).get(name)
+        if oldStats is not None and stats["p50"] > oldStats["p50"] * (1 + tolerance / 100):
+            regressions.append(name + ": p50 went from " + str(oldStats["p50"]) + " to " + str(stats["p50"]) + " us")
+
+    return regressions
+
+def main():
+    """
+    Parse the command line args, run the scenarios, and print the results
+    """
+    settings = {"samples": 200, "warmup": 20, "seed": 1, "tolerance": 25}
+    only = None
+    baselinePath = None
+
+    for arg in sys.argv[1:]:
+        key, value = arg.partition("=")[::2]
+        if key in settings:
+            try:
+                settings[key] = int(value)
+            except ValueError:
+                print("Invalid value for " + key, file=sys.stderr)
+                return 2
+        elif key == "only":
+            only = value
+        elif key == "baseline":
+            baselinePath = value
+        else:
+            print(__doc__[__doc__.index("Usage:"):].strip(), file=sys.stderr)
+            return 2
+
+    if settings["samples"] < 1:
+        print("samples must be at least 1", file=sys.stderr)
+        return 2
+
+    # Keep the new game messages out of the output
+    config.server.logLevel = 0
+
+    results = collections.OrderedDict()
+    for name, prepare, batchSize in getScenarios():
+        if only is not None and only not in name:
+            continue
+
+        print("Running " + name + "...", file=sys.stderr)
+        results[name] = runScenario(prepare, batchSize, settings["samples"], settings["warmup"], settings["seed"])
+
+    report = collections.OrderedDict([
+        ("unit", "us"),
+        ("python", platform.python_version()),
+        ("useNumPy", config.server.useNumPy),
+        ("samples", settings["samples"]),
+        ("warmup", settings["warmup"]),
+        ("seed", settings["seed"]),
+        ("results", results)
+    ])
+
+    exitCode = 0
+    if baselinePath is not None:
+        with open(baselinePath) as baselineFile:
+            regressions = findRegressions(results, json.load(baselineFile), settings["tolerance"])
+
+        report["regressions"] = regressions
+        for message in regressions:
+            print("Regression in " + message, file=sys.stderr)
+
+        if len(regressions) != 0:
+            exitCode = 1
+
+    print(json.dumps(report, indent=4))
+    return exitCode
+
+if __name__ == "__main__":
+    sys.exit(main())
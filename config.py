@@ -31,13 +31,78 @@ class server:
     ipAndPort = "localhost:9042"        # The server's IP address and port
     logLevel = 3                        # The amount of server-side logging (See the usage section of the readme)
 
+    # Where the Prometheus metrics are served over HTTP at /metrics (See serverLogic/metrics.py)
+    #   Set to None to turn them off. (This can be overridden by a command line arg too.)
+    metricsIpAndPort = "localhost:9142"
+
     framesPerSecond = 60                # The target frame rate for the frameCallback function
     fpsLogRate = 5                      # How many seconds to wait between logging the current FPS
+
+    # If True, the time spent in each phase of every frame is recorded and a summary is logged every fpsLogRate seconds
+    #   (See gameLogic/frameProfiler.py)
+    profileFrames = False
+
+    # If True, gameClock runs the game in fixed steps of 1 / framesPerSecond scheduled on absolute deadlines
+    #   Otherwise the legacy loop is used, which adjusts its sleep time to approach framesPerSecond and passes the
+    #   measured time between frames to gameTick.
+    fixedTimestep = False
+    maxCatchUpFrames = 5                # Max steps run back-to-back to catch up before the backlog is dropped
     updatesPerSecond = 10               # How many game state updates should be sent to clients each second
     timeout = 5                         # Disconnect any clients that have been unresponsive for this many seconds
 
+    # Only the newest game state update waiting to be sent to a client is kept (See client.nextMessage())
+    maxUpdatesBehind = 50               # Disconnect clients that miss this many updates in a row while sending one
+    maxQueuedMessages = 100             # Disconnect clients with this many other messages waiting to be sent
+
+    # The max number of commands a player can have waiting for the next frame (See dataModels/commandBuffer.py)
+    #   Turns and go/stops replace the waiting ones so only extra fire commands can fill it. Any past this are dropped.
+    commandBufferSize = 8
+
+    # Stores the shells in NumPy arrays so they can be moved and culled with vectorized operations (requires numpy)
+    useNumPy = False
+    collisionCellSize = 50              # Cell size in pixels for the spatial hash used to filter collision checks
+    occupancyCellSize = 5               # Cell size in pixels for the rasterized wall grid used for shell checks
+
+    deltaKeyframeInterval = 50          # Send delta clients a full keyframe after this many delta updates
+
+    # Interest management (See gameLogic/interestManager.py)
+    #   Players are only sent the other tanks and shells within this many pixels of their tank. Set to None to send
+    #   everything on the map.
+    interestRadius = None
+    interestLineOfSight = False         # Also leave out the tanks and shells hidden from the player's tank by walls
+    interestSightLinesPerUpdate = 100   # The max new line of sight checks between cells done per update
+
+    # Each arena keeps the updates sent to its viewers over this many seconds (See dataModels/snapshotRing.py)
+    #   Viewers can ask to be sent them when they connect to catch up ("?catchUp=1") or to watch the game on a delay of
+    #   up to this many seconds ("?delay=n"). Set to 0 to turn this off.
+    viewerHistorySeconds = 30
+    viewerHistoryMaxBytes = 4194304     # The max bytes of updates each arena keeps for each update format
+
+    # The directory every game is recorded to for replaying later (See gameLogic/matchRecorder.py)
+    #   Set to None to turn recording off. (This can be overridden by a command line arg too.)
+    recordingDir = None
+    recordingKeyframeInterval = 300     # Record the full game state every this many ticks
+    recordingBufferSize = 65536         # Bytes of records held in memory before they're handed off to be written
+
+    # Maps are generated ahead of time by a background thread so starting a game never stalls the game loop
+    #   (See gameLogic/mapPool.py). The pool has to be at least 1 and should be more than maxArenas so every arena can
+    #   start a game in the same frame and still leave the thread a map ahead.
+    mapPoolSize = 4
+    wallPlacementAttempts = 1000        # Tries at placing each wall before it's left out of the map
+    spawnSlotAttempts = 1000            # Tries at placing each spawn slot before a new set of walls is generated
+    mapAttempts = 20                    # Sets of walls tried before a map's spawn slots are placed without padding
+
     minPlayers = 4                      # Doesn't start a new game if there's less than this many player clients
-    maxPlayers = 15                     # Won't let additional players connect once this number has been reached
+    maxPlayers = 15                     # Won't let additional players join an arena once it has this many players
+
+    # The max number of arenas (separate games) the server hosts at once (See gameLogic/matchmaker.py)
+    #   (Every player needs a unique name from tankNames so there's never room for more players than there are names.)
+    maxArenas = 3
+
+    # The number of worker processes to run the arenas in (See serverLogic/workerPool.py)
+    #   With 0 everything runs in one process. Otherwise this process only handles the websockets and routes each
+    #   client to a worker, which hosts up to maxArenas arenas of its own.
+    workerCount = 0
 
     class apiPaths:
         apiVersion = "beta-2"          # Used to make sure the connecting player is up to date
@@ -46,10 +111,24 @@ class server:
         player = "/pyTanksAPI/" + apiVersion + "/player"
         viewer = "/pyTanksAPI/viewer"
 
+        # Opt-in paths for clients that want delta-compressed game state updates (See gameData.updateClients())
+        playerDelta = player + "/delta"
+        viewerDelta = viewer + "/delta"
+
+        # Opt-in paths for clients that want game state updates in the binary format (See binaryProtocol.py)
+        playerBinary = player + "/binary"
+        viewerBinary = viewer + "/binary"
+
     class clientTypes:
         viewer = "viewer"               # A javascript game viewing client
         player = "player"               # A python AI player client
 
+    # The formats game state updates can be sent in (Picked by the client's connection path)
+    class updateFormats:
+        json = "json"                   # The full game state as JSON
+        delta = "delta"                 # JSON with only the entities that changed since the last update
+        binary = "binary"               # The full game state in the binary format from binaryProtocol.py
+
     # String names for the commands the player can send
     class commands:
         fire = "Command_Fire"
@@ -57,9 +136,10 @@ class server:
         stop = "Command_Stop"
         go = "Command_Go"
         setInfo = "Command_Info"
+        keyframe = "Command_Keyframe"   # Asks for a full keyframe on the next update (Delta clients only)
 
         infoMaxLen = 200    # The max length for a valid info string
-        validCommands = [fire, turn, stop, go, setInfo]
+        validCommands = [fire, turn, stop, go, setInfo, keyframe]
 
     # User-facing tank names
     tankNames = [
@@ -1,8 +1,13 @@
 """
 Contains the classes used for storing and organizing game and server state
 """
+from .arena import arena
+from .broadcastChannel import broadcastChannel
 from .client import client
 from .command import command
+from .commandBuffer import commandBuffer
+from .mapLayout import mapLayout
 from .shell import shell
+from .snapshotRing import snapshotRing
 from .tank import tank
 from .wall import wall
\ No newline at end of file
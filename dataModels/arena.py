@@ -0,0 +1,55 @@
+import config
+from gameLogic.spatialHash import spatialHash
+from gameLogic.timerWheel import timerWheel
+
+class arena:
+    """
+    Stores the state of one game and the clients taking part in or watching it
+        Each arena runs its own independent game. (See gameLogic.matchmaker for how clients are assigned to them.)
+    """
+    def __init__(self, name):
+        """
+        Constructor
+        :param name: The arena's unique name (Used by clients to pick an arena in their connection path)
+        """
+        self.name = name
+
+        self.clients = dict()       # The clients in this arena keyed by clientID (Both players and viewers)
+        self.playerCount = 0        # The number of those clients that are players
+        self.ongoingGame = False    # Is there a game in progress currently?
+        self.simTime = 0            # The game time simulated in this arena so far in seconds (See gameTick())
+
+        # The timers for things like reloads, which go off on simulation time (Cleared by startGame())
+        self.timers = timerWheel(1 / config.server.framesPerSecond)
+
+        self.shells = list()        # The shells currently in flight (See gameData.newShellList())
+        self.walls = list()         # The walls on the map
+        self.mapSeed = None         # The seed the map was generated from or None for mapPool's open map
+
+        # Spatial hashes used as the broadphase for collision checks
+        self.wallHash = spatialHash(config.server.collisionCellSize)    # Filled by startGame() since walls never move
+        self.shellHash = spatialHash(config.server.collisionCellSize)   # Rebuilt by gameTick() every frame
+        self.tankHash = spatialHash(config.server.collisionCellSize)    # Rebuilt by gameTick() every frame
+
+        self.wallGrid = None        # The occupancyGrid of the walls (Built by startGame())
+
+        # Whether each pair of spatial hash cells can see each other keyed by (cellA, cellB) with cellA < cellB
+        #   (Filled in as needed by gameLogic.interestManager and cleared by startGame() since walls never move)
+        self.sightLines = dict()
+
+        self.recorder = None        # The matchRecorder.recorder for the game in progress if it's being recorded
+
+        # The recent viewer updates for each update format (See gameData.updateClients())
+        self.history = dict()
+
+    def isEmpty(self):
+        """
+        :return: A boolean indicating if there are no clients left in this arena
+        """
+        return len(self.clients) == 0
+
+    def isFull(self):
+        """
+        :return: A boolean indicating if this arena can't take any more players
+        """
+        return self.playerCount >= config.server.maxPlayers
@@ -0,0 +1,36 @@
+class broadcastChannel:
+    """
+    Used to fan a message out to many clients without copying it into each client's outgoing queue
+        Only the latest message published is kept. Each subscribed client is woken up when a new one comes in and its
+        send task picks it up from here. (See client.nextMessage())
+    """
+    def __init__(self):
+        self.latest = None          # The last message published (str or bytes, never modified once published)
+        self.sequence = 0           # Incremented every time a message is published
+        self.subscribers = dict()   # The clients receiving this channel's messages keyed by clientID
+
+    def subscribe(self, clientID, aClient):
+        """
+        Adds a client to the channel
+            The client will get the next message published but not the current one.
+        """
+        self.subscribers[clientID] = aClient
+        aClient.channel = self
+        aClient.lastSequence = self.sequence
+
+    def unsubscribe(self, clientID, aClient):
+        """
+        Removes a client from the channel
+        """
+        self.subscribers.pop(clientID, None)
+        aClient.channel = None
+
+    def publish(self, message):
+        """
+        Makes message the latest message and wakes up every subscriber
+        """
+        self.latest = message
+        self.sequence += 1
+
+        for aClient in self.subscribers.values():
+            aClient.wakeUp.set()
@@ -1,18 +1,61 @@
-from datetime import datetime
+import asyncio
+import time
+from collections import deque
 
 import config
+from .commandBuffer import commandBuffer
 from .tank import tank
 
 class client:
     """
     Used to store the info for an active client
     """
-    def __init__(self, clientSocket, clientType):
+    __slots__ = ("socket", "type", "outgoing", "pendingState", "incoming", "lastReceived", "pingDue", "pingSentAt",
+                 "pingRTT", "timedOut", "arena", "wakeUp", "channel", "lastSequence", "updatesBehind", "conflatedCount",
+                 "droppedCount", "closing", "updateFormat", "deltaBaseline", "updatesSinceKeyframe", "stringsSent",
+                 "delay", "catchUp", "tank")
+
+    def __init__(self, clientSocket, clientType, updateFormat=config.server.updateFormats.json):
         self.socket = clientSocket          # The client's websocket
         self.type = clientType              # The type of client (valid types defined in config.server.clientTypes)
-        self.outgoing = list()              # The outgoing message queue for this client
-        self.incoming = list()              # The incoming message queue for this client
-        self.lastReceived = datetime.now()  # The last time a message was received from this client
+        self.outgoing = deque()             # The outgoing queue for messages other than game state updates
+        self.pendingState = None            # The newest game state update that hasn't been sent yet (if any)
+        self.incoming = commandBuffer(config.server.commandBufferSize)     # The commands waiting for the next frame
+        self.lastReceived = time.monotonic()    # The last time a message was received from this client
+
+        # For the keep-alive checks (See wsServer.__checkTimeout())
+        self.pingDue = False                # Set when the send task should ping the client
+        self.pingSentAt = None              # When the outstanding ping was asked for (None if there isn't one)
+        self.pingRTT = None                 # The round trip time of the last ping answered in seconds (if any)
+        self.timedOut = False               # Set when a ping went unanswered so the send task should exit
+        self.arena = None                   # The name of the arena this client is in (Set by matchmaker.joinArena())
+
+        # Set whenever there's something new for the send task to send (See nextMessage())
+        self.wakeUp = asyncio.Event()
+
+        # The broadcastChannel this client gets its shared game state updates from (if any)
+        self.channel = None
+        self.lastSequence = 0               # The sequence number of the last channel message sent to this client
+
+        # Send queue stats
+        self.updatesBehind = 0              # The number of game state updates skipped in a row (See nextMessage())
+        self.conflatedCount = 0             # The total number of game state updates skipped
+        self.droppedCount = 0               # The total number of messages dropped because the client was closing
+        self.closing = False                # Set once a fatal error has been queued for the client
+
+        # The format to send game state updates in (valid formats defined in config.server.updateFormats)
+        self.updateFormat = updateFormat
+
+        # For the delta format
+        self.deltaBaseline = None           # The entity fragments in the last update sent (None forces a keyframe)
+        self.updatesSinceKeyframe = 0       # The number of delta updates sent since the last keyframe
+
+        # For the binary format
+        self.stringsSent = dict()           # The name and info strings sent so far keyed by (tankId, field)
+
+        # For viewers watching from the arena's history (See config.server.viewerHistorySeconds)
+        self.delay = 0                      # How many seconds behind the game this client's updates are
+        self.catchUp = deque()              # Past updates waiting to be sent before the client's channel's ones
 
         # Players get a tank
         if clientType == config.server.clientTypes.player:
@@ -24,14 +67,124 @@ class client:
         """
         return self.type == config.server.clientTypes.player
 
-    def receivedMsg(self):
+    def usesFormat(self, updateFormat):
         """
-        Called when a message is received to update lastReceived
+        :return: A boolean indicating if this client's updates are sent in the given format
         """
-        self.lastReceived = datetime.now()
+        return self.updateFormat == updateFormat
 
-    def hasTimedOut(self):
+    def queueMessage(self, message):
+        """
+        Appends a message to this client's outgoing queue and wakes up its send task
+            Use this for messages that must always be delivered such as errors.
         """
-        :return: A boolean indicating if this client hasn't sent a message within the timeout duration
+        if self.closing:
+            self.droppedCount += 1
+            return
+
+        self.outgoing.append(message)
+        self.wakeUp.set()
+
+    def queueState(self, message):
+        """
+        Queues a game state update for this client and wakes up its send task
+            Replaces any older update still waiting to be sent since the client only needs the newest one.
+        """
+        if self.closing:
+            self.droppedCount += 1
+            return
+
+        if self.pendingState is not None:
+            self.updatesBehind += 1
+            self.conflatedCount += 1
+
+        self.pendingState = message
+        self.wakeUp.set()
+
+    def queueFatal(self, message):
+        """
+        Drops everything waiting to be sent to this client and queues a final fatal error message
+            Nothing else will be sent after it. (The send task disconnects the client once the message goes out.)
+        """
+        if self.closing:
+            return
+
+        self.droppedCount += len(self.outgoing) + (self.pendingState is not None) + len(self.catchUp)
+        self.outgoing.clear()
+        self.pendingState = None
+        self.catchUp.clear()
+        self.outgoing.append(message)
+
+        self.closing = True
+        self.wakeUp.set()
+
+    def hasPendingState(self):
+        """
+        :return: A boolean indicating if a game state update is waiting to be sent to this client
+        """
+        return self.pendingState is not None
+
+    def queueDepth(self):
+        """
+        :return: The number of messages waiting to be sent to this client (Including any from its channel)
+        """
+        depth = len(self.outgoing) + (self.pendingState is not None) + len(self.catchUp)
+        if self.channel is not None and not self.closing and self.channel.sequence != self.lastSequence:
+            depth += 1
+
+        return depth
+
+    def isBehind(self):
+        """
+        :return: A boolean indicating if this client has fallen too far behind on its updates to keep up
+        """
+        if self.channel is not None:
+            # Channel updates are skipped without being queued so count how many the client hasn't picked up yet
+            behind = self.updatesBehind + max(self.channel.sequence - self.lastSequence - 1, 0)
+        else:
+            behind = self.updatesBehind
+
+        return behind >= config.server.maxUpdatesBehind or len(self.outgoing) >= config.server.maxQueuedMessages
+
+    def nextMessage(self):
+        """
+        Gets the next message to send to this client
+            Queued messages go first, then the pending game state update, then any past updates the client is catching
+            up on, and then the latest message from the client's channel if it hasn't been sent yet. (Any game state
+            updates that came in while the client was busy are skipped so a slow client only gets the newest one.)
+        :return: The message or None if there's nothing to send
+        """
+        if len(self.outgoing) != 0:
+            return self.outgoing.popleft()
+        elif self.closing:
+            return None
+        elif self.pendingState is not None:
+            message = self.pendingState
+            self.pendingState = None
+            self.updatesBehind = 0
+            return message
+        elif len(self.catchUp) != 0:
+            # Skip the channel's updates while catching up so the client only gets the newest one once it's done
+            if self.channel is not None and self.channel.sequence - self.lastSequence > 1:
+                self.conflatedCount += self.channel.sequence - self.lastSequence - 1
+                self.lastSequence = self.channel.sequence - 1
+
+            return self.catchUp.popleft()
+        elif self.channel is not None and self.channel.sequence != self.lastSequence:
+            self.conflatedCount += self.channel.sequence - self.lastSequence - 1
+            self.lastSequence = self.channel.sequence
+            return self.channel.latest
+        else:
+            return None
+
+    def requestKeyframe(self):
+        """
+        Makes the next update sent to this client a full keyframe
+        """
+        self.deltaBaseline = None
+
+    def receivedMsg(self):
+        """
+        Called when a message is received to update lastReceived
         """
-        return (datetime.now() - self.lastReceived).total_seconds() > config.server.timeout
\ No newline at end of file
+        self.lastReceived = time.monotonic()
\ No newline at end of file
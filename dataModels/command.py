@@ -1,4 +1,5 @@
 import json
+import math
 import numbers
 import html
 
@@ -28,7 +29,10 @@ class command:
 
         # Check for a valid arg if it's required
         if self.action == config.server.commands.turn or self.action == config.server.commands.fire:
-            if not isinstance(message.get("arg"), numbers.Number):
+            # (Booleans and NaN or infinite values aren't valid numbers for these since the arg ends up in the game
+            #   state updates. See dataModels.fieldLayout)
+            arg = message.get("arg")
+            if isinstance(arg, bool) or not isinstance(arg, numbers.Real) or not -math.inf < arg < math.inf:
                 raise ValueError("Missing or invalid arg")
 
             self.arg = message["arg"]
@@ -0,0 +1,62 @@
+import config
+
+class commandBuffer:
+    """
+    Holds a player's commands until the next frame applies them (See gameManager.gameTick())
+        Commands that only set state are coalesced as they come in: a new Command_Turn replaces any waiting turn and
+        a new Command_Go or Command_Stop replaces any waiting go or stop. Fire commands are kept in order. The buffer
+        has a fixed number of slots so once it's full any more commands are dropped until the next frame empties it.
+    """
+    # The commands that replace each other (Fire commands aren't listed since each one is kept)
+    __coalesceKeys = {
+        config.server.commands.turn: "turn",
+        config.server.commands.go: "move",
+        config.server.commands.stop: "move"
+    }
+
+    def __init__(self, capacity):
+        """
+        Constructor
+        :param capacity: The max number of commands that can be waiting at once
+        """
+        self.slots = [None] * capacity
+        self.count = 0              # The number of slots in use
+
+        self.coalescedCount = 0     # The total number of commands replaced by newer ones
+        self.droppedCount = 0       # The total number of commands dropped because the buffer was full
+
+    def push(self, command):
+        """
+        Adds a command to the buffer, replacing a waiting one of the same kind if there is one
+        :return: False if the buffer was full and the command had to be dropped and True otherwise
+        """
+        key = commandBuffer.__coalesceKeys.get(command.action)
+        if key is not None:
+            for index in range(0, self.count):
+                if commandBuffer.__coalesceKeys.get(self.slots[index].action) == key:
+                    self.slots[index] = command
+                    self.coalescedCount += 1
+                    return True
+
+        if self.count == len(self.slots):
+            self.droppedCount += 1
+            return False
+
+        self.slots[self.count] = command
+        self.count += 1
+        return True
+
+    def drain(self):
+        """
+        Empties the buffer
+        :return: A list of the commands that were waiting in the order they were added
+        """
+        commands = self.slots[:self.count]
+        for index in range(0, self.count):
+            self.slots[index] = None
+
+        self.count = 0
+        return commands
+
+    def __len__(self):
+        return self.count
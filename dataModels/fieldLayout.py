@@ -0,0 +1,85 @@
+import json
+import operator
+from json.encoder import encode_basestring_ascii
+
+class fieldLayout:
+    """
+    A precomputed list of the public fields of a data model used to serialize it (See tank.toJSON() for an example)
+        The JSON is written straight into a format string built once per layout instead of copying the object into a
+        dict and encoding that. The output is the same as json.dumps() with separators=(',', ':') gives for the
+        equivalent dict as long as every number field holds a finite int or float. (dataModels.command makes sure of
+        that for the values that come from players.)
+    """
+    # The kinds of fields
+    number = "number"
+    boolean = "boolean"
+    string = "string"
+
+    # The format string placeholder and value conversion (if any) for each kind
+    __formats = {
+        number: ("%r", None),
+        boolean: ("%s", lambda value: "true" if value else "false"),
+        string: ("%s", encode_basestring_ascii)
+    }
+
+    # For the extra fields passed to toJSON()
+    __encoder = json.JSONEncoder(separators=(',', ':'))
+
+    def __init__(self, *fields):
+        """
+        Constructor
+        :param fields: Each field in the order it's serialized as a tuple of (name, kind)
+        """
+        self.fields = fields
+        self.names = tuple([name for name, kind in fields])
+
+        self.__getValues = operator.attrgetter(*self.names)
+        self.__conversions = list()     # The (index, function) for each value that has to be converted first
+
+        placeholders = list()
+        for index in range(0, len(fields)):
+            name, kind = fields[index]
+            placeholder, conversion = fieldLayout.__formats[kind]
+
+            placeholders.append(encode_basestring_ascii(name) + ":" + placeholder)
+            if conversion is not None:
+                self.__conversions.append((index, conversion))
+
+        self.__template = "{" + ",".join(placeholders) + "}"
+
+    def extend(self, *fields):
+        """
+        :return: A new layout with the given fields added after this one's (Takes the same args as the constructor)
+        """
+        return fieldLayout(*(self.fields + fields))
+
+    def values(self, obj):
+        """
+        :return: A tuple of obj's values for this layout's fields
+        """
+        values = self.__getValues(obj)
+        return values if len(self.names) != 1 else (values,)
+
+    def toDict(self, obj):
+        """
+        :return: A new dict of obj's values for this layout's fields
+        """
+        return dict(zip(self.names, self.values(obj)))
+
+    def toJSON(self, obj, extra=None):
+        """
+        :param extra: A dict of any more fields to add after the layout's ones
+        :return: The compact JSON object of obj's values for this layout's fields
+        """
+        values = self.values(obj)
+        if len(self.__conversions) != 0:
+            values = list(values)
+            for index, conversion in self.__conversions:
+                values[index] = conversion(values[index])
+            values = tuple(values)
+
+        message = self.__template % values
+        if extra:
+            message = message[:-1] + "," + fieldLayout.__encoder.encode(extra)[1:]
+
+        return message
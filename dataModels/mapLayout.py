@@ -0,0 +1,37 @@
+import random
+
+class mapLayout:
+    """
+    A pre-generated map made up of its walls and the spots tanks can be spawned at (See gameLogic.mapPool)
+    """
+    __slots__ = ("seed", "walls", "wallGrid", "spawnSlots")
+
+    def __init__(self, seed, walls, wallGrid, spawnSlots):
+        """
+        Constructor
+        :param seed: The seed the map was generated from (gameLogic.mapPool.generateMap(seed) gives the same map) or
+            None for mapPool's open map
+        :param walls: A list of the map's dataModels.wall objects
+        :param wallGrid: The gameLogic.occupancyGrid of the walls
+        :param spawnSlots: A list of (x, y) tank positions that are clear of the walls and far enough from each other
+            that any of them can be used together
+        """
+        self.seed = seed
+        self.walls = walls
+        self.wallGrid = wallGrid
+        self.spawnSlots = spawnSlots
+
+    def takeSpawnSlot(self):
+        """
+        Removes a random spawn slot from the layout
+            The slot is swapped with the last one before it's removed so this doesn't depend on the number of slots.
+        :return: The (x, y) of the slot
+        :raise: IndexError if every slot has been taken
+        """
+        if len(self.spawnSlots) == 0:
+            raise IndexError("Every spawn slot has been taken")
+
+        index = random.randrange(0, len(self.spawnSlots))
+        slots = self.spawnSlots
+        slots[index], slots[-1] = slots[-1], slots[index]
+        return slots.pop()
@@ -1,29 +1,89 @@
+import itertools
 import math
 
 import config
+from .fieldLayout import fieldLayout
 
 class shell:
     """
     Stores the state data for a shell in flight
     """
-    def __init__(self, tankId, tankObj, heading):
+    collisionShape = "point"    # Shells are small enough to be treated as points (See collisionDetector.collide())
+    __ids = itertools.count()   # Source of unique shell ids
+
+    __slots__ = ("shooterId", "x", "y", "heading", "__id", "__lastX", "__lastY", "__distanceLeft")
+
+    # The fields sent in game state updates
+    layout = fieldLayout(("shooterId", fieldLayout.number), ("x", fieldLayout.number), ("y", fieldLayout.number),
+                         ("heading", fieldLayout.number))
+
+    def __init__(self, tankId, tankObj, heading, maxDistance=math.inf):
         """
         Constructor
         :param tankId: The clientID of the tank that shot the shell
         :param tankObj: That tank's object
         :param heading: The shell's heading
+        :param maxDistance: How far the shell can travel before it hits a wall or leaves the map
+            (See occupancyGrid.castRay())
         """
         self.shooterId = tankId     # The id of the tank that shot it
         self.x = tankObj.x          # Current x position
         self.y = tankObj.y          # Current y position
         self.heading = heading      # Heading in radians from the +x axis
 
+        self.__id = next(shell.__ids)       # Identifies the shell in delta-compressed updates
+        self.__lastX = self.x               # The position at the start of the last move (For swept collisions)
+        self.__lastY = self.y
+        self.__distanceLeft = maxDistance   # The distance left before the shell is stopped by a wall or the map edge
+
     def move(self, distance):
         """
         Moves the shell the given distance along its heading
+            The shell won't move past the point where it would be stopped. Use hasExpired() to check for that.
+        """
+        self.__lastX = self.x
+        self.__lastY = self.y
+
+        step = min(distance, self.__distanceLeft)
+        self.x += math.cos(self.heading) * step
+        self.y -= math.sin(self.heading) * step
+        self.__distanceLeft -= distance
+
+    def getId(self):
+        """
+        :return: The shell's unique id
+        """
+        return self.__id
+
+    def distanceLeft(self):
+        """
+        :return: The distance the shell can still travel before it hits a wall or leaves the map
+        """
+        return self.__distanceLeft
+
+    def hasExpired(self):
+        """
+        :return: True if the shell has reached a wall or the edge of the map
         """
-        self.x += math.cos(self.heading) * distance
-        self.y -= math.sin(self.heading) * distance
+        return self.__distanceLeft <= 0
+
+    def toPath(self):
+        """
+        :return: The path the shell took during its last move as a tuple of (startX, startY, endX, endY)
+        """
+        return self.__lastX, self.__lastY, self.x, self.y
+
+    def toDict(self):
+        """
+        :return: A dictionary of the shell's public data
+        """
+        return shell.layout.toDict(self)
+
+    def toJSON(self):
+        """
+        :return: The shell's public data as a compact JSON object
+        """
+        return shell.layout.toJSON(self)
 
     def toPoly(self):
         """
@@ -35,4 +95,14 @@ class shell:
         return [(self.x - halfWidth, self.y - halfHeight),
                 (self.x + halfWidth, self.y - halfHeight),
                 (self.x + halfWidth, self.y + halfHeight),
-                (self.x - halfWidth, self.y + halfHeight)]
\ No newline at end of file
+                (self.x - halfWidth, self.y + halfHeight)]
+
+    def toBounds(self):
+        """
+        :return: The axis-aligned bounding box of the path the shell took during its last move as a tuple of
+            (minX, minY, maxX, maxY)
+        """
+        halfWidth = config.game.shell.width / 2
+        halfHeight = config.game.shell.height / 2
+        return (min(self.x, self.__lastX) - halfWidth, min(self.y, self.__lastY) - halfHeight,
+                max(self.x, self.__lastX) + halfWidth, max(self.y, self.__lastY) + halfHeight)
@@ -0,0 +1,80 @@
+class snapshotRing:
+    """
+    Keeps the game state updates sent to an arena's viewers over the last few seconds (See gameData.updateClients())
+        Each update is stored once as the same str or bytes object that was published so viewers catching up or
+        watching on a delay share it. The ring has a fixed number of slots and the oldest updates are dropped once
+        they're older than maxAge or the updates kept add up to more than maxBytes. (The newest update is always kept.)
+    """
+    def __init__(self, maxAge, maxBytes, capacity):
+        """
+        Constructor
+        :param maxAge: How long to keep updates for in seconds
+        :param maxBytes: The max total size of the updates kept
+        :param capacity: The max number of updates kept
+        """
+        self.maxAge = maxAge
+        self.maxBytes = maxBytes
+
+        self.slots = [None] * capacity  # The updates as (time, message) tuples (The oldest is in slots[start])
+        self.start = 0
+        self.count = 0                  # The number of slots in use
+        self.totalBytes = 0             # The total size of the updates kept
+
+    def __at(self, index):
+        """
+        :return: The (time, message) tuple of the index-th oldest update
+        """
+        return self.slots[(self.start + index) % len(self.slots)]
+
+    def __dropOldest(self):
+        self.totalBytes -= len(self.slots[self.start][1])
+        self.slots[self.start] = None
+        self.start = (self.start + 1) % len(self.slots)
+        self.count -= 1
+
+    def append(self, now, message):
+        """
+        Adds an update and drops any that are too old or past the memory cap
+        :param now: The time the update was sent in seconds (Any clock as long as it's consistent)
+        """
+        if self.count == len(self.slots):
+            self.__dropOldest()
+
+        self.slots[(self.start + self.count) % len(self.slots)] = (now, message)
+        self.count += 1
+        self.totalBytes += len(message)
+
+        while self.count > 1 and (self.__at(0)[0] < now - self.maxAge or self.totalBytes > self.maxBytes):
+            self.__dropOldest()
+
+    def __countUntil(self, until):
+        """
+        :return: The number of updates sent at or before until
+        """
+        # (Binary search since the updates are in the order they were sent)
+        low = 0
+        high = self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.__at(middle)[0] <= until:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def latestAt(self, until):
+        """
+        :return: The newest update sent at or before until or None if there isn't one
+        """
+        count = self.__countUntil(until)
+        return self.__at(count - 1)[1] if count != 0 else None
+
+    def messages(self, until):
+        """
+        :return: A list of the updates sent at or before until, oldest first
+        """
+        return [self.__at(index)[1] for index in range(0, self.__countUntil(until))]
+
+    def __len__(self):
+        return self.count
@@ -1,13 +1,23 @@
-import datetime
 import math
-import copy
 
 import config
+from .fieldLayout import fieldLayout
 
 class tank:
     """
     Stores the state data for a tank
     """
+    collisionShape = "obb"      # Tanks are rotated rectangles (See collisionDetector.collide())
+
+    __slots__ = ("x", "y", "heading", "moving", "alive", "__loaded", "__reloadTime", "kills", "wins", "info")
+
+    # The fields sent to players for other tanks and the fields sent for a tank in full
+    #   (The loaded flag is never sent since canShoot is sent separately to the player.)
+    cleanLayout = fieldLayout(("x", fieldLayout.number), ("y", fieldLayout.number), ("heading", fieldLayout.number),
+                              ("moving", fieldLayout.boolean), ("alive", fieldLayout.boolean))
+    fullLayout = cleanLayout.extend(("kills", fieldLayout.number), ("wins", fieldLayout.number),
+                                    ("info", fieldLayout.string))
+
     def __init__(self):
         self.x = -100           # Current x position of the tank's center
         self.y = -100           # Current y position of the tank's center
@@ -15,8 +25,9 @@ class tank:
         self.moving = False     # Boolean for whether or not this tank is moving
         self.alive = False      # Boolean for whether or not this tank is alive
 
-        # The datetime of this tank's last shot
-        self.__lastShotTime = datetime.datetime.now() - datetime.timedelta(seconds=config.game.tank.reloadTime)
+        # Whether the tank's cannon is loaded (Set again by reload() once the reload timer goes off)
+        self.__loaded = True
+        self.__reloadTime = None    # The simulation time the reload timer goes off at (See didShoot())
 
         self.kills = 0          # Kills in the current round
         self.wins = 0           # Rounds won
@@ -31,7 +42,7 @@ class tank:
         self.heading = 0
         self.moving = False
         self.alive = True
-        self.__lastShotTime = datetime.datetime.now() - datetime.timedelta(seconds=config.game.tank.reloadTime)
+        self.__loaded = True
         self.kills = 0
 
     def canShoot(self):
@@ -39,13 +50,28 @@ class tank:
         Used to cap rate of fire
         :return: True if the tank can shoot, False if not
         """
-        return datetime.timedelta(seconds=config.game.tank.reloadTime) <= datetime.datetime.now() - self.__lastShotTime
+        return self.__loaded
+
+    def didShoot(self, reloadTime):
+        """
+        Called whenever a tank shoots so it can't shoot again until it has been reloaded
+            The caller is responsible for scheduling reload() config.game.tank.reloadTime seconds later.
+        :param reloadTime: The simulation time reload() was scheduled for (Kept for match recordings)
+        """
+        self.__loaded = False
+        self.__reloadTime = reloadTime
+
+    def reloadTime(self):
+        """
+        :return: The simulation time the tank will be reloaded at or None if it's already loaded
+        """
+        return None if self.__loaded else self.__reloadTime
 
-    def didShoot(self):
+    def reload(self):
         """
-        Called whenever a tank shoots so its lastShotTime can be updated
+        Called once the tank's reload time is up after a shot
         """
-        self.__lastShotTime = datetime.datetime.now()
+        self.__loaded = True
 
     def move(self, distance):
         """
@@ -59,18 +85,15 @@ class tank:
         :param doClean: True/False to indicate if the dict should be cleaned for sending to players
         :return: A dictionary of the tank's data
         """
-        myDict = copy.copy(vars(self))
-
-        # The lastShotTime should never be in a gameState update
-        del myDict["_tank__lastShotTime"]
+        return (tank.cleanLayout if doClean else tank.fullLayout).toDict(self)
 
-        # Remove info that should be hidden from players
-        if doClean:
-            del myDict["kills"]
-            del myDict["wins"]
-            del myDict["info"]
-
-        return myDict
+    def toJSON(self, doClean, extra=None):
+        """
+        :param doClean: True/False to indicate if the JSON should be cleaned for sending to players
+        :param extra: A dict of any more fields to add (See fieldLayout.toJSON())
+        :return: The tank's data as a compact JSON object
+        """
+        return (tank.cleanLayout if doClean else tank.fullLayout).toJSON(self, extra)
 
     def toPoly(self, margin=0):
         """
@@ -94,4 +117,12 @@ class tank:
             vector = poly[count]
             poly[count] = (vector[0] + self.x, vector[1] + self.y)
 
-        return poly
\ No newline at end of file
+        return poly
+
+    def toBounds(self):
+        """
+        :return: An axis-aligned box around the tank as a tuple of (minX, minY, maxX, maxY)
+            The box is built around the tank's bounding circle so it holds for any heading.
+        """
+        radius = math.sqrt(config.game.tank.width ** 2 + config.game.tank.height ** 2) / 2
+        return self.x - radius, self.y - radius, self.x + radius, self.y + radius
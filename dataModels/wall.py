@@ -1,32 +1,42 @@
-from random import randint
+import random
 
 import config
+from .fieldLayout import fieldLayout
 
 class wall:
     """
     Stores the state data for a wall on the map
     """
-    def __init__(self):
+    collisionShape = "aabb"     # Walls are axis-aligned rectangles (See collisionDetector.collide())
+
+    __slots__ = ("x", "y", "width", "height")
+
+    # The fields sent in game state updates
+    layout = fieldLayout(("x", fieldLayout.number), ("y", fieldLayout.number), ("width", fieldLayout.number),
+                         ("height", fieldLayout.number))
+
+    def __init__(self, rng=random):
         """
         Randomly generates a wall using the bounding values in config.py
+        :param rng: The random number generator to use (Python's random module or a random.Random)
         """
         # Set lengths for the long and short sides of the wall
-        longSide = randint(config.game.wall.longSideBounds[0], config.game.wall.longSideBounds[1])
-        shortSide = randint(config.game.wall.shortSideBounds[0], config.game.wall.shortSideBounds[1])
+        longSide = rng.randint(config.game.wall.longSideBounds[0], config.game.wall.longSideBounds[1])
+        shortSide = rng.randint(config.game.wall.shortSideBounds[0], config.game.wall.shortSideBounds[1])
 
         # Decide if this is going to be a tall or long wall
-        if randint(0, 2) == 0:
+        if rng.randint(0, 2) == 0:
             self.width, self.height = longSide, shortSide
-            self.x = randint(config.game.wall.placementPadding, config.game.map.width -
-                             config.game.wall.placementPadding - config.game.wall.longSideBounds[0])
-            self.y = randint(config.game.wall.placementPadding, config.game.map.height -
-                             config.game.wall.placementPadding - config.game.wall.shortSideBounds[0])
+            self.x = rng.randint(config.game.wall.placementPadding, config.game.map.width -
+                                 config.game.wall.placementPadding - config.game.wall.longSideBounds[0])
+            self.y = rng.randint(config.game.wall.placementPadding, config.game.map.height -
+                                 config.game.wall.placementPadding - config.game.wall.shortSideBounds[0])
         else:
             self.height, self.width = longSide, shortSide
-            self.y = randint(config.game.wall.placementPadding, config.game.map.height -
-                             config.game.wall.placementPadding - config.game.wall.longSideBounds[0])
-            self.x = randint(config.game.wall.placementPadding, config.game.map.width -
-                             config.game.wall.placementPadding - config.game.wall.shortSideBounds[0])
+            self.y = rng.randint(config.game.wall.placementPadding, config.game.map.height -
+                                 config.game.wall.placementPadding - config.game.wall.longSideBounds[0])
+            self.x = rng.randint(config.game.wall.placementPadding, config.game.map.width -
+                                 config.game.wall.placementPadding - config.game.wall.shortSideBounds[0])
 
         # Check to make sure the wall doesn't go too far
         if self.x + self.width > config.game.map.width - config.game.wall.placementPadding:
@@ -38,6 +48,30 @@ class wall:
         self.x += self.width / 2
         self.y += self.height / 2
 
+    @classmethod
+    def fromValues(cls, x, y, width, height):
+        """
+        Makes a wall with the given position and size instead of a random one (Doesn't use any random numbers)
+        :param x: The x coordinate of the wall's center
+        :param y: The y coordinate of the wall's center
+        :return: The new wall
+        """
+        aWall = cls.__new__(cls)
+        aWall.x, aWall.y, aWall.width, aWall.height = x, y, width, height
+        return aWall
+
+    def toDict(self):
+        """
+        :return: A dictionary of the wall's data
+        """
+        return wall.layout.toDict(self)
+
+    def toJSON(self):
+        """
+        :return: The wall's data as a compact JSON object
+        """
+        return wall.layout.toJSON(self)
+
     def toPoly(self, margin=0):
         """
         :param margin: If set the polygon will have a padding of margin pixels in every direction
@@ -48,4 +82,12 @@ class wall:
         return [(self.x - halfWidth, self.y - halfHeight),
                 (self.x + halfWidth, self.y - halfHeight),
                 (self.x + halfWidth, self.y + halfHeight),
-                (self.x - halfWidth, self.y + halfHeight)]
\ No newline at end of file
+                (self.x - halfWidth, self.y + halfHeight)]
+
+    def toBounds(self):
+        """
+        :return: The wall's axis-aligned bounding box as a tuple of (minX, minY, maxX, maxY)
+        """
+        halfWidth = self.width / 2
+        halfHeight = self.height / 2
+        return self.x - halfWidth, self.y - halfHeight, self.x + halfWidth, self.y + halfHeight
@@ -0,0 +1,100 @@
+"""
+Encodes game state updates in the compact binary format used by clients on the binary API paths
+    Every message is sent as a websocket binary frame and starts with a one byte message type. All values are
+    little-endian. (Error messages are still sent as text frames in the usual "[Fatal Error] ..." form.)
+
+    Game state (type 1):
+        header:  uint8 type, bool ongoingGame, uint16 tankCount, uint16 shellCount, uint16 wallCount, bool hasMyTank
+        tanks:   tankCount tank records (Full records for viewers and clean records for players)
+        shells:  shellCount records of uint16 shooterId, float32 x, float32 y, float32 heading
+        walls:   wallCount records of float32 x, float32 y, float32 width, float32 height
+        myTank:  If hasMyTank, a full tank record followed by bool canShoot
+
+        Clean tank record: uint16 id, float32 x, float32 y, float32 heading, bool moving, bool alive
+        Full tank record: A clean tank record followed by uint16 kills, uint16 wins
+
+    String table (type 2):
+        header:  uint8 type, uint16 entryCount
+        entries: entryCount records of uint16 tankId, uint8 field (0 = name, 1 = info), uint16 byteLength followed by
+                 that many bytes of UTF-8 text
+
+    Names and info strings are only sent in a string table, which goes out before a game state whenever the client
+    hasn't been sent a string yet or it has changed since it was last sent.
+"""
+
+import struct
+
+gameStateType = 1
+stringTableType = 2
+
+nameField = 0
+infoField = 1
+
+__stateHeader = struct.Struct("<B?HHH?")
+__cleanTank = struct.Struct("<Hfff??")
+__fullTank = struct.Struct("<Hfff??HH")
+__shell = struct.Struct("<Hfff")
+__wall = struct.Struct("<ffff")
+__canShoot = struct.Struct("<?")
+__tableHeader = struct.Struct("<BH")
+__tableEntry = struct.Struct("<HBH")
+
+def encodeTank(aTank, tankID, full):
+    """
+    :param aTank: A dataModels.tank
+    :param tankID: The tank's clientID
+    :param full: True for a full record (viewers and myTank) or False for a clean one
+    :return: The tank's record as bytes
+    """
+    if full:
+        return __fullTank.pack(tankID, aTank.x, aTank.y, aTank.heading, aTank.moving, aTank.alive,
+                               aTank.kills, aTank.wins)
+    else:
+        return __cleanTank.pack(tankID, aTank.x, aTank.y, aTank.heading, aTank.moving, aTank.alive)
+
+def encodeShell(aShell):
+    """
+    :return: The shell's record as bytes
+    """
+    return __shell.pack(aShell.shooterId, aShell.x, aShell.y, aShell.heading)
+
+def encodeWall(aWall):
+    """
+    :return: The wall's record as bytes
+    """
+    return __wall.pack(aWall.x, aWall.y, aWall.width, aWall.height)
+
+def gameState(ongoingGame, tankRecords, shellsBytes, shellCount, wallsBytes, wallCount, myTankRecord=None,
+              canShoot=False):
+    """
+    Assembles a game state message from already encoded records
+    :param tankRecords: A list of tank records
+    :param shellsBytes, wallsBytes: The concatenated shell and wall records
+    :param myTankRecord: The player's own full tank record or None for viewers
+    :return: The message as bytes
+    """
+    parts = [__stateHeader.pack(gameStateType, ongoingGame, len(tankRecords), shellCount, wallCount,
+                                myTankRecord is not None)]
+    parts.extend(tankRecords)
+    parts.append(shellsBytes)
+    parts.append(wallsBytes)
+
+    if myTankRecord is not None:
+        parts.append(myTankRecord)
+        parts.append(__canShoot.pack(canShoot))
+
+    return b"".join(parts)
+
+def stringTable(entries):
+    """
+    :param entries: A list of (tankId, field, text) tuples
+    :return: A string table message as bytes
+    """
+    parts = [__tableHeader.pack(stringTableType, len(entries))]
+
+    for tankID, field, text in entries:
+        data = text.encode("utf-8")
+        parts.append(__tableEntry.pack(tankID, field, len(data)))
+        parts.append(data)
+
+    return b"".join(parts)
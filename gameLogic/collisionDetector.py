@@ -5,7 +5,8 @@ Performs collision detection on convex 2D polygons by means of the separating ax
     GNU General Public License, but I (Joel Eager) have received written permission to distribute this modified version
     under the MIT license.
     
-If this script is run as __main__ it will call perfTest() to perform a performance benchmark
+If this script is run as __main__ it will call perfTest() to perform a performance benchmark of the collision checks
+(See benchmark.py in the project root for the benchmarks of the rest of the server)
 
 Usage:
     export PYTHONPATH="../"
@@ -16,9 +17,56 @@ import math
 
 import config
 
+def __edgeVector(point1, point2):
+    """
+    :return: A vector going from point1 to point2
+    """
+    return point2[0] - point1[0], point2[1] - point1[1]
+
+def __polyToEdges(poly):
+    """
+    Runs edgeVector() on each point paired with the point after it in the poly
+    :return: A list of the edges of the poly as vectors
+    """
+    return [__edgeVector(poly[i], poly[(i + 1) % len(poly)]) for i in range(len(poly))]
+
+def __orthogonal(vector):
+    """
+    :return: A new vector which is orthogonal to the given vector
+    """
+    return vector[1], - vector[0]
+
+def __project(poly, axis):
+    """
+    :return: A vector showing how much of the poly lies along the axis
+    """
+    dots = [point[0] * axis[0] + point[1] * axis[1] for point in poly]
+    return min(dots), max(dots)
+
+def __overlap(projection1, projection2):
+    """
+    :return: Boolean indicating if the two projections overlap
+    """
+    return projection1[0] <= projection2[1] and projection2[0] <= projection1[1]
+
+def __runSAT(poly1, poly2):
+    """
+    :return: The boolean result of running separating axis theorem on the two polys
+    """
+    for edge in __polyToEdges(poly1) + __polyToEdges(poly2):
+        axis = __orthogonal(edge)
+
+        if not __overlap(__project(poly1, axis), __project(poly2, axis)):
+            # The polys don't overlap on this axis so they can't be touching
+            return False
+
+    # The polys overlap on all axes so they must be touching
+    return True
+
 def hasCollided(poly1, poly2, maxDist=None):
     """
     Checks for a collision between two convex 2D polygons using separating axis theorem (SAT)
+        This is the generic fallback. See collide() for the faster shape-specific checks.
     :param poly1, poly2: The two polygons described as lists of points as tuples
         Example: [(x1, y1), (x2, y2), (x3, y3)]
         Note: The points list must go in sequence around the polygon
@@ -26,71 +74,174 @@ def hasCollided(poly1, poly2, maxDist=None):
         If this is left off the optimization check that uses it will be skipped
     :return: The boolean result
     """
-    def edgeVector(point1, point2):
-        """
-        :return: A vector going from point1 to point2
-        """
-        return point2[0] - point1[0], point2[1] - point1[1]
+    # Do an optimization check using the maxDist
+    if maxDist is not None:
+        if (poly1[1][0] - poly2[0][0]) ** 2 + (poly1[1][1] - poly2[0][1]) ** 2 <= maxDist ** 2:
+            # Collision is possible so run SAT on the polys
+            return __runSAT(poly1, poly2)
+        else:
+            return False
+    else:
+        # No maxDist so run SAT on the polys
+        return __runSAT(poly1, poly2)
 
-    def polyToEdges(poly):
-        """
-        Runs edgeVector() on each point paired with the point after it in the poly
-        :return: A list of the edges of the poly as vectors
-        """
-        return [edgeVector(poly[i], poly[(i + 1) % len(poly)]) for i in range(len(poly))]
+def aabbVsAabb(box1, box2):
+    """
+    Checks for a collision between two axis-aligned boxes
+    :param box1, box2: The boxes as tuples of (minX, minY, maxX, maxY)
+    :return: The boolean result
+    """
+    return box1[0] <= box2[2] and box2[0] <= box1[2] and box1[1] <= box2[3] and box2[1] <= box1[3]
 
-    def orthogonal(vector):
-        """
-        :return: A new vector which is orthogonal to the given vector
-        """
-        return vector[1], - vector[0]
+def pointInObb(x, y, centerX, centerY, heading, halfWidth, halfHeight):
+    """
+    Checks if a point lies within an oriented (rotated) box
+    :param x, y: The point
+    :param centerX, centerY: The center of the box
+    :param heading: The box's rotation in radians (The same convention as tank.toPoly())
+    :param halfWidth, halfHeight: Half the box's size along its own axes
+    :return: The boolean result
+    """
+    sin = math.sin(heading)
+    cos = math.cos(heading)
+    deltaX = x - centerX
+    deltaY = y - centerY
 
-    def dotProduct(vector1, vector2):
-        """
-        :return: The dot (or scalar) product of the two vectors
-        """
-        return vector1[0] * vector2[0] + vector1[1] * vector2[1]
+    # Rotate the point into the box's frame of reference (The inverse of the rotation used by tank.toPoly())
+    return (abs(deltaX * cos + deltaY * sin) <= halfWidth and
+            abs(deltaY * cos - deltaX * sin) <= halfHeight)
 
-    def project(poly, axis):
-        """
-        :return: A vector showing how much of the poly lies along the axis
-        """
-        dots = [dotProduct(point, axis) for point in poly]
-        return min(dots), max(dots)
+def rayVsAabb(x, y, dirX, dirY, box):
+    """
+    Finds where the line through (x, y) along (dirX, dirY) crosses an axis-aligned box (The slab method)
+    :param box: The box as a tuple of (minX, minY, maxX, maxY)
+    :return: A tuple of (enter, exit) as multiples of (dirX, dirY) from (x, y) or None if the line misses the box
+        Either value can be negative if the box is behind (x, y).
+    """
+    enter = -math.inf
+    exit = math.inf
 
-    def overlap(projection1, projection2):
-        """
-        :return: Boolean indicating if the two projections overlap
-        """
-        return min(projection1) <= max(projection2) and min(projection2) <= max(projection1)
+    for origin, direction, low, high in ((x, dirX, box[0], box[2]), (y, dirY, box[1], box[3])):
+        if direction == 0:
+            # The line is parallel to this slab so it's either always in it or never in it
+            if origin < low or origin > high:
+                return None
+        else:
+            near = (low - origin) / direction
+            far = (high - origin) / direction
+            if near > far:
+                near, far = far, near
 
-    def runSAT(poly1, poly2):
-        """
-        :return: The boolean result of running separating axis theorem on the two polys
-        """
-        edges = polyToEdges(poly1) + polyToEdges(poly2)
-        axes = [orthogonal(edge) for edge in edges]
+            enter = max(enter, near)
+            exit = min(exit, far)
+
+    if enter > exit:
+        return None
+
+    return enter, exit
+
+def segmentInObb(x1, y1, x2, y2, centerX, centerY, heading, halfWidth, halfHeight):
+    """
+    Checks if the line segment from (x1, y1) to (x2, y2) touches an oriented (rotated) box
+        This is the swept version of pointInObb(). It catches fast objects that would pass all the way through the
+        box between two frames.
+    :return: The boolean result
+    """
+    sin = math.sin(heading)
+    cos = math.cos(heading)
 
-        for axis in axes:
-            overlapping = overlap(project(poly1, axis), project(poly2, axis))
+    # Rotate both ends into the box's frame of reference so the box is axis-aligned
+    startX = (x1 - centerX) * cos + (y1 - centerY) * sin
+    startY = (y1 - centerY) * cos - (x1 - centerX) * sin
+    endX = (x2 - centerX) * cos + (y2 - centerY) * sin
+    endY = (y2 - centerY) * cos - (x2 - centerX) * sin
 
-            if not overlapping:
-                # The polys don't overlap on this axis so they can't be touching
-                return False
+    crossing = rayVsAabb(startX, startY, endX - startX, endY - startY,
+                         (-halfWidth, -halfHeight, halfWidth, halfHeight))
 
-        # The polys overlap on all axes so they must be touching
-        return True
+    return crossing is not None and crossing[0] <= 1 and crossing[1] >= 0
 
-    # Do an optimization check using the maxDist
-    if maxDist is not None:
-        if (poly1[1][0] - poly2[0][0]) ** 2 + (poly1[1][1] - poly2[0][1]) ** 2 <= maxDist ** 2:
-            # Collision is possible so run SAT on the polys
-            return runSAT(poly1, poly2)
-        else:
+def obbVsAabb(poly, box):
+    """
+    Checks for a collision between an oriented (rotated) rectangle and an axis-aligned box
+        Both shapes are rectangles so only four axes need to be tested: the box's two and the rectangle's two.
+    :param poly: The rotated rectangle as a list of four points as tuples going in sequence around it
+    :param box: The axis-aligned box as a tuple of (minX, minY, maxX, maxY)
+    :return: The boolean result
+    """
+    # The box's axes are just x and y
+    xValues = [point[0] for point in poly]
+    yValues = [point[1] for point in poly]
+    if max(xValues) < box[0] or min(xValues) > box[2] or max(yValues) < box[1] or min(yValues) > box[3]:
+        return False
+
+    # The rectangle only has two unique edge directions
+    corners = [(box[0], box[1]), (box[2], box[1]), (box[2], box[3]), (box[0], box[3])]
+    for index in range(0, 2):
+        axis = __orthogonal(__edgeVector(poly[index], poly[index + 1]))
+
+        if not __overlap(__project(poly, axis), __project(corners, axis)):
             return False
+
+    return True
+
+def __pointVsBox(point, box):
+    return aabbVsAabb(point.toBounds(), box.toBounds())
+
+def __pointVsObb(point, obb):
+    # Grow the box by the shell's extent along each of the box's axes so the point test covers the whole shell
+    sin = abs(math.sin(obb.heading))
+    cos = abs(math.cos(obb.heading))
+    shellHalfWidth = config.game.shell.width / 2
+    shellHalfHeight = config.game.shell.height / 2
+    halfWidth = config.game.tank.width / 2 + shellHalfWidth * cos + shellHalfHeight * sin
+    halfHeight = config.game.tank.height / 2 + shellHalfWidth * sin + shellHalfHeight * cos
+
+    # Check the shell's own axes (x and y) against the box's axis-aligned bounds first
+    halfX = (config.game.tank.width / 2) * cos + (config.game.tank.height / 2) * sin
+    halfY = (config.game.tank.width / 2) * sin + (config.game.tank.height / 2) * cos
+    if not aabbVsAabb(point.toBounds(), (obb.x - halfX, obb.y - halfY, obb.x + halfX, obb.y + halfY)):
+        return False
+
+    # Test the whole path the shell took this frame so it can't skip over the tank
+    startX, startY, endX, endY = point.toPath()
+    if startX == endX and startY == endY:
+        return pointInObb(endX, endY, obb.x, obb.y, obb.heading, halfWidth, halfHeight)
     else:
-        # No maxDist so run SAT on the polys
-        return runSAT(poly1, poly2)
+        return segmentInObb(startX, startY, endX, endY, obb.x, obb.y, obb.heading, halfWidth, halfHeight)
+
+def __obbVsBox(obb, box):
+    return obbVsAabb(obb.toPoly(), box.toBounds())
+
+# The kernel to use for each pair of collisionShape values (Pairs that aren't listed fall back to hasCollided().)
+__kernels = {
+    ("aabb", "aabb"): __pointVsBox,
+    ("point", "point"): __pointVsBox,
+    ("point", "aabb"): __pointVsBox,
+    ("aabb", "point"): __pointVsBox,
+    ("point", "obb"): __pointVsObb,
+    ("obb", "point"): lambda obb, point: __pointVsObb(point, obb),
+    ("obb", "aabb"): __obbVsBox,
+    ("aabb", "obb"): lambda box, obb: __obbVsBox(obb, box)
+}
+
+def collide(obj1, obj2):
+    """
+    Checks for a collision between two game objects using the fastest check for their shapes
+        Each model's collisionShape picks the kernel: shell/wall is a box check, shell/tank a swept point in rotated
+        box check along the shell's path for the current frame, and tank/wall a four axis SAT. Anything else (like
+        tank/tank) uses the generic hasCollided().
+        (For a shell that hasn't moved this is exact. For a moving shell it can only err towards a hit and only by a
+        fraction of a pixel near the tank's corners.)
+    :param obj1, obj2: Tanks, shells, or walls
+    :return: The boolean result
+    """
+    kernel = __kernels.get((obj1.collisionShape, obj2.collisionShape))
+
+    if kernel is None:
+        return hasCollided(obj1.toPoly(), obj2.toPoly())
+    else:
+        return kernel(obj1, obj2)
 
 def getMaxDist(rect1, rect2):
     """
@@ -113,45 +264,64 @@ class maxDistValues:
 
 def perfTest(iterations):
     """
-    Runs a speed benchmark on hasCollided() using a tank and shell and prints the results
+    Runs a speed benchmark on hasCollided() and on each of the kernels used by collide() and prints the results
     :param iterations: The number of times to repeat each test
     """
     import datetime
 
-    from dataModels import tank, shell
+    from dataModels import tank, shell, wall
     from serverLogic.logging import round
 
-    def runTrials(maxDist=None):
+    def runTrials(check, moving, target):
         """
         Runs the number of trials set by iterations
+            Each trial moves the moving object towards the target in 1 px steps until check reports a collision.
         :return: The time taken in seconds
         """
-        # Set up the objects
-        aTank = tank()
-        aTank.x = 200
-        aTank.y = 100
-        aShell = shell(0, aTank, 0)
-
-        # Run the trials
         start = datetime.datetime.now()
         for count in range(0, iterations):
-            aShell.x = 100
+            moving.x = 100
+            moving.move(0)      # (Resets a shell's swept path so it doesn't reach back to the last trial's hit)
 
-            while not hasCollided(aTank.toPoly(), aShell.toPoly(), maxDist=maxDist):
-                aShell.move(1)
+            while not check(moving, target):
+                moving.move(1)
 
         return (datetime.datetime.now() - start).total_seconds()
 
+    # Set up the objects
+    aTank = tank()
+    aTank.x = 200
+    aTank.y = 100
+    aTank.heading = math.pi / 6
+    aShell = shell(0, aTank, 0)
+    # (The wall gets a fixed size so it never reaches back to where the moving objects start)
+    aWall = wall.fromValues(200, 100, 20, 50)
+
     print("Benchmarking hasCollided() using a shell and tank...")
     print("Using " + str(iterations) + " iterations\n")
 
-    timeWith = runTrials(maxDist=maxDistValues.tankShell)
-    timeWithout = runTrials()
+    timeWith = runTrials(lambda a, b: hasCollided(b.toPoly(), a.toPoly(), maxDist=maxDistValues.tankShell),
+                         aShell, aTank)
+    timeWithout = runTrials(lambda a, b: hasCollided(b.toPoly(), a.toPoly()), aShell, aTank)
 
     print("Time with maxDist: " + str(round(timeWith, 5)) + " secs")
     print("Time without:      " + str(round(timeWithout, 5)) + " secs\n")
 
-    print("maxDist is " + str(round(timeWithout / timeWith, 2)) + " times faster")
+    print("maxDist is " + str(round(timeWithout / timeWith, 2)) + " times faster\n")
+
+    print("Benchmarking the collide() kernels against hasCollided()...")
+    movingTank = tank()
+    movingTank.y = 100
+    pairs = [("shell/wall (aabbVsAabb)", aShell, aWall),
+             ("shell/tank (pointInObb)", aShell, aTank),
+             ("tank/wall  (obbVsAabb) ", movingTank, aWall)]
+
+    for name, moving, target in pairs:
+        timeKernel = runTrials(collide, moving, target)
+        timeSAT = runTrials(lambda a, b: hasCollided(a.toPoly(), b.toPoly()), moving, target)
+
+        print(name + ": " + str(round(timeKernel, 5)) + " secs vs " + str(round(timeSAT, 5)) + " secs with SAT (" +
+              str(round(timeSAT / timeKernel, 2)) + " times faster)")
 
 # If this file is run just launch perfTest()
 if __name__ == "__main__":
@@ -0,0 +1,185 @@
+"""
+Optional timing of the phases of each frame (Turned on by config.server.profileFrames)
+    gameManager and gameData mark where each phase of their work starts and ends with mark() and lap(). The time
+    spent in each phase is added up over the frame and recorded in that phase's histogram when gameClock ends the
+    frame. Every fpsLogRate seconds the histograms are summarized into the snapshot returned by snapshot() and cleared
+    for the next window.
+
+    While profiling is off startFrame(), mark(), lap(), and endFrame() are no-op functions so the instrumentation only
+    costs the calls themselves.
+"""
+
+import collections
+import math
+import time
+
+import config
+
+try:
+    from time import perf_counter_ns as clock
+except ImportError:
+    # Python 3.6 and older don't have perf_counter_ns
+    def clock():
+        return int(time.perf_counter() * 1000000000)
+
+# The phases that are timed in the order they're listed in the snapshot
+#   (frame is the whole of gameClock's work for the frame including the time between the other phases.)
+phases = ["timers", "shells", "commands", "tankMovement", "collisions", "recording", "startGame", "interest",
+          "encoding", "enqueueing", "frame"]
+
+class histogram:
+    """
+    A log-linear histogram of times in nanoseconds
+        Each power of two is split into 4 buckets so a value's bucket is never more than 25% off from it while adding
+        a value stays cheap and the memory use is fixed.
+    """
+    def __init__(self):
+        self.buckets = [0] * 256
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @staticmethod
+    def bucketIndex(value):
+        """
+        :return: The index of the bucket for a value
+        """
+        bits = value.bit_length()
+        if bits <= 2:
+            return value
+        else:
+            # The bucket is picked by the position of the highest bit and the two bits after it
+            return (bits - 2) * 4 + ((value >> (bits - 3)) & 3)
+
+    @staticmethod
+    def bucketLimit(index):
+        """
+        :return: The largest value that goes in the bucket with the given index
+        """
+        if index < 4:
+            return index
+        else:
+            shift = index // 4 - 1
+            return ((4 + index % 4 + 1) << shift) - 1
+
+    def add(self, value):
+        self.buckets[histogram.bucketIndex(value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        """
+        :return: An upper bound for the given percentile of the values added (0 if there aren't any)
+        """
+        rank = max(math.ceil(percent / 100 * self.count), 1)
+        seen = 0
+        for index in range(0, len(self.buckets)):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(histogram.bucketLimit(index), self.max)
+
+        return 0
+
+    def clear(self):
+        self.__init__()
+
+    def summary(self):
+        """
+        :return: A dict of the count and the mean, p50, p99, and max in microseconds
+        """
+        return collections.OrderedDict([
+            ("count", self.count),
+            ("mean", round(self.total / self.count / 1000, 2) if self.count != 0 else 0),
+            ("p50", round(self.percentile(50) / 1000, 2)),
+            ("p99", round(self.percentile(99) / 1000, 2)),
+            ("max", round(self.max / 1000, 2))
+        ])
+
+enabled = False         # Set by setEnabled()
+
+__histograms = {phase: histogram() for phase in phases}
+__frameTotals = dict()  # The time spent in each phase in the current frame so far
+__frameStart = 0        # When the current frame started
+__last = 0              # The end of the last phase timed (or when mark() was last called)
+__windowStart = 0       # When the current window started
+__frameCount = 0        # The number of frames in the current window
+__snapshot = dict()     # The summary of the last completed window
+
+def __noop(*args):
+    pass
+
+def __startFrame():
+    global __frameStart, __last
+    __frameStart = __last = clock()
+
+def __mark():
+    global __last
+    __last = clock()
+
+def __lap(phase):
+    global __last
+    now = clock()
+    __frameTotals[phase] = __frameTotals.get(phase, 0) + now - __last
+    __last = now
+
+def __endFrame():
+    global __windowStart, __frameCount, __snapshot
+    now = clock()
+    __frameTotals["frame"] = now - __frameStart
+
+    for phase, total in __frameTotals.items():
+        __histograms[phase].add(total)
+
+    __frameTotals.clear()
+    __frameCount += 1
+
+    if now - __windowStart < config.server.fpsLogRate * 1000000000:
+        return False
+
+    # Summarize the window and start a new one
+    __snapshot = collections.OrderedDict([
+        ("window", round((now - __windowStart) / 1000000000, 2)),
+        ("frames", __frameCount),
+        ("phases", collections.OrderedDict([(phase, __histograms[phase].summary()) for phase in phases
+                                            if __histograms[phase].count != 0]))
+    ])
+
+    for aHistogram in __histograms.values():
+        aHistogram.clear()
+
+    __windowStart = now
+    __frameCount = 0
+    return True
+
+# startFrame() - Called by gameClock at the start of each frame
+# mark() - Starts timing the next phase from now (Called when a timed function is entered)
+# lap(phase) - Adds the time since the last mark() or lap() to phase
+# endFrame() - Called by gameClock at the end of each frame
+#   Returns True when it completes a window (Once every fpsLogRate seconds) so a new snapshot is ready.
+startFrame = mark = lap = __noop
+endFrame = lambda: False
+
+def setEnabled(isEnabled):
+    """
+    Turns profiling on or off (Called by gameClock with config.server.profileFrames when the clock starts)
+    """
+    global enabled, startFrame, mark, lap, endFrame, __windowStart, __frameCount
+    enabled = isEnabled
+
+    if enabled:
+        startFrame, mark, lap, endFrame = __startFrame, __mark, __lap, __endFrame
+        __windowStart = clock()
+        __frameCount = 0
+    else:
+        startFrame = mark = lap = __noop
+        endFrame = lambda: False
+
+def snapshot():
+    """
+    :return: The timing summary of the last completed window as a dict with the window's length in seconds, its frame
+        count, and the stats for each phase in microseconds (See histogram.summary()) or an empty dict if no window
+        has been completed yet
+        The stats for a phase are per frame, so count is the number of frames the phase ran in.
+    """
+    return __snapshot
@@ -4,39 +4,136 @@ The asyncio code that maintains a consistent frame rate and runs the on-frame lo
 
 import datetime
 import asyncio
+import json
+import time
 
 import config
 from serverLogic.logging import logPrint, round
 from serverLogic import serverData
-from . import gameData, gameManager
+from . import frameProfiler, gameData, gameManager, mapPool, matchmaker
 
 # For timing game state updates
 __timeSinceLastUpdate = 1 / config.server.updatesPerSecond
 
 def __onTick(frameDelta):
     """
-    Runs gameManager's and gameData's functions at the rates set in config.py
+    Runs gameManager's and gameData's functions for every arena at the rates set in config.py
     :param frameDelta: The time elapsed, in seconds, since the last frame
     """
     global __timeSinceLastUpdate
+    frameProfiler.startFrame()
 
-    if not gameData.ongoingGame and gameData.playerCount >= config.server.minPlayers:
-        # There's no ongoing game but enough players have joined so start a new game
-        gameData.updateClients()  # Ensure that all clients have at least one update with ongoingGame = False
-        gameManager.startGame()
-        gameData.updateClients()  # Get the new update out ASAP
-
-    if gameData.ongoingGame:
-        # There's an ongoing game so run frameCallback
-        gameManager.gameTick(frameDelta)
+    # Run any keep-alive checks that are due
+    serverData.timers.advance(time.monotonic())
 
     # Run updateClients at the rate set in config.py
+    #   (The tolerance keeps float rounding from pushing an update back a frame when using fixed steps.)
     __timeSinceLastUpdate += frameDelta
-    if __timeSinceLastUpdate >= 1 / config.server.updatesPerSecond:
+    updateDue = __timeSinceLastUpdate >= 1 / config.server.updatesPerSecond - 1e-9
+    if updateDue:
         __timeSinceLastUpdate = 0
-        gameData.updateClients()
+
+    for anArena in list(gameData.arenas.values()):
+        if not anArena.ongoingGame and anArena.playerCount >= config.server.minPlayers:
+            # There's no ongoing game but enough players have joined so start a new game
+            gameData.updateClients(anArena)  # Ensure that all clients have at least one update with ongoingGame = False
+            gameManager.startGame(anArena)
+            gameData.updateClients(anArena)  # Get the new update out ASAP
+
+        if anArena.ongoingGame:
+            # There's an ongoing game so run frameCallback
+            gameManager.gameTick(anArena, frameDelta)
+
+        if updateDue:
+            gameData.updateClients(anArena)
+
+    if frameProfiler.endFrame():
+        logPrint("Frame phases (us): " + json.dumps(frameProfiler.snapshot()), 3)
+
+def __logFPS(avgFPS, minFPS, extra=""):
+    """
+    Logs the FPS and server status line
+    :param extra: Appended to the FPS part of the message
+    """
+    hashes = list()
+    for anArena in gameData.arenas.values():
+        hashes.extend([anArena.wallHash, anArena.shellHash, anArena.tankHash])
+
+    playerCount = matchmaker.playerCount()
+    logPrint("FPS: avg=" + str(round(avgFPS, 1)) + ", min=" + str(round(minFPS, 1)) + extra +
+             "; Clients: players=" + str(playerCount) +
+             ", viewers=" + str(len(serverData.clients.keys()) - playerCount) +
+             ", arenas=" + str(len(gameData.arenas)) +
+             "; Collision pairs: tested=" + str(sum([aHash.pairsTested for aHash in hashes])) +
+             ", pruned=" + str(sum([aHash.pairsPruned for aHash in hashes])), 3)
+
+    for aHash in hashes:
+        aHash.resetCounters()
 
 async def gameClock():
+    """
+    Runs the game clock using the mode set by config.server.fixedTimestep
+    """
+    frameProfiler.setEnabled(config.server.profileFrames)
+    mapPool.fill()
+
+    if config.server.fixedTimestep:
+        await __fixedStepClock()
+    else:
+        await __adaptiveClock()
+
+async def __fixedStepClock():
+    """
+    Calls onTick() with a constant frameDelta of 1 / framesPerSecond
+        Frames are scheduled on absolute deadlines from the event loop's monotonic clock so timing errors don't
+        accumulate. If the server falls behind it runs up to maxCatchUpFrames steps back-to-back and then drops the
+        rest of the backlog instead of trying to make it up.
+    """
+    loop = asyncio.get_event_loop()
+    step = 1 / config.server.framesPerSecond
+    nextFrame = loop.time()
+
+    # For logging
+    lastFPSLog = loop.time()
+    lastWakeUp = loop.time()
+    frameCount = 0
+    droppedFrames = 0
+    maxGap = step       # The longest time between two wake ups
+
+    while True:
+        now = loop.time()
+        maxGap = max(maxGap, now - lastWakeUp)
+        lastWakeUp = now
+
+        # Run every step that's due
+        stepsRun = 0
+        while nextFrame <= now and stepsRun < config.server.maxCatchUpFrames:
+            __onTick(step)
+            nextFrame += step
+            stepsRun += 1
+
+        frameCount += stepsRun
+
+        if nextFrame <= now:
+            # Still behind so drop the backlog
+            missed = int((now - nextFrame) / step) + 1
+            droppedFrames += missed
+            nextFrame += missed * step
+
+        # Log FPS if FPS logging is enabled
+        if config.server.logLevel >= 3 and now - lastFPSLog >= config.server.fpsLogRate:
+            __logFPS(frameCount / (now - lastFPSLog), 1 / maxGap, ", dropped=" + str(droppedFrames))
+            frameCount = 0
+            droppedFrames = 0
+            maxGap = step
+            lastFPSLog = now
+
+        # Sleep until the next frame's deadline (This is also what lets the other tasks run.)
+        wakeUp = loop.create_future()
+        loop.call_at(nextFrame, lambda: wakeUp.done() or wakeUp.set_result(None))
+        await wakeUp
+
+async def __adaptiveClock():
     """
     Maintains a consistent frame rate as set in config.py and calls onTick() every frame
     """
@@ -78,9 +175,7 @@ async def gameClock():
             frameCount += 1
 
             if (datetime.datetime.now() - lastFSPLog).total_seconds() >= config.server.fpsLogRate:
-                logPrint("FPS: avg=" + str(frameCount / config.server.fpsLogRate) + ", min=" +
-                         str(round(minFPS, 1)) + "; Clients: players=" + str(gameData.playerCount) +
-                         ", viewers=" + str(len(serverData.clients.keys()) - gameData.playerCount), 3)
+                __logFPS(frameCount / config.server.fpsLogRate, minFPS)
                 frameCount = 0
                 minFPS = config.server.framesPerSecond
                 lastFSPLog = datetime.datetime.now()
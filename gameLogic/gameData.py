@@ -1,89 +1,374 @@
 """
 Holds the game's data structures and the functions for interacting with them
+    The state of each game is kept in its dataModels.arena.
 """
 
 import json
-import copy
+import time
 
 import config
+import dataModels
 from serverLogic import serverData
-from dataModels import tank
+from . import binaryProtocol, frameProfiler, interestManager
 
-shells = list()         # The list of shells currently in flight
-walls = list()          # The list of walls on the map
+arenas = dict()         # The active arenas keyed by their names (See matchmaker.py)
 
-playerCount = 0         # The current number of connected players
-ongoingGame = False     # Is there a game in progress currently?
+def newShellList():
+    """
+    :return: An empty container for the shells in flight
+        This is a shellArray if config.server.useNumPy is set and a plain list of dataModels.shell objects otherwise.
+    """
+    if config.server.useNumPy:
+        from .shellArray import shellArray
+        return shellArray()
+    else:
+        return list()
+
+def __encode(obj):
+    """
+    :return: The compact JSON encoding of obj
+    """
+    return json.dumps(obj, separators=(',', ':'))
+
+def __myTankExtra(anArena, playerID):
+    """
+    :return: A dict of the fields added to a player's own tank when it's sent to that player
+    """
+    return {"id": playerID, "name": config.server.tankNames[playerID],
+            "canShoot": anArena.clients[playerID].tank.canShoot()}
+
+def __otherIndexes(playerIDs, index, interest):
+    """
+    :param index: The index in playerIDs of the player the update is for
+    :param interest: The result of interestManager.visibleEntities() for playerIDs
+    :return: A list of the indexes in playerIDs of the other tanks the player is sent
+        They're listed starting with the one after this player's. (The order the old encoder used)
+    """
+    otherIndexes = list(range(index + 1, len(playerIDs))) + list(range(0, index))
+    if interest is None or playerIDs[index] not in interest:
+        return otherIndexes
+
+    tankIDs = interest[playerIDs[index]][0]
+    return [otherIndex for otherIndex in otherIndexes if playerIDs[otherIndex] in tankIDs]
+
+def playerViews(anArena):
+    """
+    Builds the game state each player in an arena would be sent by updateClients() without encoding or sending it
+        Used by the headless simulation. (See simulation.py)
+    :return: A dict of each player's game state as a dict keyed by clientID
+        (The shell and wall lists are shared between the game states so they mustn't be modified.)
+    """
+    playerIDs = [clientID for clientID, client in anArena.clients.items() if client.isPlayer()]
+    interest = interestManager.visibleEntities(anArena, playerIDs)
+
+    shellDicts = [shell.toDict() for shell in anArena.shells]
+    wallDicts = [wall.toDict() for wall in anArena.walls]
+
+    cleanTanks = list()
+    for clientID in playerIDs:
+        tankDict = anArena.clients[clientID].tank.toDict(True)
+        tankDict["id"] = clientID
+        cleanTanks.append(tankDict)
+
+    views = dict()
+    for index in range(0, len(playerIDs)):
+        myTankDict = anArena.clients[playerIDs[index]].tank.toDict(False)
+        myTankDict.update(__myTankExtra(anArena, playerIDs[index]))
+
+        # The other tanks are listed in the same order updateClients() uses
+        otherIndexes = __otherIndexes(playerIDs, index, interest)
+        if interest is None or playerIDs[index] not in interest:
+            playerShells = shellDicts
+        else:
+            playerShells = [shellDicts[shellIndex] for shellIndex in interest[playerIDs[index]][1]]
+
+        views[playerIDs[index]] = {
+            "ongoingGame": anArena.ongoingGame,
+            "tanks": [cleanTanks[otherIndex] for otherIndex in otherIndexes],
+            "shells": playerShells,
+            "walls": wallDicts,
+            "myTank": myTankDict
+        }
+
+    return views
+
+def __deltaJSON(client, ongoingGameJSON, entities, myTankJSON=None):
+    """
+    Generates a delta-compressed update for a client on one of the delta API paths
+        Each entity category is sent as {"changed": {id: entity, ...}, "removed": [id, ...]} relative to the last
+        update the client was sent. Keyframes have "keyframe": true and list every entity as changed so the client
+        should drop its old state when it gets one. (If the client's last update hasn't been sent yet this one
+        replaces it so it has to be a keyframe.)
+    :param entities: A list of (category, fragments) tuples where fragments is a dict of each entity's JSON keyed by
+        its id as a string. These dicts become the client's baseline so they mustn't be modified afterwards.
+    :param myTankJSON: The JSON for the player's own tank (Always sent in full) or None for viewers
+    :return: The JSON string to send
+    """
+    baseline = client.deltaBaseline
+    isKeyframe = (baseline is None or client.updatesSinceKeyframe >= config.server.deltaKeyframeInterval or
+                  client.hasPendingState())
+
+    message = '{"keyframe":' + __encode(isKeyframe) + ',"ongoingGame":' + ongoingGameJSON
+    newBaseline = dict()
+    for category, fragments in entities:
+        if isKeyframe:
+            changed = fragments.items()
+            removed = list()
+        else:
+            oldFragments = baseline[category]
+            changed = [(entityID, fragment) for entityID, fragment in fragments.items()
+                       if oldFragments.get(entityID) != fragment]
+            removed = [entityID for entityID in oldFragments if entityID not in fragments]
+
+        message += (',"' + category + '":{"changed":{' +
+                    ",".join(['"' + entityID + '":' + fragment for entityID, fragment in changed]) +
+                    '},"removed":' + __encode(removed) + '}')
+        newBaseline[category] = fragments
+
+    if myTankJSON is not None:
+        message += ',"myTank":' + myTankJSON
+
+    client.deltaBaseline = newBaseline
+    client.updatesSinceKeyframe = 0 if isKeyframe else client.updatesSinceKeyframe + 1
+    return message + '}'
+
+def __newStrings(client, strings):
+    """
+    :param strings: A dict of the strings the client should have keyed by (tankId, field)
+    :return: A string table message with the strings a binary format client hasn't been sent yet or that have changed
+        or None if it already has them all (They're marked as sent)
+    """
+    entries = [(key[0], key[1], text) for key, text in strings.items() if client.stringsSent.get(key) != text]
+    if len(entries) == 0:
+        return None
+
+    for tankID, field, text in entries:
+        client.stringsSent[(tankID, field)] = text
+
+    return binaryProtocol.stringTable(entries)
+
+def __sendStringTable(clientID, strings):
+    """
+    Sends a binary format client any name and info strings it hasn't been sent yet or that have changed
+    :param strings: A dict of the strings the client should have keyed by (tankId, field)
+    """
+    message = __newStrings(serverData.clients[clientID], strings)
+    if message is not None:
+        frameProfiler.lap("encoding")
+        serverData.send(clientID, message)
+        frameProfiler.lap("enqueueing")
+
+def sendViewerStrings(anArena, clientID):
+    """
+    Sends a binary format viewer the names and info of the arena's tanks right away instead of with the next update
+        Used before queueing a viewer's catch-up updates so the string table is sent ahead of them.
+    """
+    client = serverData.clients[clientID]
+    if not client.usesFormat(config.server.updateFormats.binary):
+        return
+
+    strings = dict()
+    for playerID, player in anArena.clients.items():
+        if player.isPlayer():
+            strings[(playerID, binaryProtocol.nameField)] = config.server.tankNames[playerID]
+            strings[(playerID, binaryProtocol.infoField)] = player.tank.info
 
-def updateClients():
+    message = __newStrings(client, strings)
+    if message is not None:
+        serverData.send(clientID, message)
+
+def __history(anArena, updateFormat):
+    """
+    :return: An arena's snapshotRing of viewer updates in a format (Created if needed)
+    """
+    if updateFormat not in anArena.history:
+        # (Room for twice the usual number of updates since extra ones are sent when a game starts)
+        capacity = int(config.server.viewerHistorySeconds * config.server.updatesPerSecond) * 2 + 2
+        anArena.history[updateFormat] = dataModels.snapshotRing(config.server.viewerHistorySeconds,
+                                                                config.server.viewerHistoryMaxBytes, capacity)
+
+    return anArena.history[updateFormat]
+
+def pastViewerStates(anArena, updateFormat, delay=0):
+    """
+    Used to catch up viewers that have just connected (See config.server.viewerHistorySeconds)
+    :param delay: The number of seconds behind the game the viewer is watching
+    :return: A list of the updates in an arena's history for a format that were sent at least delay seconds ago,
+        oldest first
+    """
+    if updateFormat not in anArena.history:
+        return list()
+
+    return anArena.history[updateFormat].messages(time.monotonic() - delay)
+
+def __sendViewerState(anArena, updateFormat, message):
+    """
+    Publishes an update to an arena's viewers in a format
+        The update is also kept in the arena's history for that format. Viewers watching on a delay are sent the
+        update from that many seconds ago out of the history whenever it changes. (All the viewers on the same delay
+        share a channel so nothing is copied per viewer.)
     """
-    Sends game state updates to clients
+    serverData.send(config.server.clientTypes.viewer, message, updateFormat, arenaName=anArena.name)
+
+    if config.server.viewerHistorySeconds > 0:
+        now = time.monotonic()
+        history = __history(anArena, updateFormat)
+        history.append(now, message)
+
+        for delay in serverData.delays(anArena.name, config.server.clientTypes.viewer, updateFormat):
+            delayedMessage = history.latestAt(now - delay)
+            channel = serverData.getChannel(anArena.name, config.server.clientTypes.viewer, updateFormat, delay)
+
+            if delayedMessage is not None and delayedMessage is not channel.latest:
+                serverData.send(config.server.clientTypes.viewer, delayedMessage, updateFormat,
+                                arenaName=anArena.name, delay=delay)
+
+def updateClients(anArena):
+    """
+    Sends game state updates to the clients in an arena
         Called every time an update is due to be sent by gameClock.py
+
+        Every entity is only encoded once per update (Straight from its model's fieldLayout. See dataModels.tank).
+        Each message is then assembled by splicing the shared JSON fragments together around the recipient's own
+        myTank fragment. Clients on the delta API paths get messages built from the same fragments by __deltaJSON().
+        Each encoding is only done if at least one client uses it.
+
+        If interest management is on (See interestManager.py) each player's message only includes the tanks and
+        shells picked for it, which are spliced in from the same fragments.
     """
-    def generateJSON(gameStateObj, doClean):
-        """
-        Generates JSON for a given object
-        :param rootObj: The object to encode
-        :param doClean: True/False to indicate if the dict should be cleaned for sending to players
-        """
-        def objToDict(obj):
-            """
-            Helps the json encoder in parsing objects
-            """
-            if isinstance(obj, tank):
-                if doClean and not hasattr(obj, "name"):
-                    return obj.toDict(True)
-                else:
-                    return obj.toDict(False)
-            else:
-                return vars(obj)
+    # (The frameProfiler.lap() calls split the time spent into building messages and queueing them to be sent)
+    frameProfiler.mark()
+    shells = anArena.shells
+    walls = anArena.walls
+
+    usedFormats = set([client.updateFormat for client in anArena.clients.values()])
+    needJSON = (config.server.updateFormats.json in usedFormats or config.server.updateFormats.delta in usedFormats)
+    needBinary = config.server.updateFormats.binary in usedFormats
 
-        return json.dumps(objToDict(gameStateObj), default=objToDict, separators=(',', ':'))
+    playerIDs = [clientID for clientID, client in anArena.clients.items() if client.isPlayer()]
+    interest = interestManager.visibleEntities(anArena, playerIDs)
+    frameProfiler.lap("interest")
 
-    # Build a gameState object
-    class gameState:
-        def __init__(self):
-            self.ongoingGame = ongoingGame
-            self.tanks = None
-            self.shells = shells
-            self.walls = walls
+    if needJSON:
+        # Encode the parts of the game state that are the same for every client
+        ongoingGameJSON = __encode(anArena.ongoingGame)
 
-    currentGameState = gameState()
+        shellFragments = dict()
+        for shell in shells:
+            shellFragments[str(shell.getId())] = shell.toJSON()
+        shellKeys = list(shellFragments.keys())
+        shellFragmentList = list(shellFragments.values())
+        shellsJSON = "[" + ",".join(shellFragmentList) + "]"
 
-    # Build the tanks dict
-    tanks = dict()
-    for clientID in serverData.clients:
-        if serverData.clients[clientID].isPlayer():
-            aTank = copy.copy(serverData.clients[clientID].tank)
-            aTank.id = clientID
-            tanks[clientID] = aTank
+        wallFragments = dict()
+        for index in range(0, len(walls)):
+            wallFragments[str(index)] = walls[index].toJSON()
+        wallsJSON = "[" + ",".join(wallFragments.values()) + "]"
+
+        # Encode each tank's cleaned fragment (For the players) and full fragment (For the viewers)
+        cleanTanks = dict()
+        fullTanks = dict()
+        for clientID in playerIDs:
+            tank = anArena.clients[clientID].tank
+            cleanTanks[str(clientID)] = tank.toJSON(True, {"id": clientID})
+            fullTanks[str(clientID)] = tank.toJSON(False, {"name": config.server.tankNames[clientID]})
+
+        cleanTankList = list(cleanTanks.values())
+
+    if needBinary:
+        # Encode the same things as above as binary records
+        shellRecords = [binaryProtocol.encodeShell(shell) for shell in shells]
+        shellsBytes = b"".join(shellRecords)
+        wallsBytes = b"".join([binaryProtocol.encodeWall(wall) for wall in walls])
+
+        cleanTankRecords = [binaryProtocol.encodeTank(anArena.clients[clientID].tank, clientID, False)
+                            for clientID in playerIDs]
+        fullTankRecords = [binaryProtocol.encodeTank(anArena.clients[clientID].tank, clientID, True)
+                           for clientID in playerIDs]
+
+        tankStrings = dict()
+        for clientID in playerIDs:
+            tankStrings[(clientID, binaryProtocol.nameField)] = config.server.tankNames[clientID]
+            tankStrings[(clientID, binaryProtocol.infoField)] = anArena.clients[clientID].tank.info
+
+    frameProfiler.lap("encoding")
 
     # Send out clean data to players
-    #   Note: This loop iterates over a list of keys to prevent it from being messed up by adding and removing keys
-    for playerID in list(tanks.keys()):
-        # Append the current tank's data and name to currentGameState
-        myTank = tanks[playerID]
-        myTank.name = config.server.tankNames[playerID]
-        myTank.canShoot = myTank.canShoot()
-        currentGameState.myTank = myTank
-
-        # Generate a dictionary of tanks containing all but the current tank and add it to currentGameState
-        del tanks[playerID]
-        currentGameState.tanks = list(tanks.values())
-
-        # Clean and send currentGameState to the current player
-        serverData.send(playerID, generateJSON(currentGameState, True))
-
-        # Clean up currentGameState, myTank, and the cleanedTanks dict
-        del currentGameState.myTank
-        del myTank.name
-        del myTank.canShoot
-        tanks[playerID] = myTank
+    for index in range(0, len(playerIDs)):
+        playerID = playerIDs[index]
+        player = anArena.clients[playerID]
+        myTank = player.tank
+
+        otherIndexes = __otherIndexes(playerIDs, index, interest)
+        shellIndexes = None if interest is None or playerID not in interest else interest[playerID][1]
+
+        if player.usesFormat(config.server.updateFormats.binary):
+            if shellIndexes is None:
+                playerShellsBytes = shellsBytes
+                shellCount = len(shells)
+            else:
+                playerShellsBytes = b"".join([shellRecords[shellIndex] for shellIndex in shellIndexes])
+                shellCount = len(shellIndexes)
+
+            __sendStringTable(playerID, {(playerID, binaryProtocol.nameField): config.server.tankNames[playerID],
+                                         (playerID, binaryProtocol.infoField): myTank.info})
+            message = binaryProtocol.gameState(
+                anArena.ongoingGame, [cleanTankRecords[otherIndex] for otherIndex in otherIndexes], playerShellsBytes,
+                shellCount, wallsBytes, len(walls), fullTankRecords[index], myTank.canShoot())
+        else:
+            myTankJSON = myTank.toJSON(False, __myTankExtra(anArena, playerID))
+
+            if player.usesFormat(config.server.updateFormats.delta):
+                if shellIndexes is None:
+                    otherTanks = dict(cleanTanks)
+                    del otherTanks[str(playerID)]
+                    playerShells = shellFragments
+                else:
+                    otherTanks = {str(playerIDs[otherIndex]): cleanTankList[otherIndex] for otherIndex in otherIndexes}
+                    playerShells = {shellKeys[shellIndex]: shellFragmentList[shellIndex]
+                                    for shellIndex in shellIndexes}
+
+                message = __deltaJSON(player, ongoingGameJSON, [("tanks", otherTanks), ("shells", playerShells),
+                                                                ("walls", wallFragments)], myTankJSON)
+            else:
+                otherTanks = [cleanTankList[otherIndex] for otherIndex in otherIndexes]
+                if shellIndexes is None:
+                    playerShellsJSON = shellsJSON
+                else:
+                    playerShellsJSON = ("[" + ",".join([shellFragmentList[shellIndex] for shellIndex in shellIndexes]) +
+                                        "]")
+
+                message = ('{"ongoingGame":' + ongoingGameJSON + ',"tanks":[' + ",".join(otherTanks) +
+                           '],"shells":' + playerShellsJSON + ',"walls":' + wallsJSON + ',"myTank":' + myTankJSON +
+                           '}')
+
+        frameProfiler.lap("encoding")
+        serverData.send(playerID, message, isState=True)
+        frameProfiler.lap("enqueueing")
 
     # Send complete data to the viewers
-    for playerID in tanks.keys():
-        del tanks[playerID].id
-        tanks[playerID].name = config.server.tankNames[playerID]
-    
-    currentGameState.tanks = list(tanks.values())
-    serverData.send(config.server.clientTypes.viewer, generateJSON(currentGameState, False))
\ No newline at end of file
+    if needJSON:
+        message = ('{"ongoingGame":' + ongoingGameJSON + ',"tanks":[' + ",".join(fullTanks.values()) +
+                   '],"shells":' + shellsJSON + ',"walls":' + wallsJSON + '}')
+        frameProfiler.lap("encoding")
+        __sendViewerState(anArena, config.server.updateFormats.json, message)
+        frameProfiler.lap("enqueueing")
+
+    if needBinary:
+        for clientID, client in anArena.clients.items():
+            if client.usesFormat(config.server.updateFormats.binary) and not client.isPlayer():
+                __sendStringTable(clientID, tankStrings)
+
+        message = binaryProtocol.gameState(anArena.ongoingGame, fullTankRecords, shellsBytes, len(shells), wallsBytes,
+                                           len(walls))
+        frameProfiler.lap("encoding")
+        __sendViewerState(anArena, config.server.updateFormats.binary, message)
+        frameProfiler.lap("enqueueing")
+
+    for clientID, client in anArena.clients.items():
+        if client.usesFormat(config.server.updateFormats.delta) and not client.isPlayer():
+            message = __deltaJSON(client, ongoingGameJSON, [("tanks", fullTanks), ("shells", shellFragments),
+                                                           ("walls", wallFragments)])
+            frameProfiler.lap("encoding")
+            serverData.send(clientID, message, isState=True)
+            frameProfiler.lap("enqueueing")
@@ -2,85 +2,109 @@
 Manages and updates the game state every frame and sets up new games
 """
 
-from random import randint
+import math
 
 import config
-from . import collisionDetector, gameData
+from . import collisionDetector, frameProfiler, gameData, mapPool
+from .matchRecorder import recorder
+from .occupancyGrid import occupancyGrid
 import dataModels
-from serverLogic import serverData
 from serverLogic.logging import logPrint
 
-def startGame():
+def startGame(anArena, layout=None):
     """
-    Starts a new game
+    Starts a new game in an arena
+    :param layout: The dataModels.mapLayout to play on or None to take one from gameLogic.mapPool (It needs at least
+        anArena.playerCount spawn slots)
     """
-    gameData.shells = list()
-    gameData.walls = list()
-
-    # Create the walls
-    for count in range(0, randint(config.game.wall.wallCountBounds[0], config.game.wall.wallCountBounds[1])):
-        isValidLocation = False
-        aWall = None
-
-        while not isValidLocation:
-            aWall = dataModels.wall()
-            isValidLocation = True
-
-            # Check for overlap with the other walls
-            for otherWall in gameData.walls:
-                if collisionDetector.hasCollided(aWall.toPoly(), otherWall.toPoly(
-                        margin=config.game.wall.placementPadding)):
-                    isValidLocation = False
-                    break
+    frameProfiler.mark()
+    anArena.shells = gameData.newShellList()
+    anArena.timers.clear()
 
-        gameData.walls.append(aWall)
+    # Take a map from the pool and put the tanks in its spawn slots
+    if layout is None:
+        layout = mapPool.takeMap()
+    anArena.walls = layout.walls
+    anArena.mapSeed = layout.seed
 
-    # Spawn the tanks
-    halfWidth = (config.game.map.width / 2) - config.game.tank.width
-    halfHeight = (config.game.map.height / 2) - config.game.tank.height
-    tanksSpawned = list()
+    for client in anArena.clients.values():
+        if client.isPlayer():
+            client.tank.spawn()
+            client.tank.x, client.tank.y = layout.takeSpawnSlot()
 
-    for clientID in serverData.clients.keys():
-        if serverData.clients[clientID].isPlayer():
-            tank = serverData.clients[clientID].tank
-            tank.spawn()
+    indexWalls(anArena, layout.wallGrid)
 
-            isValidLocation = False
-            while not isValidLocation:
-                tank.x = (config.game.map.width / 2) + randint(-halfWidth, halfWidth)
-                tank.y = (config.game.map.height / 2) + randint(-halfHeight, halfHeight)
-                isValidLocation = True
+    # Start the game
+    anArena.ongoingGame = True
 
-                # Check for collisions with the walls
-                for wall in gameData.walls:
-                    if collisionDetector.hasCollided(tank.toPoly(), wall.toPoly()):
-                        isValidLocation = False
-                        break
+    if config.server.recordingDir is not None:
+        if anArena.recorder is not None:
+            anArena.recorder.close(anArena)
 
-                # Check for collisions with the other tanks
-                for otherTank in tanksSpawned:
-                    if collisionDetector.hasCollided(tank.toPoly(),
-                                                     otherTank.toPoly(margin=config.game.tank.spawnPadding)):
-                        isValidLocation = False
-                        break
+        anArena.recorder = recorder(anArena)
 
-            tanksSpawned.append(tank)
+    frameProfiler.lap("startGame")
+    logPrint("New game started in arena " + anArena.name + " with " + str(anArena.playerCount) + " players on map " +
+             str(anArena.mapSeed), 1)
 
-    # Start the game
-    gameData.ongoingGame = True
-    logPrint("New game started with " + str(gameData.playerCount) + " players", 1)
+def indexWalls(anArena, wallGrid=None):
+    """
+    Indexes an arena's walls for the collision broadphase and rasterizes them for the shell checks
+        Has to be called whenever anArena.walls is replaced. (Done by startGame())
+    :param wallGrid: An occupancyGrid already built for anArena.walls or None to build one
+    """
+    anArena.wallHash.clear()
+    for wall in anArena.walls:
+        anArena.wallHash.insert(wall, wall.toBounds())
+
+    if wallGrid is None:
+        wallGrid = occupancyGrid(anArena.walls, config.server.occupancyCellSize)
 
-def gameTick(elapsedTime):
+    anArena.wallGrid = wallGrid
+    anArena.sightLines = dict()
+
+def __executeCommand(anArena, clientID, tank, command):
+    """
+    Applies a player's command to its tank
+    """
+    if command.action == config.server.commands.fire:
+        if tank.canShoot():
+            reloadTime = anArena.simTime + config.game.tank.reloadTime
+            tank.didShoot(reloadTime)
+            anArena.timers.schedule(reloadTime, tank.reload)
+            maxDistance = anArena.wallGrid.castRay(tank.x, tank.y, math.cos(command.arg), -math.sin(command.arg))
+            anArena.shells.append(dataModels.shell(clientID, tank, command.arg, maxDistance))
+    elif command.action == config.server.commands.turn:
+        tank.heading = command.arg
+    elif command.action == config.server.commands.stop:
+        tank.moving = False
+    elif command.action == config.server.commands.go:
+        tank.moving = True
+
+def gameTick(anArena, elapsedTime):
     """
-    Runs the logic to maintain the game state and applies commands from players
+    Runs the logic to maintain an arena's game state and applies commands from its players
         Called once every frame by gameClock.py
     :param elapsedTime: The time elapsed, in seconds, since the last frame
     """
+    # (The frameProfiler.lap() calls mark the end of each phase of the frame for profiling. See frameProfiler.py)
+    frameProfiler.mark()
+    if anArena.recorder is not None:
+        anArena.recorder.startTick(anArena)
+
+    anArena.simTime += elapsedTime
+    anArena.timers.advance(anArena.simTime)
+    frameProfiler.lap("timers")
+
     # Temporary, per-frame lists
     players = list()        # A complete list of the clientIDs of players with alive tanks
-    otherTanks = list()     # The list of stopped tanks and already moved tanks used by checkTankLocation()
+    spentShells = set()     # The indexes of shells that have hit a tank this frame
+
+    # The stopped tanks and already moved tanks used by checkTankLocation()
+    otherTanks = anArena.tankHash
+    otherTanks.clear()
 
-    # Checks a tank's location against the map bounds, the otherTanks list, and the list of walls
+    # Checks a tank's location against the map bounds, the otherTanks hash, and the walls
     #   If the tank has collided with any of those it is moved back and the moving property is set to False
     def checkTankLocation(tankToCheck):
         def didCollide():
@@ -95,103 +119,128 @@ def gameTick(elapsedTime):
                 return
 
         # Check for collisions with other tanks
-        for otherTank in otherTanks:
+        for otherTank in otherTanks.query(tankToCheck.toBounds()):
             if collisionDetector.hasCollided(tankToCheck.toPoly(), otherTank.toPoly(),
                                              maxDist=collisionDetector.maxDistValues.tankTank):
                 didCollide()
                 return
 
         # Check for collisions with walls
-        for wall in gameData.walls:
-            if collisionDetector.hasCollided(tankToCheck.toPoly(), wall.toPoly()):
+        for wall in anArena.wallHash.query(tankToCheck.toBounds()):
+            if collisionDetector.collide(tankToCheck, wall):
                 didCollide()
                 return
 
-    # Move the shells and check for collisions with the map bounds
-    outOfBoundsShells = list()
-    for index in range(0, len(gameData.shells)):
-        gameData.shells[index].move(config.game.shell.speed * elapsedTime)
+    # Move the shells
+    #   Shells stop at the wall or map edge found by castRay() when they were fired so no per-frame wall checks are
+    #   needed. Any that got there this frame are discarded after the tank hit checks.
+    if config.server.useNumPy:
+        # Vectorized version of the loop below
+        anArena.shells.move(config.game.shell.speed * elapsedTime)
+    else:
+        for shell in anArena.shells:
+            shell.move(config.game.shell.speed * elapsedTime)
+
+    frameProfiler.lap("shells")
+
+    # Apply the commands every player sent since the last frame in one pass
+    #   (Their buffers have already coalesced them down to the newest turn and go/stop. See dataModels.commandBuffer)
+    #   Dead tanks' commands are dropped.
+    for clientID, player in anArena.clients.items():
+        if player.isPlayer() and len(player.incoming) != 0:
+            commands = player.incoming.drain()
 
-        # Discard any shells that fly off the map
-        if (gameData.shells[index].x > config.game.map.width or gameData.shells[index].x < 0 or
-                gameData.shells[index].y > config.game.map.height or gameData.shells[index].y < 0):
-            outOfBoundsShells.insert(0, index)
-            continue
+            if player.tank.alive:
+                for command in commands:
+                    __executeCommand(anArena, clientID, player.tank, command)
 
-        # Discard any shells that hit a wall
-        for wall in gameData.walls:
-            if collisionDetector.hasCollided(gameData.shells[index].toPoly(), wall.toPoly()):
-                outOfBoundsShells.insert(0, index)
-                break
+                    if anArena.recorder is not None:
+                        anArena.recorder.addCommand(clientID, command)
 
-    for index in outOfBoundsShells:
-        del gameData.shells[index]
+    # Fill the per-frame lists
+    for clientID, player in anArena.clients.items():
+        if player.isPlayer() and player.tank.alive:
+            # Add stopped tanks to otherTanks
+            if not player.tank.moving:
+                otherTanks.insert(player.tank, player.tank.toBounds())
 
-    # Fill the per-frame lists, execute any commands, and create tanks for new players
-    for clientID in serverData.clients.keys():
-        if serverData.clients[clientID].isPlayer():
-            player = serverData.clients[clientID]
+            # Append the player's id to the list of players
+            players.append(clientID)
 
-            if player.tank.alive:
-                # Execute any commands
-                if len(player.incoming) != 0:
-                    command = player.incoming.pop()
-
-                    if command.action == config.server.commands.fire:
-                        if player.tank.canShoot():
-                            player.tank.didShoot()
-                            gameData.shells.append(dataModels.shell(clientID, player.tank, command.arg))
-                    elif command.action == config.server.commands.turn:
-                        player.tank.heading = command.arg
-                    elif command.action == config.server.commands.stop:
-                        player.tank.moving = False
-                    elif command.action == config.server.commands.go:
-                        player.tank.moving = True
-
-                    # If there's another queued command it'll be processed in the next frame
-
-                # Add stopped tanks to the list of otherTanks
-                if not player.tank.moving:
-                    otherTanks.append(player.tank)
-
-                # Append the player's id to the list of players
-                players.append(clientID)
+    frameProfiler.lap("commands")
+
+    # Index the shells' paths by their position in anArena.shells for the tank hit checks
+    #   (The NumPy backend does its own vectorized filtering instead.)
+    if not config.server.useNumPy:
+        anArena.shellHash.clear()
+        for index in range(0, len(anArena.shells)):
+            anArena.shellHash.insert(index, anArena.shells[index].toBounds())
+
+    frameProfiler.lap("collisions")
 
     # Update positions for any moving tanks and check for collisions on all tanks
     for clientID in players:
-        tank = serverData.clients[clientID].tank
+        tank = anArena.clients[clientID].tank
 
         # Move the tank if it is moving
         if tank.moving:
             tank.move(config.game.tank.speed * elapsedTime)
 
+        frameProfiler.lap("tankMovement")
+
         # Check if the tank is hit
-        for index in range(0, len(gameData.shells)):
-            shell = gameData.shells[index]
+        if config.server.useNumPy:
+            candidates = anArena.shells.nearby(tank.toBounds(), excludeId=clientID)
+        else:
+            candidates = anArena.shellHash.query(tank.toBounds())
+
+        for index in candidates:
+            if index in spentShells:
+                # This shell already hit another tank
+                continue
+
+            shell = anArena.shells[index]
             # This if statement keeps a tank from being hit by it's own shell on the same frame as it shot that shell
             if shell.shooterId != clientID:
-                if collisionDetector.hasCollided(tank.toPoly(), shell.toPoly(),
-                                                 maxDist=collisionDetector.maxDistValues.tankShell):
+                if collisionDetector.collide(tank, shell):
                     # Mark tank as dead, give the shooter a kill, and delete the shell
                     tank.alive = False
                     tank.moving = False
 
-                    if shell.shooterId in serverData.clients:
-                        serverData.clients[shell.shooterId].tank.kills += 1
+                    if shell.shooterId in anArena.clients:
+                        anArena.clients[shell.shooterId].tank.kills += 1
 
-                    del gameData.shells[index]
+                    spentShells.add(index)
                     break
 
         # Location checking is only needed for moving tanks
         if tank.moving:
             checkTankLocation(tank)
-            otherTanks.append(tank)
+            otherTanks.insert(tank, tank.toBounds())
+
+        frameProfiler.lap("collisions")
+
+    # Discard the shells that hit a tank, a wall, or the edge of the map
+    #   (Done after the loop above so the indexes in shellHash stay valid.)
+    if config.server.useNumPy:
+        stoppedShells = anArena.shells.expired()
+        stoppedShells[list(spentShells)] = True
+        anArena.shells.discard(stoppedShells)
+    else:
+        anArena.shells = [shell for index, shell in enumerate(anArena.shells)
+                           if index not in spentShells and not shell.hasExpired()]
+
+    frameProfiler.lap("shells")
 
     if len(players) <= 1:
         # Game over
         if len(players) == 1:
             # We have a winner!
-            serverData.clients[players[0]].tank.wins += 1
-            serverData.clients[players[0]].tank.alive = False
+            anArena.clients[players[0]].tank.wins += 1
+            anArena.clients[players[0]].tank.alive = False
+
+        anArena.ongoingGame = False
 
-        gameData.ongoingGame = False
\ No newline at end of file
+    if anArena.recorder is not None:
+        anArena.recorder.endTick(anArena, elapsedTime)
+        frameProfiler.lap("recording")
\ No newline at end of file
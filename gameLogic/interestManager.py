@@ -0,0 +1,169 @@
+"""
+Picks the other tanks and shells each player is sent in its game state updates (See gameData.updateClients())
+    With config.server.interestRadius set players are only sent the tanks and shells within that many pixels of their
+    own tank. With config.server.interestLineOfSight set the ones hidden behind walls are left out as well. On large
+    maps with lots of shells in flight that keeps each player's updates smaller and quicker to build.
+
+    Everything is worked out once per update for all of an arena's players. The tanks and shells are put in spatial
+    hashes (The same broadphase used for collisions) and each player works through the cells near it a whole cell at a
+    time. Cells that are entirely in range are taken as is and only the ones crossing the edge of the radius have their
+    contents checked one by one.
+
+    Line of sight is also decided per cell: two cells can see each other if a ray cast through the arena's wallGrid
+    from the center of either one gets to within half a cell of the other's center. Since walls never move that's only
+    worked out the first time a pair of cells is needed in a game and then kept in anArena.sightLines. At most
+    config.server.interestSightLinesPerUpdate new pairs are cast per update so a big map doesn't stall the first few
+    updates of a game. (Pairs that haven't been cast yet count as being able to see each other. So it's a coarse check
+    that leans towards sending too much rather than hiding something that's in plain view.)
+
+    Players whose tanks aren't alive and every player between games are still sent everything.
+"""
+
+import math
+
+import config
+from .spatialHash import spatialHash
+
+def isEnabled():
+    """
+    :return: True if players are only sent some of the tanks and shells
+    """
+    return config.server.interestRadius is not None or config.server.interestLineOfSight
+
+def __pointIndex(points, cellSize):
+    """
+    :param points: A dict of (x, y, sightCell) tuples (See visibleEntities())
+    :return: A spatialHash of points' keys at each point
+    """
+    index = spatialHash(cellSize)
+    for key, point in points.items():
+        index.insert(key, (point[0], point[1], point[0], point[1]))
+
+    return index
+
+def __sightCell(x, y):
+    """
+    :return: The cell used for line of sight checks that (x, y) is in
+    """
+    return math.floor(x / config.server.collisionCellSize), math.floor(y / config.server.collisionCellSize)
+
+def __castSightLine(anArena, cellA, cellB):
+    """
+    :return: True if the given sight cells can see each other (See the top of this file)
+    """
+    cellSize = config.server.collisionCellSize
+    ax, ay = (cellA[0] + 0.5) * cellSize, (cellA[1] + 0.5) * cellSize
+    bx, by = (cellB[0] + 0.5) * cellSize, (cellB[1] + 0.5) * cellSize
+
+    distance = math.hypot(bx - ax, by - ay)
+    dirX, dirY = (bx - ax) / distance, (by - ay) / distance
+    return (anArena.wallGrid.castRay(ax, ay, dirX, dirY) >= distance - cellSize / 2 or
+            anArena.wallGrid.castRay(bx, by, -dirX, -dirY) >= distance - cellSize / 2)
+
+def __visibleFrom(index, points, x, y, canSee):
+    """
+    :param index: A spatialHash from __pointIndex()
+    :param points: The dict the index was built from
+    :param canSee: A function that takes a sight cell and returns True if it can be seen from (x, y)
+    :return: A list of the keys in index that a tank at (x, y) should be sent
+    """
+    radius = config.server.interestRadius
+    lineOfSight = config.server.interestLineOfSight
+    cellSize = index.cellSize
+    isSightCells = cellSize == config.server.collisionCellSize     # Are the index's cells the same as the sight cells?
+
+    bounds = None if radius is None else (x - radius, y - radius, x + radius, y + radius)
+    visible = list()
+    for cell, keys in index.queryCells(bounds):
+        if lineOfSight and isSightCells and not canSee(cell):
+            continue
+
+        if radius is not None:
+            left, top = cell[0] * cellSize, cell[1] * cellSize
+            right, bottom = left + cellSize, top + cellSize
+
+            nearest = math.hypot(max(left - x, 0, x - right), max(top - y, 0, y - bottom))
+            farthest = math.hypot(max(x - left, right - x), max(y - top, bottom - y))
+            if nearest > radius:
+                continue
+            elif farthest > radius:
+                keys = [key for key in keys if math.hypot(points[key][0] - x, points[key][1] - y) <= radius]
+
+        if lineOfSight and not isSightCells:
+            keys = [key for key in keys if canSee(points[key][2])]
+
+        visible.extend(keys)
+
+    return visible
+
+def visibleEntities(anArena, playerIDs):
+    """
+    :param playerIDs: The clientIDs of the arena's players
+    :return: None if every player should be sent everything. Otherwise a dict keyed by clientID of tuples of
+        (tankIDs, shellIndexes) where tankIDs is a set of the clientIDs of the other tanks a player is sent and
+        shellIndexes is a list of the indexes in anArena.shells of the shells it's sent in ascending order. (Players
+        that should still be sent everything aren't in the dict.)
+    """
+    if not isEnabled() or not anArena.ongoingGame:
+        return None
+
+    # The tanks and shells as (x, y, sightCell) tuples
+    tankPoints = dict()
+    for clientID in playerIDs:
+        tank = anArena.clients[clientID].tank
+        tankPoints[clientID] = (tank.x, tank.y, __sightCell(tank.x, tank.y))
+
+    shellPoints = {index: (shell.x, shell.y, __sightCell(shell.x, shell.y))
+                   for index, shell in enumerate(anArena.shells)}
+
+    # (With a radius the cells are made about as big as it so each tank only has to look through a few of them)
+    cellSize = config.server.collisionCellSize
+    if config.server.interestRadius is not None:
+        cellSize = max(cellSize, config.server.interestRadius)
+
+    tankIndex = __pointIndex(tankPoints, cellSize)
+    shellIndex = __pointIndex(shellPoints, cellSize)
+
+    newSightLines = 0       # The number of sight lines cast this update so far
+
+    def cellsCanSee(cellA, cellB):
+        """
+        :return: True if two sight cells can see each other (Each pair is only cast once per game)
+        """
+        nonlocal newSightLines
+        if cellA == cellB:
+            return True
+
+        key = (cellA, cellB) if cellA < cellB else (cellB, cellA)
+        result = anArena.sightLines.get(key)
+        if result is None:
+            if newSightLines >= config.server.interestSightLinesPerUpdate:
+                # Out of time for this update so it's left for a later one
+                return True
+
+            result = __castSightLine(anArena, cellA, cellB)
+            anArena.sightLines[key] = result
+            newSightLines += 1
+
+        return result
+
+    visible = dict()
+    for clientID in playerIDs:
+        if not anArena.clients[clientID].tank.alive:
+            continue
+
+        x, y, myCell = tankPoints[clientID]
+        seenCells = dict()      # The result for each sight cell checked from this tank
+
+        def canSee(cell):
+            if cell not in seenCells:
+                seenCells[cell] = cellsCanSee(myCell, cell)
+
+            return seenCells[cell]
+
+        tankIDs = set(__visibleFrom(tankIndex, tankPoints, x, y, canSee))
+        tankIDs.discard(clientID)
+
+        visible[clientID] = (tankIDs, sorted(__visibleFrom(shellIndex, shellPoints, x, y, canSee)))
+
+    return visible
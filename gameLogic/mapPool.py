@@ -0,0 +1,193 @@
+"""
+Generates the maps for gameManager.startGame() ahead of time so starting a game never stalls the game loop
+    Making a map means placing random walls until none of them overlap and then finding spots for the tanks that are
+    clear of the walls and of each other, which can take a lot of retries on a crowded map. So a few maps are kept
+    queued up and a background thread generates them (and rasterizes their walls) between games. Each map comes with
+    config.server.maxPlayers spawn slots that have already been checked against the walls and each other so spawning a
+    tank is just a matter of taking one. (See dataModels.mapLayout)
+
+    Every map is generated from its own seed with its own random.Random so the same seed always gives the same map.
+    The seeds are drawn from Python's random module on the game loop's thread when the maps are queued. That way a run
+    with a seeded random module gets the same maps in the same order however far ahead the thread is.
+
+    The game loop never waits on the thread or generates a map itself. If the next map isn't finished when a game
+    starts the game is played on the last map that was (or on an open map with no walls if none has been finished
+    yet) and the unfinished map is left at the front of the queue for the next game. Every step of generating a map
+    has a cap on its retries so the thread always gets through the queue.
+
+    (The headless simulation and benchmark.py call generateMap() themselves and pass the map to startGame() so their
+    maps depend only on the random module's seed and not on how far ahead the thread is.)
+"""
+
+import collections
+import concurrent.futures
+import math
+import random
+
+import config
+import dataModels
+from serverLogic.logging import logPrint
+from . import collisionDetector
+from .occupancyGrid import occupancyGrid
+
+# Generates the queued maps (One thread since the pool only has to stay a few maps ahead of the games)
+__generator = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+__queued = collections.deque()      # The (seed, future) for each map in the order they'll be used
+__fallback = None                   # A mapLayout with all its spawn slots to use when the next map isn't finished
+
+def __placeWalls(rng):
+    """
+    :return: A list of random walls that don't overlap
+        A wall that can't be placed in config.server.wallPlacementAttempts tries is left out so a crowded map can end
+        up with fewer walls than config.game.wall.wallCountBounds asks for.
+    """
+    walls = list()
+    for count in range(0, rng.randint(config.game.wall.wallCountBounds[0], config.game.wall.wallCountBounds[1])):
+        isValidLocation = False
+        aWall = None
+
+        for attempt in range(0, config.server.wallPlacementAttempts):
+            aWall = dataModels.wall(rng)
+            isValidLocation = True
+
+            # Check for overlap with the other walls
+            for otherWall in walls:
+                if collisionDetector.hasCollided(aWall.toPoly(), otherWall.toPoly(
+                        margin=config.game.wall.placementPadding)):
+                    isValidLocation = False
+                    break
+
+            if isValidLocation:
+                break
+
+        if isValidLocation:
+            walls.append(aWall)
+
+    return walls
+
+def __placeSpawnSlots(rng, walls, slotCount, padding):
+    """
+    Finds spots for tanks clear of the walls and at least padding pixels away from each other
+    :return: A list of (x, y) tuples or None if one of the slots couldn't be placed in config.server.spawnSlotAttempts
+        tries
+    """
+    halfWidth = int((config.game.map.width / 2) - config.game.tank.width)
+    halfHeight = int((config.game.map.height / 2) - config.game.tank.height)
+
+    # (Tanks always spawn with a heading of 0 so the slots are checked with that heading)
+    tank = dataModels.tank()
+    tank.spawn()
+
+    slots = list()
+    obstacles = [wall.toPoly() for wall in walls]   # The walls and the tanks in the slots so far padded by spawnPadding
+    for count in range(0, slotCount):
+        isValidLocation = False
+        for attempt in range(0, config.server.spawnSlotAttempts):
+            tank.x = (config.game.map.width / 2) + rng.randint(-halfWidth, halfWidth)
+            tank.y = (config.game.map.height / 2) + rng.randint(-halfHeight, halfHeight)
+            tankPoly = tank.toPoly()
+            isValidLocation = True
+
+            # Check for collisions with the walls and the other slots
+            for otherPoly in obstacles:
+                if collisionDetector.hasCollided(tankPoly, otherPoly):
+                    isValidLocation = False
+                    break
+
+            if isValidLocation:
+                break
+
+        if not isValidLocation:
+            return None
+
+        slots.append((tank.x, tank.y))
+        obstacles.append(tank.toPoly(margin=padding))
+
+    return slots
+
+def generateMap(seed, slotCount=None):
+    """
+    Generates a map (Safe to call from any thread)
+        If the spawn slots don't all fit around the walls the walls are placed again until they do, up to
+        config.server.mapAttempts times. After that the slots are placed around the last walls without the spawn
+        padding between them.
+    :param seed: Any int (The same seed and slotCount always give the same map)
+    :param slotCount: The number of spawn slots (Defaults to config.server.maxPlayers)
+    :return: A dataModels.mapLayout
+    :raises ValueError: If slotCount tanks don't fit on the map even without the padding
+    """
+    rng = random.Random(seed)
+    if slotCount is None:
+        slotCount = config.server.maxPlayers
+
+    spawnSlots = None
+    for attempt in range(0, config.server.mapAttempts):
+        walls = __placeWalls(rng)
+        spawnSlots = __placeSpawnSlots(rng, walls, slotCount, config.game.tank.spawnPadding)
+        if spawnSlots is not None:
+            break
+    else:
+        logPrint("Map " + str(seed) + " was generated without spawn padding since " + str(slotCount) +
+                 " tanks didn't fit with it", 2)
+        spawnSlots = __placeSpawnSlots(rng, walls, slotCount, 0)
+        if spawnSlots is None:
+            raise ValueError("There's no room for " + str(slotCount) + " tanks on the map")
+
+    return dataModels.mapLayout(seed, walls, occupancyGrid(walls, config.server.occupancyCellSize), spawnSlots)
+
+def __openMap():
+    """
+    :return: A map with no walls and its spawn slots spread out in a grid (The fallback until the thread has finished
+        a map. See takeMap())
+    """
+    columns = math.ceil(math.sqrt(config.server.maxPlayers))
+    rows = math.ceil(config.server.maxPlayers / columns)
+    spawnSlots = [((column + 0.5) * config.game.map.width / columns, (row + 0.5) * config.game.map.height / rows)
+                  for row in range(0, rows) for column in range(0, columns)]
+
+    return dataModels.mapLayout(None, list(), occupancyGrid(list(), config.server.occupancyCellSize), spawnSlots)
+
+def __queueMap():
+    """
+    Picks a seed for another map and hands it to the thread to generate
+    """
+    seed = random.getrandbits(32)
+    __queued.append((seed, __generator.submit(generateMap, seed)))
+
+def fill():
+    """
+    Queues maps until there are config.server.mapPoolSize of them (Called when the game clock starts)
+    """
+    while len(__queued) < config.server.mapPoolSize:
+        __queueMap()
+
+def takeMap():
+    """
+    Takes the next map for a game and queues another one in its place (Never waits on the thread)
+        If the next map isn't finished a copy of the last finished one is returned instead and the next map is left in
+        the queue.
+    :return: A dataModels.mapLayout with config.server.maxPlayers spawn slots
+    """
+    global __fallback
+    fill()
+
+    if len(__queued) != 0 and __queued[0][1].done():
+        seed, future = __queued.popleft()
+        __queueMap()
+
+        try:
+            layout = future.result()
+        except ValueError as e:
+            logPrint("Map " + str(seed) + " couldn't be generated: " + str(e), 1)
+        else:
+            # (The fallback gets its own list of the slots since starting a game takes slots out of the layout)
+            __fallback = dataModels.mapLayout(layout.seed, layout.walls, layout.wallGrid, list(layout.spawnSlots))
+            return layout
+    else:
+        logPrint("The next map wasn't finished so the game was started on the last one that was", 3)
+
+    if __fallback is None:
+        __fallback = __openMap()
+
+    return dataModels.mapLayout(__fallback.seed, __fallback.walls, __fallback.wallGrid, list(__fallback.spawnSlots))
@@ -0,0 +1,203 @@
+"""
+Reads the match recordings written by matchRecorder.py
+    The file is memory-mapped and indexed by its keyframes when it's opened so rebuilding the game state at any tick
+    only needs the nearest keyframe at or before it and the ticks after that one to be replayed through
+    gameManager.gameTick(). (Recordings that were cut off partway through a record can still be read up to that
+    record.)
+
+    Usage:
+        reader = matchReader("recordings/arena-1-20171020-153000-1.pytr")
+        anArena = reader.stateAt(reader.lastTick)
+        reader.close()
+"""
+
+import bisect
+import json
+import math
+import mmap
+
+import config
+import dataModels
+from . import gameData, gameManager, matchRecorder
+
+class matchReader:
+    """
+    A recording opened for reading
+    """
+    def __init__(self, path):
+        """
+        Opens and indexes a recording
+        :raise: ValueError if the file isn't a match recording
+        """
+        self.path = path
+        self.__file = open(path, "rb")
+        self.__data = None
+
+        try:
+            self.__data = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # (mmap can't map an empty file)
+            self.__file.close()
+            raise ValueError("Not a match recording")
+
+        header = matchRecorder.fileHeader
+        if len(self.__data) < header.size or self.__data[:len(matchRecorder.magic)] != matchRecorder.magic:
+            self.close()
+            raise ValueError("Not a match recording")
+
+        magic, version, self.startTime, self.framesPerSecond, nameLength = header.unpack_from(self.__data, 0)
+        if version != matchRecorder.version:
+            self.close()
+            raise ValueError("Unsupported recording version " + str(version))
+
+        self.arenaName = self.__data[header.size:header.size + nameLength].decode("utf-8")
+
+        self.keyframes = list()     # The (tick, offset) of every keyframe record in the order they were written
+        self.lastTick = 0           # The last tick with a complete record
+        self.__index(header.size + nameLength)
+
+        self.__keyframeTicks = [tick for tick, offset in self.keyframes]     # For bisecting
+
+    def __records(self, offset):
+        """
+        Iterates over the complete records starting at offset
+        :return: A generator of (type, bodyOffset, bodyLength) tuples
+        """
+        data = self.__data
+        recordHeader = matchRecorder.recordHeader
+
+        while offset + recordHeader.size <= len(data):
+            recordType, bodyLength = recordHeader.unpack_from(data, offset)
+            bodyOffset = offset + recordHeader.size
+            if bodyOffset + bodyLength > len(data):
+                # The rest of the file was never written
+                return
+
+            yield recordType, bodyOffset, bodyLength
+            offset = bodyOffset + bodyLength
+
+    def __index(self, offset):
+        """
+        Finds the keyframes and the last tick (Only the tick numbers at the start of each record body are read)
+        """
+        for recordType, bodyOffset, bodyLength in self.__records(offset):
+            # (Both kinds of records start with their tick)
+            tick = matchRecorder.tickHeader.unpack_from(self.__data, bodyOffset)[0]
+            if recordType == matchRecorder.keyframeType:
+                self.keyframes.append((tick, bodyOffset - matchRecorder.recordHeader.size))
+
+            self.lastTick = max(self.lastTick, tick)
+
+        if len(self.keyframes) == 0:
+            self.close()
+            raise ValueError("The recording doesn't have any keyframes")
+
+    def __restore(self, bodyOffset):
+        """
+        :return: A new dataModels.arena with the state from a keyframe
+        """
+        data = self.__data
+        tick, simTime, ongoingGame, tankCount, shellCount, wallCount = \
+            matchRecorder.keyframeHeader.unpack_from(data, bodyOffset)
+        offset = bodyOffset + matchRecorder.keyframeHeader.size
+
+        anArena = dataModels.arena(self.arenaName)
+        anArena.simTime = simTime
+        anArena.ongoingGame = ongoingGame
+        anArena.timers.advance(simTime)
+
+        for count in range(0, tankCount):
+            clientID, x, y, heading, moving, alive, kills, wins, reloadTime = \
+                matchRecorder.tankRecord.unpack_from(data, offset)
+            offset += matchRecorder.tankRecord.size
+
+            player = dataModels.client(None, config.server.clientTypes.player)
+            tank = player.tank
+            tank.x, tank.y, tank.heading, tank.moving, tank.alive = x, y, heading, moving, alive
+            tank.kills, tank.wins = kills, wins
+
+            if not math.isnan(reloadTime):
+                tank.didShoot(reloadTime)
+                anArena.timers.schedule(reloadTime, tank.reload)
+
+            anArena.clients[clientID] = player
+            anArena.playerCount += 1
+
+        anArena.shells = gameData.newShellList()
+        origin = dataModels.tank()
+        for count in range(0, shellCount):
+            shooterId, origin.x, origin.y, heading, distanceLeft = matchRecorder.shellRecord.unpack_from(data, offset)
+            offset += matchRecorder.shellRecord.size
+            anArena.shells.append(dataModels.shell(shooterId, origin, heading, distanceLeft))
+
+        for count in range(0, wallCount):
+            anArena.walls.append(dataModels.wall.fromValues(*matchRecorder.wallRecord.unpack_from(data, offset)))
+            offset += matchRecorder.wallRecord.size
+
+        gameManager.indexWalls(anArena)
+        return anArena
+
+    def __replayTick(self, anArena, bodyOffset):
+        """
+        Runs the tick from a tick record on an arena
+        """
+        data = self.__data
+        tick, elapsedTime, commandCount = matchRecorder.tickHeader.unpack_from(data, bodyOffset)
+        offset = bodyOffset + matchRecorder.tickHeader.size
+
+        for count in range(0, commandCount):
+            clientID, actionID = matchRecorder.commandRecord.unpack_from(data, offset)
+            offset += matchRecorder.commandRecord.size
+
+            message = {"action": matchRecorder.actions[actionID]}
+            if message["action"] in matchRecorder.argActions:
+                message["arg"] = matchRecorder.commandArg.unpack_from(data, offset)[0]
+                offset += matchRecorder.commandArg.size
+
+            anArena.clients[clientID].incoming.push(dataModels.command(json.dumps(message)))
+
+        gameManager.gameTick(anArena, elapsedTime)
+
+    def stateAt(self, tick):
+        """
+        Rebuilds the game state after a tick (Tick 0 is the state right after the game started)
+        :return: A new dataModels.arena with that state (Its clients are only players and aren't registered with
+            serverData.)
+        :raise: IndexError if the tick isn't in the recording
+        """
+        if not 0 <= tick <= self.lastTick:
+            raise IndexError("Tick " + str(tick) + " isn't in the recording")
+
+        keyframeTick, offset = self.keyframes[bisect.bisect_right(self.__keyframeTicks, tick) - 1]
+        if keyframeTick > tick:
+            raise IndexError("Tick " + str(tick) + " is before the recording's first keyframe")
+
+        records = self.__records(offset)
+        recordType, bodyOffset, bodyLength = next(records)
+        anArena = self.__restore(bodyOffset)
+
+        # Replay the ticks from the keyframe up to the one asked for
+        #   (Any keyframes on the way are for later ticks since the last one at or before tick was picked.)
+        for recordType, bodyOffset, bodyLength in records:
+            if recordType == matchRecorder.tickType:
+                if matchRecorder.tickHeader.unpack_from(self.__data, bodyOffset)[0] > tick:
+                    break
+
+                self.__replayTick(anArena, bodyOffset)
+
+        return anArena
+
+    def close(self):
+        """
+        Unmaps and closes the file
+        """
+        if self.__data is not None:
+            self.__data.close()
+
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
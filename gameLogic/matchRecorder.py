@@ -0,0 +1,206 @@
+"""
+Records matches to compact binary files so they can be replayed later (See matchReader.py for reading them)
+    When config.server.recordingDir is set every game gets its own file, which is opened by gameManager.startGame()
+    and closed once the game is over or its arena closes. The commands applied in each tick are appended as they're
+    run and a full-state keyframe is written every recordingKeyframeInterval ticks. Keyframes are also written at the
+    start of the game and whenever a player joins or leaves the arena so the ticks between two keyframes can always be
+    replayed from the first one. (Players join and leave between ticks so that keyframe has the same tick as the one
+    before it and is the state after that tick with the players as they are for the next one.)
+
+    The tick path only packs the records into memory. Once enough has built up (or a keyframe is written) the data is
+    handed to a background thread that does the file IO. (So if the server is killed the ticks since then are lost.)
+
+    File format (All values are little-endian):
+        header:  4 byte magic "PYTR", uint8 version, float64 start time (Unix time), uint8 framesPerSecond,
+                 uint16 nameLength followed by that many bytes of the arena's UTF-8 name
+        records: Any number of records each made up of uint8 type, uint32 bodyLength and then the body
+
+    Tick (type 1) - The commands applied by gameManager.gameTick() in one tick:
+        uint32 tick, float64 elapsedTime, uint16 commandCount and then commandCount command records of
+        uint16 clientID, uint8 action (An index into actions) followed by a float64 arg for fire and turn commands
+
+    Keyframe (type 2) - The full game state after a tick (Tick 0 is the state right after the game started):
+        uint32 tick, float64 simTime, bool ongoingGame, uint16 tankCount, uint16 shellCount, uint16 wallCount,
+        tankCount records of uint16 clientID, float64 x, float64 y, float64 heading, bool moving, bool alive,
+            uint16 kills, uint16 wins, float64 reloadTime (NaN if the tank is loaded),
+        shellCount records of uint16 shooterId, float64 x, float64 y, float64 heading, float64 distanceLeft,
+        wallCount records of float64 x, float64 y, uint16 width, uint16 height
+
+    The tanks are listed in the same order as the arena's clients and the shells in the same order as anArena.shells
+    since both orders matter to gameTick(). Positions are kept as float64 so replays come out exactly the same.
+"""
+
+import itertools
+import math
+import os
+import re
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from serverLogic.logging import logPrint
+
+magic = b"PYTR"
+version = 1
+
+tickType = 1
+keyframeType = 2
+
+# The actions that can be recorded in the order of their ids
+actions = [config.server.commands.fire, config.server.commands.turn, config.server.commands.stop,
+           config.server.commands.go]
+argActions = [config.server.commands.fire, config.server.commands.turn]     # The actions with an arg
+
+fileHeader = struct.Struct("<4sBdBH")
+recordHeader = struct.Struct("<BI")
+tickHeader = struct.Struct("<IdH")
+commandRecord = struct.Struct("<HB")
+commandArg = struct.Struct("<d")
+keyframeHeader = struct.Struct("<Id?HHH")
+tankRecord = struct.Struct("<Hddd??HHd")
+shellRecord = struct.Struct("<Hdddd")
+wallRecord = struct.Struct("<ddHH")
+
+__actionIDs = {action: index for index, action in enumerate(actions)}
+
+def encodeCommand(clientID, aCommand):
+    """
+    :return: The command's record as bytes
+    """
+    record = commandRecord.pack(clientID, __actionIDs[aCommand.action])
+    if aCommand.action in argActions:
+        record += commandArg.pack(aCommand.arg)
+
+    return record
+
+def encodeKeyframe(anArena, tick):
+    """
+    :return: The body of a keyframe record for an arena's current state
+    """
+    tankRecords = list()
+    for clientID, client in anArena.clients.items():
+        if client.isPlayer():
+            aTank = client.tank
+            reloadTime = aTank.reloadTime()
+            tankRecords.append(tankRecord.pack(clientID, aTank.x, aTank.y, aTank.heading, aTank.moving, aTank.alive,
+                                               aTank.kills, aTank.wins, math.nan if reloadTime is None else reloadTime))
+
+    shellRecords = [shellRecord.pack(aShell.shooterId, aShell.x, aShell.y, aShell.heading, aShell.distanceLeft())
+                    for aShell in anArena.shells]
+    wallRecords = [wallRecord.pack(aWall.x, aWall.y, aWall.width, aWall.height) for aWall in anArena.walls]
+
+    return b"".join([keyframeHeader.pack(tick, anArena.simTime, anArena.ongoingGame, len(tankRecords),
+                                         len(shellRecords), len(wallRecords))] + tankRecords + shellRecords +
+                    wallRecords)
+
+class recorder:
+    """
+    Records one game in an arena (See the top of this file)
+    """
+    __matchNumbers = itertools.count(1)     # Keeps the file names unique when games start within the same second
+
+    # Does the file IO for every recorder (A single thread so each file's writes happen in order)
+    __writer = ThreadPoolExecutor(max_workers=1)
+
+    def __init__(self, anArena):
+        """
+        Starts a recording with a keyframe of the arena's current state (Called right after a game is started)
+        """
+        # (Arena names can come from clients so anything other than letters, numbers, dashes, and underscores is
+        #   dropped from them.)
+        fileName = ("arena-" + re.sub(r"[^A-Za-z0-9_-]", "", anArena.name) + "-" + time.strftime("%Y%m%d-%H%M%S") +
+                    "-" + str(next(recorder.__matchNumbers)) + ".pytr")
+        self.path = os.path.join(config.server.recordingDir, fileName)
+
+        self.tick = 0                   # The number of ticks recorded so far
+        self.commands = list()          # The command records for the tick in progress
+
+        self.__chunks = list()          # The records waiting to be handed to the writer thread
+        self.__chunkSize = 0
+        self.__isFirstWrite = True
+        self.__roster = None            # The clientIDs of the arena's players as of the last keyframe
+
+        name = anArena.name.encode("utf-8")
+        self.__append(fileHeader.pack(magic, version, time.time(), config.server.framesPerSecond, len(name)) + name)
+        self.__keyframe(anArena)
+        logPrint("Recording the game in arena " + anArena.name + " to " + self.path, 2)
+
+    @staticmethod
+    def __write(path, chunks, isFirst):
+        """
+        Appends records to a recording (Run on the writer thread)
+        :param chunks: A list of bytes objects to write
+        :param isFirst: True for the first write, which creates the file
+        """
+        try:
+            if isFirst:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+            with open(path, "wb" if isFirst else "ab") as recordingFile:
+                recordingFile.write(b"".join(chunks))
+        except OSError as e:
+            logPrint("Couldn't write match recording " + path + ": " + str(e), 1)
+
+    def __append(self, data):
+        self.__chunks.append(data)
+        self.__chunkSize += len(data)
+
+    def __flush(self):
+        """
+        Hands the records built up so far to the writer thread
+        """
+        if len(self.__chunks) != 0:
+            recorder.__writer.submit(recorder.__write, self.path, self.__chunks, self.__isFirstWrite)
+            self.__isFirstWrite = False
+            self.__chunks = list()
+            self.__chunkSize = 0
+
+    def __keyframe(self, anArena):
+        """
+        Writes a keyframe of the arena's current state and flushes the records so far
+        """
+        self.__roster = [clientID for clientID, client in anArena.clients.items() if client.isPlayer()]
+
+        body = encodeKeyframe(anArena, self.tick)
+        self.__append(recordHeader.pack(keyframeType, len(body)) + body)
+        self.__flush()
+
+    def startTick(self, anArena):
+        """
+        Called by gameTick() before a tick is run
+            Writes a keyframe if the arena's players have changed since the last one.
+        """
+        if [clientID for clientID, client in anArena.clients.items() if client.isPlayer()] != self.__roster:
+            self.__keyframe(anArena)
+
+    def addCommand(self, clientID, aCommand):
+        """
+        Records a command applied in the tick in progress
+        """
+        self.commands.append(encodeCommand(clientID, aCommand))
+
+    def endTick(self, anArena, elapsedTime):
+        """
+        Called by gameTick() once a tick is done
+            Writes the tick's record and a keyframe if one is due. Once the game is over the recording is closed.
+        """
+        self.tick += 1
+        body = b"".join([tickHeader.pack(self.tick, elapsedTime, len(self.commands))] + self.commands)
+        self.__append(recordHeader.pack(tickType, len(body)) + body)
+        self.commands = list()
+
+        if not anArena.ongoingGame:
+            self.close(anArena)
+        elif self.tick % config.server.recordingKeyframeInterval == 0:
+            self.__keyframe(anArena)
+        elif self.__chunkSize >= config.server.recordingBufferSize:
+            self.__flush()
+
+    def close(self, anArena):
+        """
+        Writes a final keyframe and hands everything left to the writer thread
+            Called once the game is over or its arena closes. (Removes the recorder from the arena.)
+        """
+        self.__keyframe(anArena)
+        anArena.recorder = None
@@ -0,0 +1,110 @@
+"""
+Assigns clients to arenas
+    Players that don't ask for a particular arena are put in the fullest arena that still has room so games fill up
+    before new arenas are opened. Viewers that don't ask for one watch the arena with the most players. A client can
+    pick an arena by name with an "arena" query parameter on its connection path (ex: "/pyTanksAPI/viewer?arena=2").
+    Arenas are created when they're first needed and removed once their last client leaves.
+"""
+
+import itertools
+
+import config
+import dataModels
+from serverLogic import serverData
+from serverLogic.logging import logPrint
+from . import gameData
+
+__arenaNames = itertools.count(1)   # Source of names for the arenas opened by the matchmaker
+namePrefix = ""                     # Put in front of generated names (Set by worker processes to keep them unique)
+
+def __newArena(name=None):
+    """
+    Opens a new arena
+    :param name: The arena's name or None to generate one
+    :return: The arena or None if config.server.maxArenas has been reached
+    """
+    if len(gameData.arenas) >= config.server.maxArenas:
+        return None
+
+    if name is None:
+        while True:
+            name = namePrefix + str(next(__arenaNames))
+            if name not in gameData.arenas:
+                break
+
+    gameData.arenas[name] = dataModels.arena(name)
+    logPrint("Arena " + name + " opened", 1)
+    return gameData.arenas[name]
+
+def playerCount():
+    """
+    :return: The number of players connected across all the arenas
+    """
+    return sum([anArena.playerCount for anArena in gameData.arenas.values()])
+
+def findArena(clientType, arenaName=None):
+    """
+    Picks the arena a new client should join
+    :param clientType: The client's type (valid types defined in config.server.clientTypes)
+    :param arenaName: The name of the arena the client asked for or None to let the matchmaker pick one
+    :return: The arena or None if there's no room for the client
+    """
+    isPlayer = clientType == config.server.clientTypes.player
+
+    if isPlayer and playerCount() >= len(config.server.tankNames):
+        # Every player needs a unique tank name
+        return None
+
+    if arenaName is not None:
+        if arenaName in gameData.arenas:
+            anArena = gameData.arenas[arenaName]
+        else:
+            anArena = __newArena(arenaName)
+
+        if anArena is None or (isPlayer and anArena.isFull()):
+            return None
+        else:
+            return anArena
+
+    if isPlayer:
+        candidates = [anArena for anArena in gameData.arenas.values() if not anArena.isFull()]
+    else:
+        candidates = list(gameData.arenas.values())
+
+    if len(candidates) != 0:
+        # (max() returns the first of any ties so the oldest arena wins those)
+        return max(candidates, key=lambda anArena: anArena.playerCount)
+    else:
+        return __newArena()
+
+def joinArena(anArena, clientID, client):
+    """
+    Adds a client to an arena and registers it with serverData
+    """
+    client.arena = anArena.name
+    anArena.clients[clientID] = client
+    if client.isPlayer():
+        anArena.playerCount += 1
+
+    serverData.addClient(clientID, client)
+
+def leaveArena(clientID):
+    """
+    Removes a client from its arena and from serverData
+        The arena is closed if that was its last client.
+    """
+    client = serverData.clients[clientID]
+    anArena = gameData.arenas[client.arena]
+
+    del anArena.clients[clientID]
+    if client.isPlayer():
+        anArena.playerCount -= 1
+
+    serverData.removeClient(clientID)
+
+    if anArena.isEmpty():
+        if anArena.recorder is not None:
+            anArena.recorder.close(anArena)
+
+        del gameData.arenas[anArena.name]
+        logPrint("Arena " + anArena.name + " closed", 1)
@@ -0,0 +1,174 @@
+"""
+A rasterized occupancy grid of the walls on the map
+    Walls never move during a game so startGame() rasterizes them once into a compact grid with one byte per cell.
+    Checking if a shell is in a wall or off the map is then a single cell lookup for almost every shell. Only shells in
+    cells that lie on the edge of a wall need an exact check against the (few) walls touching that cell.
+
+    The grid is also used by castRay() to find how far a newly fired shell can travel before it's stopped.
+"""
+
+import math
+
+import config
+from .collisionDetector import rayVsAabb
+
+# Cell states
+FREE = 0        # No shell centered in this cell can touch a wall
+SOLID = 1       # Every shell centered in this cell touches a wall
+BORDER = 2      # It depends on where in the cell the shell is (See borderWalls)
+
+class occupancyGrid:
+    """
+    Stores the wall coverage of the map as a bytearray of cell states in row-major order
+    """
+    def __init__(self, walls, cellSize):
+        """
+        Rasterizes the given walls
+        :param walls: The walls on the map
+        :param cellSize: The width and height of each cell in pixels
+        """
+        self.cellSize = cellSize
+        self.columns = math.ceil(config.game.map.width / cellSize) + 1
+        self.rows = math.ceil(config.game.map.height / cellSize) + 1
+        self.cells = bytearray(self.columns * self.rows)
+        self.borderWalls = dict()       # Maps the index of each BORDER cell to the walls touching that cell
+
+        # Walls are grown by half a shell in each direction so the grid can be looked up with a shell's center
+        halfWidth = config.game.shell.width / 2
+        halfHeight = config.game.shell.height / 2
+
+        for wall in walls:
+            minX = wall.x - (wall.width / 2) - halfWidth
+            maxX = wall.x + (wall.width / 2) + halfWidth
+            minY = wall.y - (wall.height / 2) - halfHeight
+            maxY = wall.y + (wall.height / 2) + halfHeight
+
+            for column in range(max(0, math.floor(minX / cellSize)), min(self.columns - 1,
+                                                                          math.floor(maxX / cellSize)) + 1):
+                for row in range(max(0, math.floor(minY / cellSize)), min(self.rows - 1,
+                                                                           math.floor(maxY / cellSize)) + 1):
+                    index = row * self.columns + column
+                    if self.cells[index] == SOLID:
+                        continue
+
+                    # Check if the wall covers the whole cell or just part of it
+                    cellX = column * cellSize
+                    cellY = row * cellSize
+                    if minX <= cellX and cellX + cellSize <= maxX and minY <= cellY and cellY + cellSize <= maxY:
+                        self.cells[index] = SOLID
+                        self.borderWalls.pop(index, None)
+                    else:
+                        self.cells[index] = BORDER
+                        self.borderWalls.setdefault(index, list()).append(wall)
+
+    def cellIndex(self, x, y):
+        """
+        :return: The index in cells of the cell containing the point (x, y), which must be on the map
+        """
+        return int(y // self.cellSize) * self.columns + int(x // self.cellSize)
+
+    def isBlocked(self, x, y):
+        """
+        Checks if a shell centered on (x, y) has left the map or hit a wall
+        :return: The boolean result
+        """
+        # Check for the map bounds
+        if x > config.game.map.width or x < 0 or y > config.game.map.height or y < 0:
+            return True
+
+        index = self.cellIndex(x, y)
+        state = self.cells[index]
+        if state == FREE:
+            return False
+        elif state == SOLID:
+            return True
+        else:
+            return self.borderHit(index, x, y)
+
+    def borderHit(self, index, x, y):
+        """
+        Runs the exact check for a shell centered on (x, y) in the BORDER cell at the given index
+        :return: True if the shell touches any of the walls touching that cell
+        """
+        halfWidth = config.game.shell.width / 2
+        halfHeight = config.game.shell.height / 2
+
+        # Shells and walls are both axis-aligned so this is the same test as collisionDetector.aabbVsAabb()
+        for wall in self.borderWalls[index]:
+            if (abs(x - wall.x) <= halfWidth + wall.width / 2 and
+                    abs(y - wall.y) <= halfHeight + wall.height / 2):
+                return True
+
+        return False
+
+    def castRay(self, x, y, dirX, dirY):
+        """
+        Finds how far a shell starting at (x, y) can travel along (dirX, dirY) before it hits a wall or leaves the map
+            This walks the cells along the ray in order (Amanatides and Woo's grid traversal) so the cost depends on
+            the distance travelled instead of the number of walls. Exact checks are only run in BORDER cells.
+        :param dirX, dirY: A unit vector giving the direction of travel
+        :return: The distance in pixels
+        """
+        # Find where the ray leaves the map
+        crossing = rayVsAabb(x, y, dirX, dirY, (0, 0, config.game.map.width, config.game.map.height))
+        if crossing is None or crossing[0] > 0 or crossing[1] < 0:
+            # Already off the map
+            return 0
+        mapExit = crossing[1]
+
+        column = min(int(x // self.cellSize), self.columns - 1)
+        row = min(int(y // self.cellSize), self.rows - 1)
+
+        # The distance to the next vertical and horizontal cell boundary and the distance between boundaries
+        if dirX > 0:
+            stepX, nextX, deltaX = 1, ((column + 1) * self.cellSize - x) / dirX, self.cellSize / dirX
+        elif dirX < 0:
+            stepX, nextX, deltaX = -1, (column * self.cellSize - x) / dirX, -self.cellSize / dirX
+        else:
+            stepX, nextX, deltaX = 0, math.inf, math.inf
+
+        if dirY > 0:
+            stepY, nextY, deltaY = 1, ((row + 1) * self.cellSize - y) / dirY, self.cellSize / dirY
+        elif dirY < 0:
+            stepY, nextY, deltaY = -1, (row * self.cellSize - y) / dirY, -self.cellSize / dirY
+        else:
+            stepY, nextY, deltaY = 0, math.inf, math.inf
+
+        halfWidth = config.game.shell.width / 2
+        halfHeight = config.game.shell.height / 2
+        distance = 0        # The distance at which the ray entered the current cell
+
+        while distance <= mapExit and 0 <= column < self.columns and 0 <= row < self.rows:
+            index = row * self.columns + column
+            state = self.cells[index]
+            cellExit = min(nextX, nextY)
+
+            if state == SOLID:
+                return distance
+            elif state == BORDER:
+                # Find the nearest wall this ray enters before leaving the cell
+                nearest = None
+                for wall in self.borderWalls[index]:
+                    hit = rayVsAabb(x, y, dirX, dirY, (wall.x - wall.width / 2 - halfWidth,
+                                                       wall.y - wall.height / 2 - halfHeight,
+                                                       wall.x + wall.width / 2 + halfWidth,
+                                                       wall.y + wall.height / 2 + halfHeight))
+                    if hit is not None and hit[1] >= 0 and hit[0] <= cellExit:
+                        enter = max(hit[0], 0)
+                        if nearest is None or enter < nearest:
+                            nearest = enter
+
+                if nearest is not None:
+                    return min(nearest, mapExit)
+
+            # Step to the next cell
+            if nextX < nextY:
+                column += stepX
+                distance = nextX
+                nextX += deltaX
+            else:
+                row += stepY
+                distance = nextY
+                nextY += deltaY
+
+        return mapExit
@@ -0,0 +1,254 @@
+"""
+Structure-of-arrays storage for the shells in flight, backed by NumPy
+    Used in place of the plain list of dataModels.shell objects when config.server.useNumPy is set. The shells are kept
+    as contiguous arrays so gameManager.gameTick() can move and cull all of them with a handful of vectorized operations
+    instead of a Python loop per shell.
+
+    Indexing or iterating over a shellArray yields shellView objects which expose the same fields and methods as
+    dataModels.shell. A view refers to a row index so it's only valid until the next call that removes shells.
+"""
+
+import math
+
+import numpy
+
+import config
+import dataModels
+
+class shellView:
+    """
+    A read/write view of one shell in a shellArray that can be used anywhere a dataModels.shell is expected
+    """
+    collisionShape = "point"
+
+    __slots__ = ("_array", "_index")
+
+    def __init__(self, array, index):
+        self._array = array
+        self._index = index
+
+    @property
+    def shooterId(self):
+        return int(self._array.shooterId[self._index])
+
+    def getId(self):
+        return int(self._array.shellId[self._index])
+
+    @property
+    def x(self):
+        return float(self._array.x[self._index])
+
+    @x.setter
+    def x(self, value):
+        self._array.x[self._index] = value
+
+    @property
+    def y(self):
+        return float(self._array.y[self._index])
+
+    @y.setter
+    def y(self, value):
+        self._array.y[self._index] = value
+
+    @property
+    def heading(self):
+        return float(self._array.heading[self._index])
+
+    def move(self, distance):
+        """
+        Moves the shell the given distance along its heading (See dataModels.shell.move())
+        """
+        array = self._array
+        index = self._index
+        array.lastX[index] = array.x[index]
+        array.lastY[index] = array.y[index]
+
+        step = min(distance, array.distanceLeft[index])
+        array.x[index] += array.dirX[index] * step
+        array.y[index] += array.dirY[index] * step
+        array.distanceLeft[index] -= distance
+
+    def distanceLeft(self):
+        return float(self._array.distanceLeft[self._index])
+
+    def hasExpired(self):
+        return self._array.distanceLeft[self._index] <= 0
+
+    def toPath(self):
+        """
+        :return: The path the shell took during its last move as a tuple of (startX, startY, endX, endY)
+        """
+        return (float(self._array.lastX[self._index]), float(self._array.lastY[self._index]), self.x, self.y)
+
+    def toPoly(self):
+        """
+        :return: The shell's polygon as a list of points as tuples
+        """
+        halfWidth = config.game.shell.width / 2
+        halfHeight = config.game.shell.height / 2
+        x = self.x
+        y = self.y
+        return [(x - halfWidth, y - halfHeight),
+                (x + halfWidth, y - halfHeight),
+                (x + halfWidth, y + halfHeight),
+                (x - halfWidth, y + halfHeight)]
+
+    def toBounds(self):
+        """
+        :return: The axis-aligned bounding box of the path the shell took during its last move as a tuple of
+            (minX, minY, maxX, maxY)
+        """
+        halfWidth = config.game.shell.width / 2
+        halfHeight = config.game.shell.height / 2
+        startX, startY, endX, endY = self.toPath()
+        return (min(startX, endX) - halfWidth, min(startY, endY) - halfHeight,
+                max(startX, endX) + halfWidth, max(startY, endY) + halfHeight)
+
+    def toDict(self):
+        """
+        :return: A dictionary of the shell's data matching dataModels.shell.toDict()
+        """
+        return dataModels.shell.layout.toDict(self)
+
+    def toJSON(self):
+        """
+        :return: The shell's data as a compact JSON object matching dataModels.shell.toJSON()
+        """
+        return dataModels.shell.layout.toJSON(self)
+
+class shellArray:
+    """
+    A list-like container of shells stored as parallel NumPy arrays
+    """
+    def __init__(self, capacity=64):
+        self.count = 0                                          # The number of shells currently stored
+        self.shooterId = numpy.zeros(capacity, dtype=numpy.int64)
+        self.shellId = numpy.zeros(capacity, dtype=numpy.int64)
+        self.x = numpy.zeros(capacity)
+        self.y = numpy.zeros(capacity)
+        self.heading = numpy.zeros(capacity)
+
+        # The per-pixel movement vector for each shell (cached so the trig only runs when a shell is fired)
+        self.dirX = numpy.zeros(capacity)
+        self.dirY = numpy.zeros(capacity)
+
+        # The position at the start of the last move and the distance left before each shell is stopped
+        self.lastX = numpy.zeros(capacity)
+        self.lastY = numpy.zeros(capacity)
+        self.distanceLeft = numpy.zeros(capacity)
+
+    def __columns(self):
+        return ["shooterId", "shellId", "x", "y", "heading", "dirX", "dirY", "lastX", "lastY", "distanceLeft"]
+
+    def __grow(self):
+        """
+        Doubles the capacity of every column
+        """
+        for name in self.__columns():
+            column = getattr(self, name)
+            grown = numpy.zeros(len(column) * 2, dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            setattr(self, name, grown)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("shell index out of range")
+
+        return shellView(self, index)
+
+    def __iter__(self):
+        for index in range(0, self.count):
+            yield shellView(self, index)
+
+    def __delitem__(self, index):
+        mask = numpy.zeros(self.count, dtype=bool)
+        mask[index] = True
+        self.discard(mask)
+
+    def append(self, shell):
+        """
+        Adds a shell to the end of the array
+        :param shell: A dataModels.shell (or anything else with the same fields)
+        """
+        if self.count == len(self.x):
+            self.__grow()
+
+        index = self.count
+        self.shooterId[index] = shell.shooterId
+        self.shellId[index] = shell.getId()
+        self.x[index] = shell.x
+        self.y[index] = shell.y
+        self.heading[index] = shell.heading
+        self.dirX[index] = math.cos(shell.heading)
+        self.dirY[index] = -math.sin(shell.heading)
+        self.lastX[index] = shell.x
+        self.lastY[index] = shell.y
+        self.distanceLeft[index] = shell.distanceLeft()
+        self.count += 1
+
+    def move(self, distance):
+        """
+        Moves every shell the given distance along its heading (Stopping any that reach a wall or the map edge)
+        """
+        count = self.count
+        self.lastX[:count] = self.x[:count]
+        self.lastY[:count] = self.y[:count]
+
+        step = numpy.minimum(distance, self.distanceLeft[:count])
+        self.x[:count] += self.dirX[:count] * step
+        self.y[:count] += self.dirY[:count] * step
+        self.distanceLeft[:count] -= distance
+
+    def expired(self):
+        """
+        :return: A boolean mask of the shells that have reached a wall or the edge of the map
+        """
+        return self.distanceLeft[:self.count] <= 0
+
+    def nearby(self, bounds, excludeId=None):
+        """
+        Finds the shells whose path during the last move touches the given box
+        :param bounds: The box as a tuple of (minX, minY, maxX, maxY)
+        :param excludeId: If set, shells shot by this clientID are skipped
+        :return: An array of the matching shell indexes in ascending order
+        """
+        count = self.count
+        halfWidth = config.game.shell.width / 2
+        halfHeight = config.game.shell.height / 2
+        x = self.x[:count]
+        y = self.y[:count]
+        lastX = self.lastX[:count]
+        lastY = self.lastY[:count]
+
+        mask = ((numpy.minimum(x, lastX) - halfWidth <= bounds[2]) &
+                (numpy.maximum(x, lastX) + halfWidth >= bounds[0]) &
+                (numpy.minimum(y, lastY) - halfHeight <= bounds[3]) &
+                (numpy.maximum(y, lastY) + halfHeight >= bounds[1]))
+        if excludeId is not None:
+            mask &= self.shooterId[:count] != excludeId
+
+        return numpy.flatnonzero(mask)
+
+    def discard(self, mask):
+        """
+        Removes every shell flagged in the given boolean mask while keeping the rest in order
+        """
+        keep = ~mask
+        remaining = int(numpy.count_nonzero(keep))
+
+        for name in self.__columns():
+            column = getattr(self, name)
+            column[:remaining] = column[:self.count][keep]
+
+        self.count = remaining
+
+    def toList(self):
+        """
+        :return: The shells as a list of dicts for JSON encoding
+        """
+        return [view.toDict() for view in self]
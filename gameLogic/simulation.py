@@ -0,0 +1,108 @@
+"""
+A headless engine that runs batches of games as fast as possible (For training and testing player AIs)
+    Steps a number of independent games in lockstep with a fixed frame time. No sockets or wall clock are involved:
+    commands are passed in directly and each player's view of the game is returned as a dict in the same shape as
+    the game state updates players get from the server. (See gameData.playerViews())
+
+    Usage:
+        sim = simulation(gameCount=64, playersPerGame=4, seed=1)
+        observations = sim.reset()
+        while training:
+            observations, finished = sim.step(commands)
+
+    (Set config.server.logLevel to 0 to keep the new game messages out of the output.)
+"""
+
+import random
+
+import config
+import dataModels
+from . import gameData, gameManager, mapPool
+
+class simulation:
+    """
+    A batch of independent games stepped together
+    """
+    def __init__(self, gameCount, playersPerGame, frameTime=1 / config.server.framesPerSecond, seed=None):
+        """
+        Constructor
+        :param gameCount: The number of games to run at once
+        :param playersPerGame: The number of players in each game (Their clientIDs are 0 to playersPerGame - 1)
+            At most config.server.maxPlayers since that's how many spawn slots each map is generated with.
+        :param frameTime: The game time each step simulates in seconds
+        :param seed: If set Python's random module is seeded with it so the maps and spawns are reproducible
+        """
+        if playersPerGame < 2 or playersPerGame > config.server.maxPlayers:
+            raise ValueError("playersPerGame must be between 2 and " + str(config.server.maxPlayers))
+
+        if seed is not None:
+            random.seed(seed)
+
+        self.frameTime = frameTime
+        self.playersPerGame = playersPerGame
+
+        self.arenas = list()        # The dataModels.arena for each game
+        for index in range(0, gameCount):
+            anArena = dataModels.arena("sim-" + str(index))
+            for clientID in range(0, playersPerGame):
+                anArena.clients[clientID] = dataModels.client(None, config.server.clientTypes.player)
+
+            anArena.playerCount = playersPerGame
+            self.arenas.append(anArena)
+
+    def __startGame(self, anArena):
+        """
+        Starts a new game in an arena on a map generated right away
+            (Rather than one from mapPool's thread so the maps only depend on the random module's seed)
+        """
+        gameManager.startGame(anArena, mapPool.generateMap(random.getrandbits(32), self.playersPerGame))
+
+    def reset(self):
+        """
+        Starts a new game in every arena
+        :return: The observations for the new games (See observe())
+        """
+        for anArena in self.arenas:
+            self.__startGame(anArena)
+
+        return self.observe()
+
+    def step(self, commands):
+        """
+        Applies the players' commands and advances every game by one frame
+            Games that ended on the previous step are restarted with a new map first.
+        :param commands: A list with a list of commands for each game with one entry per player in clientID order.
+            Each entry is a dataModels.command, a command JSON string like the ones players send, or None.
+        :return: A tuple of (observations, finished) where finished is a list of booleans that are True for the
+            games that ended on this step
+        """
+        finished = list()
+
+        for anArena, gameCommands in zip(self.arenas, commands):
+            if not anArena.ongoingGame:
+                self.__startGame(anArena)
+
+            for clientID in range(0, self.playersPerGame):
+                command = gameCommands[clientID]
+                if isinstance(command, str):
+                    command = dataModels.command(command)
+
+                if command is not None:
+                    anArena.clients[clientID].incoming.push(command)
+
+            gameManager.gameTick(anArena, self.frameTime)
+            finished.append(not anArena.ongoingGame)
+
+        return self.observe(), finished
+
+    def observe(self):
+        """
+        :return: A list with a list of each player's view of the game state for each game in clientID order
+            (Each view is a dict in the same shape as a player's game state update. See gameData.playerViews())
+        """
+        observations = list()
+        for anArena in self.arenas:
+            views = gameData.playerViews(anArena)
+            observations.append([views[clientID] for clientID in range(0, self.playersPerGame)])
+
+        return observations
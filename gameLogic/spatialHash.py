@@ -0,0 +1,107 @@
+"""
+A uniform grid spatial hash used as the broadphase for collision checks
+    Objects are inserted with an axis-aligned bounding box and stored in every grid cell that box touches. A query
+    then only returns the objects sharing at least one cell with the query box so the (much slower) SAT checks only
+    have to run on pairs that are actually close to each other.
+"""
+
+import math
+
+class spatialHash:
+    """
+    Stores objects in a uniform grid of square cells keyed by their integer cell coordinates
+    """
+    def __init__(self, cellSize):
+        """
+        :param cellSize: The width and height of each cell in pixels
+        """
+        self.cellSize = cellSize
+        self.cells = dict()         # Maps (cellX, cellY) to the list of entries in that cell
+        self.size = 0               # The number of objects currently inserted
+
+        # Counters for how effective the broadphase is (These persist across calls to clear())
+        self.pairsTested = 0        # Candidate pairs returned by query()
+        self.pairsPruned = 0        # Pairs a brute force check would have tested that query() filtered out
+
+    def __cellRange(self, bounds):
+        """
+        :param bounds: An axis-aligned box as a tuple of (minX, minY, maxX, maxY)
+        :return: The range of cell coordinates covered by bounds as (minCellX, minCellY, maxCellX, maxCellY)
+        """
+        return (math.floor(bounds[0] / self.cellSize), math.floor(bounds[1] / self.cellSize),
+                math.floor(bounds[2] / self.cellSize), math.floor(bounds[3] / self.cellSize))
+
+    def clear(self):
+        """
+        Removes all objects from the grid
+        """
+        self.cells = dict()
+        self.size = 0
+
+    def insert(self, obj, bounds):
+        """
+        Adds an object to every cell its bounding box touches
+        :param obj: The object to store (returned as-is by query())
+        :param bounds: The object's axis-aligned bounding box as a tuple of (minX, minY, maxX, maxY)
+        """
+        entry = (self.size, obj)    # The insertion order is kept so query results come back in a stable order
+        minCellX, minCellY, maxCellX, maxCellY = self.__cellRange(bounds)
+
+        for cellX in range(minCellX, maxCellX + 1):
+            for cellY in range(minCellY, maxCellY + 1):
+                cell = self.cells.get((cellX, cellY))
+                if cell is None:
+                    self.cells[(cellX, cellY)] = [entry]
+                else:
+                    cell.append(entry)
+
+        self.size += 1
+
+    def query(self, bounds):
+        """
+        Finds the objects that could be touching the given box
+        :param bounds: An axis-aligned box as a tuple of (minX, minY, maxX, maxY)
+        :return: A list of the objects sharing a cell with bounds in the order they were inserted
+        """
+        minCellX, minCellY, maxCellX, maxCellY = self.__cellRange(bounds)
+
+        if minCellX == maxCellX and minCellY == maxCellY:
+            # Fast path for boxes that fit in a single cell (No duplicates are possible in that case.)
+            found = self.cells.get((minCellX, minCellY), [])
+        else:
+            found = dict()
+            for cellX in range(minCellX, maxCellX + 1):
+                for cellY in range(minCellY, maxCellY + 1):
+                    for entry in self.cells.get((cellX, cellY), []):
+                        found[entry[0]] = entry
+
+            found = [found[order] for order in sorted(found.keys())]
+
+        self.pairsTested += len(found)
+        self.pairsPruned += self.size - len(found)
+        return [entry[1] for entry in found]
+
+    def queryCells(self, bounds=None):
+        """
+        Finds the objects in the cells touching the given box grouped by cell
+            Unlike query() an object in more than one of those cells is listed once for each. (So this is meant for
+            objects inserted as points.) The broadphase counters aren't updated.
+        :param bounds: An axis-aligned box as a tuple of (minX, minY, maxX, maxY) or None for every cell
+        :return: A list of ((cellX, cellY), objects) tuples for the cells that aren't empty where objects is a list in
+            the order the objects were inserted
+        """
+        if bounds is None:
+            cells = self.cells.items()
+        else:
+            minCellX, minCellY, maxCellX, maxCellY = self.__cellRange(bounds)
+            cells = [((cellX, cellY), self.cells[(cellX, cellY)]) for cellX in range(minCellX, maxCellX + 1)
+                     for cellY in range(minCellY, maxCellY + 1) if (cellX, cellY) in self.cells]
+
+        return [(cell, [entry[1] for entry in entries]) for cell, entries in cells]
+
+    def resetCounters(self):
+        """
+        Zeros the pairsTested and pairsPruned counters
+        """
+        self.pairsTested = 0
+        self.pairsPruned = 0
@@ -0,0 +1,93 @@
+"""
+A hashed timer wheel for scheduling lots of callbacks cheaply
+    Time is split into ticks of a fixed length and each timer is stored in the slot for the tick its deadline falls
+    in. (Slots are reused every slotCount ticks so timers further out than that just sit in their slot until they're
+    due.) Scheduling and cancelling are O(1) and advance() only looks at the slots for the ticks that have passed
+    instead of checking every timer.
+
+    The wheel doesn't read any clock itself. Deadlines and the times passed to advance() can be in any units as long
+    as they're consistent, so it works with both a monotonic clock and an arena's simulation time.
+"""
+
+import math
+
+class timerWheel:
+    """
+    Calls each scheduled callback once the time passed to advance() reaches its deadline
+    """
+    def __init__(self, tickLength, slotCount=256):
+        """
+        :param tickLength: The length of each tick in the same units as the deadlines
+        :param slotCount: The number of slots in the wheel
+        """
+        self.tickLength = tickLength
+        self.slots = [list() for count in range(0, slotCount)]
+        self.currentTick = None     # The last tick processed by advance() (None until the first call)
+        self.size = 0               # The number of timers scheduled (Including cancelled ones not yet dropped)
+
+    def schedule(self, deadline, callback):
+        """
+        :param deadline: The time to call callback at
+        :param callback: A function taking no arguments
+        :return: The timer, which can be passed to cancel()
+        """
+        tick = math.floor(deadline / self.tickLength)
+        if self.currentTick is not None and tick < self.currentTick:
+            # Already due so run it on the next advance()
+            tick = self.currentTick
+
+        # Timers are stored as [deadline, callback] lists with the callback set to None when they're cancelled
+        aTimer = [deadline, callback]
+        self.slots[tick % len(self.slots)].append(aTimer)
+        self.size += 1
+        return aTimer
+
+    def cancel(self, aTimer):
+        """
+        Stops a timer from being called (It's dropped from the wheel the next time its slot is processed)
+        """
+        aTimer[1] = None
+
+    def clear(self):
+        """
+        Drops every timer
+        """
+        for slot in self.slots:
+            slot.clear()
+
+        self.size = 0
+
+    def advance(self, now):
+        """
+        Calls the callbacks of the timers that are due as of now
+            Callbacks can schedule new timers. (Any that are already due are run by this call or the next one.)
+        """
+        nowTick = math.floor(now / self.tickLength)
+        if self.currentTick is None:
+            self.currentTick = nowTick
+
+        if nowTick - self.currentTick >= len(self.slots):
+            # A full turn or more has passed so every slot needs to be checked once
+            ticks = range(0, len(self.slots))
+        else:
+            # (The current tick's slot is checked again since its timers may not have all been due last time)
+            ticks = range(self.currentTick, nowTick + 1)
+
+        self.currentTick = nowTick
+
+        for tick in ticks:
+            index = tick % len(self.slots)
+            slot = self.slots[index]
+            if len(slot) == 0:
+                continue
+
+            # Swap in a new list first so the callbacks can schedule more timers in this slot
+            self.slots[index] = list()
+            for aTimer in slot:
+                if aTimer[1] is None:
+                    self.size -= 1
+                elif aTimer[0] <= now:
+                    self.size -= 1
+                    aTimer[1]()
+                else:
+                    self.slots[index].append(aTimer)
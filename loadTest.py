@@ -0,0 +1,349 @@
+"""
+Load-generation harness for the pyTanks server
+
+Starts a server on localhost (or uses one that's already running) and opens a number of synthetic player and viewer
+connections to it. Each player sends a random mix of Command_Go, Command_Turn, and Command_Fire commands and the
+viewers just take the game state updates. After a warm-up period these are measured:
+    serverFPS - The server's average and minimum FPS, read from the FPS lines it logs (Only available when the
+        server is started by this script)
+    updateInterval - The time between game state updates arriving at each client in milliseconds (jitter is the
+        standard deviation)
+    bytesPerSecond - The bytes of game state updates each client gets per second (Averaged over players and viewers)
+    latency - The time in milliseconds from a player sending a Command_Turn to it getting the first game state update
+        that shows its tank with the new heading (This includes the wait for the next update to be sent.)
+
+Usage:
+    python loadTest.py players=30 viewers=5 > results.json
+
+    These command line args can be appended to change the load:
+        players=n[,n...] - The number of players to connect (Default 15). A list of counts runs one step per count
+            with a fresh server for each step so the results can be used to chart a scaling curve.
+        viewers=n - The number of viewers to connect (Default 1)
+        duration=n - The number of seconds to measure for in each step (Default 20)
+        warmup=n - The number of seconds to wait after connecting before measuring (Default 5)
+        rate=n - The average number of commands each player sends per second (Default 5)
+        seed=n - The seed for the players' commands (Default 1)
+        workers=n - Passed on to start.py to run the server with n worker processes
+        port=n - The port to start the server on (Default 9043)
+        server=ip:port - Puts the load on a server that's already running instead of starting one
+
+    The results are printed as JSON with one entry per step. (The synthetic clients all run in this process so make
+    sure it isn't the bottleneck by watching its CPU usage on large runs.)
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import signal
+import sys
+
+import websockets
+
+import config
+from benchmark import percentile
+
+class clientStats:
+    """
+    Stores the measurements taken by one synthetic client
+    """
+    def __init__(self, clientType):
+        self.type = clientType
+        self.connected = False      # Set once the server accepts the client
+        self.refused = False        # Set if the server sent a fatal error (Like when it's full)
+        self.arrivals = list()      # The times game state updates arrived during the measurement window
+        self.bytes = 0              # The bytes of game state updates received during the measurement window
+        self.latencies = list()     # The command-to-update latencies measured in seconds (Players only)
+
+async def runPlayer(uri, stats, window, rate, rng):
+    """
+    Runs a synthetic player until the end of the measurement window
+    :param window: A tuple of the loop times the measurement window starts and ends at
+    :param rng: The random.Random to pick the commands with
+    """
+    loop = asyncio.get_event_loop()
+    commands = config.server.commands
+    # The heading and send time of the last Command_Turn that hasn't shown up in an update yet
+    #   Turns are only used as probes while the player's tank is alive since a dead tank's commands wait until the
+    #   next game. (alive is kept up to date by runClient())
+    playerState = {"probe": None, "alive": False}
+
+    async def sendCommands(websocket):
+        try:
+            while True:
+                await asyncio.sleep(rng.expovariate(rate))
+                action = rng.choice([commands.go, commands.turn, commands.fire])
+
+                if action == commands.go:
+                    message = {"action": action}
+                else:
+                    message = {"action": action, "arg": rng.uniform(0, 2 * math.pi)}
+
+                    if action == commands.turn and playerState["alive"]:
+                        playerState["probe"] = (message["arg"], loop.time())
+
+                await websocket.send(json.dumps(message))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    await runClient(uri, stats, window, sendCommands, playerState)
+
+async def runClient(uri, stats, window, sendCommands=None, playerState=None):
+    """
+    Connects a synthetic client and takes the measurements for it until the end of the measurement window
+    :param sendCommands: A coroutine function that's run with the websocket to send the client's commands (if any)
+    :param playerState: The player's latency probe state (See runPlayer())
+    """
+    loop = asyncio.get_event_loop()
+
+    try:
+        websocket = await websockets.connect(uri)
+    except (OSError, websockets.exceptions.InvalidHandshake):
+        stats.refused = True
+        return
+
+    sender = None
+    if sendCommands is not None:
+        sender = loop.create_task(sendCommands(websocket))
+
+    try:
+        while loop.time() < window[1]:
+            message = await asyncio.wait_for(websocket.recv(), window[1] - loop.time())
+            now = loop.time()
+
+            if isinstance(message, str) and message.startswith("[Fatal Error]"):
+                stats.refused = not stats.connected
+                break
+            elif isinstance(message, str) and message.startswith("["):
+                # A warning
+                continue
+
+            stats.connected = True
+
+            if playerState is not None:
+                gameState = json.loads(message)
+                playerState["alive"] = gameState["ongoingGame"] and gameState["myTank"]["alive"]
+
+                probe = playerState["probe"]
+                if probe is not None and gameState["myTank"]["heading"] == probe[0]:
+                    if now >= window[0]:
+                        stats.latencies.append(now - probe[1])
+                    playerState["probe"] = None
+
+            if now >= window[0]:
+                stats.arrivals.append(now)
+                stats.bytes += len(message.encode("utf-8")) if isinstance(message, str) else len(message)
+    except (websockets.exceptions.ConnectionClosed, asyncio.TimeoutError):
+        pass
+
+    if sender is not None:
+        sender.cancel()
+
+    await websocket.close()
+
+class serverProcess:
+    """
+    Runs start.py in a subprocess and collects the FPS values it logs
+    """
+    fpsPattern = re.compile(r"FPS: avg=([0-9.]+), min=([0-9.]+)")
+
+    def __init__(self, port, workers):
+        self.ipAndPort = "localhost:" + str(port)
+        self.workers = workers
+        self.process = None
+        self.fpsSamples = list()    # (avg, min) tuples for the FPS lines logged during the measurement window
+        self.measuring = False      # Set while the measurement window is open
+
+    async def start(self):
+        """
+        Starts the server and waits for it to be ready
+        """
+        args = [sys.executable, "-u", "start.py", "log=3", self.ipAndPort]
+        if self.workers is not None:
+            args.append("workers=" + str(self.workers))
+
+        self.process = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE,
+                                                            stderr=asyncio.subprocess.STDOUT,
+                                                            cwd=os.path.dirname(os.path.abspath(__file__)))
+
+        while True:
+            line = await asyncio.wait_for(self.process.stdout.readline(), 10)
+            if line == b"":
+                raise RuntimeError("The server exited before it started")
+            elif b"Server started" in line:
+                break
+
+        asyncio.get_event_loop().create_task(self.__readLog())
+
+    async def __readLog(self):
+        """
+        Reads the server's output and records the FPS lines
+        """
+        while True:
+            line = await self.process.stdout.readline()
+            if line == b"":
+                return
+
+            match = serverProcess.fpsPattern.search(line.decode("utf-8", "replace"))
+            if match is not None and self.measuring:
+                self.fpsSamples.append((float(match.group(1)), float(match.group(2))))
+
+    async def stop(self):
+        """
+        Stops the server the same way ctrl-C does
+        """
+        self.process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(self.process.wait(), 5)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+
+def summarizeIntervals(allStats):
+    """
+    :return: A dict of the p50, p99, and standard deviation of the times between updates in milliseconds
+    """
+    intervals = list()
+    for stats in allStats:
+        intervals.extend([(stats.arrivals[index] - stats.arrivals[index - 1]) * 1000
+                          for index in range(1, len(stats.arrivals))])
+
+    if len(intervals) == 0:
+        return None
+
+    intervals.sort()
+    mean = sum(intervals) / len(intervals)
+    return {
+        "p50": round(percentile(intervals, 50), 2),
+        "p99": round(percentile(intervals, 99), 2),
+        "jitter": round(math.sqrt(sum([(interval - mean) ** 2 for interval in intervals]) / len(intervals)), 2)
+    }
+
+def summarizeStep(allStats, server, duration):
+    """
+    :return: A dict of the results for a step
+    """
+    result = dict()
+    for clientType in [config.server.clientTypes.player, config.server.clientTypes.viewer]:
+        clients = [stats for stats in allStats if stats.type == clientType]
+        connected = [stats for stats in clients if stats.connected]
+
+        result[clientType + "s"] = {
+            "requested": len(clients),
+            "connected": len(connected),
+            "refused": len([stats for stats in clients if stats.refused]),
+            "updateInterval": summarizeIntervals(connected),
+            "bytesPerSecond": (round(sum([stats.bytes for stats in connected]) / len(connected) / duration, 1)
+                               if len(connected) != 0 else None)
+        }
+
+    latencies = sorted([latency * 1000 for stats in allStats for latency in stats.latencies])
+    result["latency"] = {
+        "samples": len(latencies),
+        "p50": round(percentile(latencies, 50), 2) if len(latencies) != 0 else None,
+        "p99": round(percentile(latencies, 99), 2) if len(latencies) != 0 else None
+    }
+
+    if server is not None and len(server.fpsSamples) != 0:
+        result["serverFPS"] = {
+            "avg": round(sum([sample[0] for sample in server.fpsSamples]) / len(server.fpsSamples), 1),
+            "min": min([sample[1] for sample in server.fpsSamples])
+        }
+    else:
+        result["serverFPS"] = None
+
+    return result
+
+async def runStep(settings, playerCount):
+    """
+    Runs one step of the load test with the given number of players
+    :return: The step's results (See summarizeStep())
+    """
+    loop = asyncio.get_event_loop()
+
+    server = None
+    ipAndPort = settings["server"]
+    if ipAndPort is None:
+        server = serverProcess(settings["port"], settings["workers"])
+        await server.start()
+        ipAndPort = server.ipAndPort
+
+    try:
+        baseURI = "ws://" + ipAndPort
+        start = loop.time()
+        window = (start + settings["warmup"], start + settings["warmup"] + settings["duration"])
+
+        tasks = list()
+        allStats = list()
+        for index in range(0, playerCount):
+            stats = clientStats(config.server.clientTypes.player)
+            rng = random.Random(settings["seed"] * 100003 + index)
+            tasks.append(runPlayer(baseURI + config.server.apiPaths.player, stats, window, settings["rate"], rng))
+            allStats.append(stats)
+
+        for index in range(0, settings["viewers"]):
+            stats = clientStats(config.server.clientTypes.viewer)
+            tasks.append(runClient(baseURI + config.server.apiPaths.viewer, stats, window))
+            allStats.append(stats)
+
+        async def openWindow():
+            await asyncio.sleep(max(window[0] - loop.time(), 0))
+            if server is not None:
+                server.measuring = True
+
+        tasks.append(openWindow())
+        await asyncio.gather(*tasks)
+    finally:
+        if server is not None:
+            await server.stop()
+
+    return summarizeStep(allStats, server, settings["duration"])
+
+def main():
+    """
+    Parse the command line args, run each step, and print the results
+    """
+    settings = {"viewers": 1, "duration": 20, "warmup": 5, "rate": 5, "seed": 1, "workers": None, "port": 9043,
+                "server": None}
+    playerCounts = [15]
+
+    for arg in sys.argv[1:]:
+        key, value = arg.partition("=")[::2]
+        try:
+            if key == "players":
+                playerCounts = [int(count) for count in value.split(",")]
+            elif key == "server":
+                settings["server"] = value
+            elif key in settings:
+                settings[key] = float(value) if key == "rate" else int(value)
+            else:
+                print(__doc__[__doc__.index("Usage:"):].strip(), file=sys.stderr)
+                return 2
+        except ValueError:
+            print("Invalid value for " + key, file=sys.stderr)
+            return 2
+
+    if settings["rate"] <= 0 or settings["duration"] <= 0:
+        print("rate and duration must be greater than 0", file=sys.stderr)
+        return 2
+
+    loop = asyncio.get_event_loop()
+    steps = list()
+    for playerCount in playerCounts:
+        print("Running with " + str(playerCount) + " players and " + str(settings["viewers"]) + " viewers...",
+              file=sys.stderr)
+        steps.append(loop.run_until_complete(runStep(settings, playerCount)))
+
+    print(json.dumps({
+        "duration": settings["duration"],
+        "warmup": settings["warmup"],
+        "rate": settings["rate"],
+        "workers": settings["workers"],
+        "steps": steps
+    }, indent=4, sort_keys=True))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+The framing used between the front-end process and the game worker processes (See workerPool.py)
+    Each frame is a header of uint8 kind, uint32 connID, uint8 payload type, and uint32 payload length (little-endian)
+    followed by the payload. The payload is either nothing, a UTF-8 string, or raw bytes so websocket text and
+    binary messages keep their type on the other side.
+
+    Front-end to worker:
+        connect:  A client connected on the path in the payload
+        message:  A message the client sent
+        sent:     The last message the worker forwarded has been sent to the client
+        pong:     The client answered the last ping
+        close:    The client disconnected
+    Worker to front-end:
+        message:  A message to send to the client
+        ping:     Ping the client
+        close:    Disconnect the client (After sending any messages forwarded before this)
+        stats:    The worker's stats as a JSON object (connID is unused)
+"""
+
+import asyncio
+import struct
+
+import websockets.exceptions     # (Spawned workers never call websockets.serve() so nothing else imports it)
+
+connectKind = 1
+messageKind = 2
+sentKind = 3
+pingKind = 4
+pongKind = 5
+closeKind = 6
+statsKind = 7
+
+__noPayload = 0
+__strPayload = 1
+__bytesPayload = 2
+
+__header = struct.Struct("<BIBI")
+headerSize = __header.size
+
+def encodeFrame(kind, connID, payload=None):
+    """
+    :param payload: None, a str, or bytes
+    :return: The frame as bytes
+    """
+    if payload is None:
+        return __header.pack(kind, connID, __noPayload, 0)
+    elif isinstance(payload, str):
+        data = payload.encode("utf-8")
+        return __header.pack(kind, connID, __strPayload, len(data)) + data
+    else:
+        return __header.pack(kind, connID, __bytesPayload, len(payload)) + payload
+
+def decodeHeader(header):
+    """
+    :param header: The first headerSize bytes of a frame
+    :return: A tuple of (kind, connID, payloadType, payloadLength)
+    """
+    return __header.unpack(header)
+
+def decodePayload(payloadType, data):
+    """
+    :return: The payload as None, a str, or bytes
+    """
+    if payloadType == __noPayload:
+        return None
+    elif payloadType == __strPayload:
+        return data.decode("utf-8")
+    else:
+        return data
+
+class ipcStream:
+    """
+    Sends and receives frames over a pair of asyncio streams
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.drainLock = asyncio.Lock()     # (Only one coroutine can wait on drain() at a time on older Pythons)
+
+    async def send(self, kind, connID, payload=None):
+        """
+        Writes a frame and waits for the stream's buffer to drain if it's full
+            Raises a ConnectionResetError if the stream has been closed.
+        """
+        if self.writer.transport.is_closing():
+            raise ConnectionResetError("The stream is closed")
+
+        self.writer.write(encodeFrame(kind, connID, payload))
+
+        async with self.drainLock:
+            await self.writer.drain()
+
+    async def receive(self):
+        """
+        :return: The next frame as a tuple of (kind, connID, payload) or None if the other end closed the stream
+        """
+        try:
+            kind, connID, payloadType, length = decodeHeader(await self.reader.readexactly(headerSize))
+            data = await self.reader.readexactly(length)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+
+        return kind, connID, decodePayload(payloadType, data)
+
+    def close(self):
+        """
+        Closes the stream
+        """
+        self.writer.close()
+
+class pipeSocket:
+    """
+    Stands in for a client's websocket inside a worker process
+        Implements the parts of the websockets API that wsServer uses by forwarding everything to the front-end
+        process, which owns the real websocket. send() doesn't return until the front-end has sent the message so
+        a slow client still holds up its send task the same way it would in single process mode.
+    """
+    def __init__(self, stream, connID):
+        self.stream = stream
+        self.connID = connID
+        self.isClosed = False
+
+        self.__incoming = asyncio.Queue()   # Messages from the client waiting for recv()
+        self.__sent = None                  # Resolved when the front-end acknowledges the message being sent
+        self.__pong = None                  # Resolved when the front-end gets a pong back from the client
+
+    async def send(self, message):
+        """
+        Forwards a message to the client and waits for the front-end to send it
+        """
+        if self.isClosed:
+            raise websockets.exceptions.ConnectionClosed(1006, "")
+
+        self.__sent = asyncio.get_event_loop().create_future()
+        await self.stream.send(messageKind, self.connID, message)
+        await self.__sent
+
+    async def recv(self):
+        """
+        :return: The next message from the client
+        """
+        message = await self.__incoming.get()
+        if message is None:
+            raise websockets.exceptions.ConnectionClosed(1006, "")
+
+        return message
+
+    async def ping(self):
+        """
+        :return: A future that's resolved when the pong comes back
+        """
+        if self.isClosed:
+            raise websockets.exceptions.ConnectionClosed(1006, "")
+
+        if self.__pong is None or self.__pong.done():
+            self.__pong = asyncio.get_event_loop().create_future()
+            await self.stream.send(pingKind, self.connID)
+
+        return self.__pong
+
+    def received(self, kind, payload):
+        """
+        Handles a frame from the front-end for this connection
+        """
+        if kind == messageKind:
+            self.__incoming.put_nowait(payload)
+        elif kind == sentKind:
+            if self.__sent is not None and not self.__sent.done():
+                self.__sent.set_result(None)
+        elif kind == pongKind:
+            if self.__pong is not None and not self.__pong.done():
+                self.__pong.set_result(None)
+        elif kind == closeKind:
+            self.closed()
+
+    def closed(self):
+        """
+        Marks the connection as closed and wakes up anything waiting on it
+        """
+        self.isClosed = True
+        self.__incoming.put_nowait(None)
+
+        if self.__sent is not None and not self.__sent.done():
+            self.__sent.set_exception(websockets.exceptions.ConnectionClosed(1006, ""))
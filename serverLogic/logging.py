@@ -6,12 +6,14 @@ import math
 
 import config
 
+prefix = ""     # Put in front of every message (Set by worker processes to tell their output apart)
+
 def logPrint(message, minLevel):
     """
     Log a message with the given level
     """
     if config.server.logLevel >= minLevel:
-        print(message)
+        print(prefix + message)
 
 def round(num, precision):
     """
@@ -0,0 +1,232 @@
+"""
+Counters and gauges for the server's IO served in the Prometheus text format
+    wsServer.py and serverData.py count the messages and bytes going in and out, connections, refused connections,
+    rejected commands, client errors, and keep-alive pings with increment(). The gauges (connected clients, queue
+    depths, the size of each arena's viewer history, and the client health stats) are read from serverData and
+    gameData when the metrics are scraped.
+
+    The client health stats are summed up or summarized (median, 90th percentile, and max) by client type rather than
+    given a series per client so the number of series doesn't grow with the number of clients. A client's counts are
+    kept in the totals after it disconnects. (See retireClient())
+
+    The metrics are served over plain HTTP at /metrics on config.server.metricsIpAndPort. When running with worker
+    processes each worker sends its metrics to the front-end with its stats every fpsLogRate seconds and the front-end
+    serves them all with a worker label added. (So in that mode they can be up to fpsLogRate seconds old.)
+"""
+
+import asyncio
+import collections
+import time
+
+import config
+from .logging import logPrint
+
+# The type and help text for each metric in the order they're listed
+__families = collections.OrderedDict([
+    ("pytanks_messages_sent_total", ("counter", "Messages sent to clients")),
+    ("pytanks_bytes_sent_total", ("counter", "Bytes of messages sent to clients")),
+    ("pytanks_messages_received_total", ("counter", "Messages received from clients")),
+    ("pytanks_bytes_received_total", ("counter", "Bytes of messages received from clients")),
+    ("pytanks_commands_rejected_total", ("counter", "Messages from clients that weren't valid commands")),
+    ("pytanks_commands_dropped_total", ("counter", "Commands dropped because the player's command buffer was full")),
+    ("pytanks_client_errors_total", ("counter", "Error messages sent to clients")),
+    ("pytanks_connections_total", ("counter", "Clients that connected")),
+    ("pytanks_disconnections_total", ("counter", "Clients that disconnected")),
+    ("pytanks_connections_refused_total", ("counter", "Connections refused because the server was full or the path "
+                                                      "or its options were invalid")),
+    ("pytanks_pings_sent_total", ("counter", "Keep-alive pings sent to clients")),
+    ("pytanks_ping_timeouts_total", ("counter", "Clients disconnected for not answering a keep-alive ping")),
+    ("pytanks_ping_rtt_seconds", ("summary", "Round trip times of the keep-alive pings")),
+    ("pytanks_clients", ("gauge", "Connected clients")),
+    ("pytanks_queued_messages", ("gauge", "Messages waiting to be sent to clients")),
+    ("pytanks_viewer_history_bytes", ("gauge", "Bytes of viewer updates kept for catching up and delayed viewers")),
+    ("pytanks_viewer_history_updates", ("gauge", "Viewer updates kept for catching up and delayed viewers")),
+    ("pytanks_client_queue_depth", ("summary", "Messages waiting to be sent to each client")),
+    ("pytanks_client_updates_skipped_total", ("counter", "Game state updates clients were too slow to be sent")),
+    ("pytanks_client_messages_dropped_total", ("counter", "Messages dropped because their client was being "
+                                                          "disconnected")),
+    ("pytanks_client_commands_coalesced_total", ("counter", "Commands replaced by a newer one before they were "
+                                                            "applied")),
+    ("pytanks_client_last_ping_rtt_seconds", ("summary", "Round trip time of each client's last keep-alive ping")),
+    ("pytanks_client_idle_seconds", ("summary", "Time since the last message or pong from each client"))
+])
+
+# The quantiles given for the client health summaries (1 is the max)
+__quantiles = [0.5, 0.9, 1]
+
+__counters = dict()     # The value of each counter keyed by (name, labels) where labels is a sorted tuple of pairs
+__sources = list()      # Functions returning extra samples to serve (See addSource())
+
+def increment(name, amount=1, **labels):
+    """
+    Adds amount to a counter
+    :param labels: The counter's labels as strings
+    """
+    key = (name, tuple(sorted(labels.items())))
+    __counters[key] = __counters.get(key, 0) + amount
+
+def observePing(roundTripTime):
+    """
+    Records the round trip time of a keep-alive ping in seconds
+    """
+    increment("pytanks_ping_rtt_seconds_sum", roundTripTime)
+    increment("pytanks_ping_rtt_seconds_count")
+
+def retireClient(client):
+    """
+    Adds a disconnected client's counts to the client health counters (Called by serverData.removeClient())
+    """
+    increment("pytanks_client_updates_skipped_total", client.conflatedCount, type=client.type)
+    increment("pytanks_client_messages_dropped_total", client.droppedCount, type=client.type)
+
+    if client.isPlayer():
+        increment("pytanks_client_commands_coalesced_total", client.incoming.coalescedCount, type=client.type)
+
+def __summarize(name, labels, values):
+    """
+    :param labels: The summary's labels other than the quantile
+    :param values: A list of the values to summarize
+    :return: A list of samples with each of __quantiles of values plus its sum and count
+    """
+    result = list()
+    if len(values) != 0:
+        values = sorted(values)
+        for quantile in __quantiles:
+            value = values[min(int(quantile * len(values)), len(values) - 1)]
+            result.append((name, labels + (("quantile", str(quantile)),), value))
+
+    result.append((name + "_sum", labels, sum(values)))
+    result.append((name + "_count", labels, len(values)))
+    return result
+
+def addSource(source):
+    """
+    Adds a function that's called for more samples whenever the metrics are served (Used by workerPool.py)
+    :param source: A function taking no arguments that returns a list of samples (See samples(). The labels have to be
+        tuples so they can be sorted with the others.)
+    """
+    __sources.append(source)
+
+def samples():
+    """
+    :return: A list of every sample as a (name, labels, value) tuple where labels is a tuple of (label, value) pairs
+    """
+    from . import serverData    # (Imported here since serverData uses this module)
+    from gameLogic import gameData
+
+    counters = dict(__counters)     # (The connected clients' counts are added to these below. See retireClient())
+    now = time.monotonic()
+    result = list()
+    for clientType in [config.server.clientTypes.player, config.server.clientTypes.viewer]:
+        clients = [client for client in serverData.clients.values() if client.type == clientType]
+        labels = (("type", clientType),)
+        queueDepths = [client.queueDepth() for client in clients]
+        result.append(("pytanks_clients", labels, len(clients)))
+        result.append(("pytanks_queued_messages", labels, sum(queueDepths)))
+
+        result.extend(__summarize("pytanks_client_queue_depth", labels, queueDepths))
+        result.extend(__summarize("pytanks_client_last_ping_rtt_seconds", labels,
+                                  [client.pingRTT for client in clients if client.pingRTT is not None]))
+        result.extend(__summarize("pytanks_client_idle_seconds", labels,
+                                  [round(now - client.lastReceived, 3) for client in clients]))
+
+        counts = [("pytanks_client_updates_skipped_total", sum([client.conflatedCount for client in clients])),
+                  ("pytanks_client_messages_dropped_total", sum([client.droppedCount for client in clients]))]
+        if clientType == config.server.clientTypes.player:
+            counts.append(("pytanks_client_commands_coalesced_total",
+                           sum([client.incoming.coalescedCount for client in clients])))
+
+        for name, count in counts:
+            counters[(name, labels)] = counters.get((name, labels), 0) + count
+
+    result.extend([(name, labels, value) for (name, labels), value in counters.items()])
+
+    for arenaName, anArena in gameData.arenas.items():
+        for updateFormat, history in anArena.history.items():
+            labels = (("arena", arenaName), ("format", updateFormat))
+            result.append(("pytanks_viewer_history_bytes", labels, history.totalBytes))
+            result.append(("pytanks_viewer_history_updates", labels, len(history)))
+
+    for source in __sources:
+        result.extend(source())
+
+    return result
+
+def __family(name):
+    """
+    :return: The name of the metric family a sample belongs to (Summaries have _sum and _count samples)
+    """
+    for suffix in ["_sum", "_count"]:
+        if name.endswith(suffix) and name[:-len(suffix)] in __families:
+            return name[:-len(suffix)]
+
+    return name
+
+def render():
+    """
+    :return: Every sample in the Prometheus text exposition format
+    """
+    grouped = collections.OrderedDict([(family, list()) for family in __families])
+    for name, labels, value in samples():
+        grouped[__family(name)].append((name, labels, value))
+
+    lines = list()
+    for family, familySamples in grouped.items():
+        metricType, helpText = __families[family]
+        lines.append("# HELP " + family + " " + helpText)
+        lines.append("# TYPE " + family + " " + metricType)
+
+        for name, labels, value in sorted(familySamples, key=lambda sample: sample[:2]):
+            if len(labels) != 0:
+                name += ("{" + ",".join([label + '="' + str(labelValue).replace("\\", "\\\\").replace('"', '\\"') +
+                                         '"' for label, labelValue in labels]) + "}")
+
+            lines.append(name + " " + repr(float(value)))
+
+    return "\n".join(lines) + "\n"
+
+async def __scrapeHandler(reader, writer):
+    """
+    Answers one HTTP request with the metrics (Any path other than /metrics gets a 404)
+    """
+    try:
+        requestLine = await asyncio.wait_for(reader.readline(), 5)
+
+        # Skip the headers
+        while True:
+            line = await asyncio.wait_for(reader.readline(), 5)
+            if line in [b"\r\n", b"\n", b""]:
+                break
+
+        request = requestLine.decode("latin-1").split()
+        if len(request) >= 2 and request[0] == "GET" and request[1].partition("?")[0] == "/metrics":
+            status = "200 OK"
+            body = render().encode("utf-8")
+        else:
+            status = "404 Not Found"
+            body = b"Not found\n"
+
+        writer.write(("HTTP/1.1 " + status + "\r\n" +
+                      "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n" +
+                      "Content-Length: " + str(len(body)) + "\r\n" +
+                      "Connection: close\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+
+    writer.close()
+
+async def serve():
+    """
+    Starts the HTTP listener for the metrics on config.server.metricsIpAndPort (if it's set)
+        The server keeps running without it if the address can't be used.
+    """
+    if config.server.metricsIpAndPort is None:
+        return
+
+    ip, port = config.server.metricsIpAndPort.rsplit(":", 1)
+    try:
+        await asyncio.start_server(__scrapeHandler, ip, int(port))
+        logPrint("Serving metrics at http://" + config.server.metricsIpAndPort + "/metrics", 2)
+    except (OSError, ValueError) as e:
+        logPrint("Couldn't serve metrics on " + config.server.metricsIpAndPort + ": " + str(e), 1)
@@ -2,33 +2,113 @@
 Holds the server's data structure and the functions for interacting with it
 """
 
+import config
+from dataModels import broadcastChannel
+from gameLogic.timerWheel import timerWheel
+from . import metrics
 from .logging import logPrint
 
 clients = dict()        # Each entry is one active client
+channels = dict()       # The broadcastChannel for each (arenaName, clientType, updateFormat, delay) with subscribers
 
-def send(recipients, message):
+# The timers for the keep-alive checks (Deadlines are on time.monotonic() and gameClock.py advances it every frame)
+timers = timerWheel(0.1)
+
+def getChannel(arenaName, clientType, updateFormat, delay=0):
+    """
+    :param delay: The number of seconds the channel's updates are behind the game (See client.delay)
+    :return: The broadcastChannel for clients in the given arena of the given type, update format, and delay (Created
+        if needed)
+    """
+    key = (arenaName, clientType, updateFormat, delay)
+    if key not in channels:
+        channels[key] = broadcastChannel()
+
+    return channels[key]
+
+def addClient(clientID, client):
+    """
+    Adds a client to the dictionary of active clients and subscribes it to its broadcast channel
+        (Delta format clients don't get a channel since each of their updates is different.)
+    """
+    clients[clientID] = client
+
+    if not client.usesFormat(config.server.updateFormats.delta):
+        getChannel(client.arena, client.type, client.updateFormat, client.delay).subscribe(clientID, client)
+
+def removeClient(clientID):
+    """
+    Removes a client from the dictionary of active clients and from its broadcast channel
+        The channel is removed too if this was its last subscriber.
+    """
+    client = clients.pop(clientID)
+    metrics.retireClient(client)
+
+    if client.channel is not None:
+        channel = client.channel
+        channel.unsubscribe(clientID, client)
+
+        if len(channel.subscribers) == 0:
+            del channels[(client.arena, client.type, client.updateFormat, client.delay)]
+
+def delays(arenaName, clientType, updateFormat):
+    """
+    :return: A list of the delays of the channels with subscribers for the given arena, client type, and update format
+        other than the live one
+    """
+    return [key[3] for key in channels if key[:3] == (arenaName, clientType, updateFormat) and key[3] != 0]
+
+def send(recipients, message, updateFormat=config.server.updateFormats.json, isState=False, arenaName=None,
+         delay=0):
     """
-    Appends a message to the outgoing queues for the indicated client(s)
+    Sends a message to the indicated client(s)
+        Any clients that have fallen too far behind on their updates are disconnected. (See client.isBehind())
     :param recipients: A valid int clientID or a type in config.server.clientTypes
+        Messages sent to a type are published once on the broadcast channel for that type, updateFormat, and arena
+        instead of being added to each client's outgoing queue.
+    :param updateFormat: The update format of the clients to send to when sending to a type
+    :param isState: If True the message is a game state update that replaces any older one the client hasn't been
+        sent yet (Messages sent to a type are always treated this way)
+    :param arenaName: The name of the arena with the clients to send to when sending to a type
+    :param delay: The delay of the clients to send to when sending to a type (See client.delay)
     """
     if isinstance(recipients, int):
-        clients[recipients].outgoing.append(message)
+        if isState:
+            clients[recipients].queueState(message)
+        else:
+            clients[recipients].queueMessage(message)
+
+        recipientList = [recipients]
+    elif (arenaName, recipients, updateFormat, delay) in channels:
+        channel = channels[(arenaName, recipients, updateFormat, delay)]
+        channel.publish(message)
+
+        recipientList = list(channel.subscribers.keys())
     else:
-        for clientID in clients:
-            if clients[clientID].type == recipients:
-                clients[clientID].outgoing.append(message)
+        # Nobody to send to
+        return
 
-    logPrint("Message added to send queue for " + str(recipients) + ": " + message, 4)
+    if isinstance(message, str):
+        logPrint("Message added to send queue for " + str(recipients) + ": " + message, 4)
+    else:
+        logPrint("Binary message of " + str(len(message)) + " bytes added to send queue for " + str(recipients), 4)
+
+    for clientID in recipientList:
+        if not clients[clientID].closing and clients[clientID].isBehind():
+            reportClientError(clientID, "Connection too slow to keep up with game state updates", True)
 
 def reportClientError(clientID, errorMessage, isFatal):
     """
     Appends an error message to a misbehaving client's outing queue
-    :param isFatal: If this is True the client is also kicked
+    :param isFatal: If this is True the client is also kicked (Anything else waiting to be sent to it is dropped)
     """
+    metrics.increment("pytanks_client_errors_total", type=clients[clientID].type, fatal=str(isFatal).lower())
+
     if isFatal:
         errorMessage = "[Fatal Error] " + errorMessage
+        clients[clientID].queueFatal(errorMessage)
     else:
         errorMessage = "[Warning] " + errorMessage
+        clients[clientID].queueMessage(errorMessage)
 
-    clients[clientID].outgoing.append(errorMessage)
-    logPrint("Error sent to client " + str(clientID) + ": " + errorMessage, 2)
\ No newline at end of file
+    logPrint("Error sent to client " + str(clientID) + ": " + errorMessage, 2)
@@ -0,0 +1,284 @@
+"""
+Runs the game in a pool of worker processes so the server can use more than one core
+    Used when config.server.workerCount is set. This process (the front-end) only handles the websockets. Each client
+    is routed to one of the workers, which runs the usual client handler, matchmaker, and game clock for its own
+    arenas. Everything the client sends and everything the worker sends back goes over a socket pair between the two
+    processes. (See ipc.py for the framing.)
+
+    Clients that name an arena are always routed to the same worker for that name. Players that don't are sent to a
+    worker with a partly filled arena if there is one and otherwise to the least loaded worker. Viewers that don't go
+    to the worker with the most players.
+
+    If a worker crashes its clients are disconnected with an error and a new worker is started in its place.
+"""
+
+import asyncio
+import itertools
+import json
+import multiprocessing
+import socket
+import zlib
+from urllib.parse import parse_qs
+
+import websockets
+
+import config
+from . import ipc, metrics
+from .logging import logPrint
+
+class worker:
+    """
+    Stores the front-end's state for one worker process
+    """
+    def __init__(self, index):
+        self.index = index
+        self.process = None         # The worker's multiprocessing.Process
+        self.stream = None          # The ipc.ipcStream to the worker (None while the worker is down)
+        self.restarts = 0           # The number of times the worker has been restarted
+
+        self.sockets = dict()       # The websocket of each client routed to the worker keyed by connID
+        self.outgoing = dict()      # The asyncio.Queue of messages from the worker for each client keyed by connID
+        self.players = 0            # The number of players routed to the worker
+        self.stats = dict()         # The last stats the worker reported (See wsServer.__workerStatsTask())
+
+    def isUp(self):
+        """
+        :return: A boolean indicating if the worker is running and can take clients
+        """
+        return self.stream is not None
+
+__workers = list()                  # The worker objects for the pool
+__connIDs = itertools.count(1)      # Source of the ids used for clients on the socket pairs
+
+# Workers are spawned rather than forked so they don't inherit the front-end's listening sockets, client connections,
+# or event loop (Everything a worker needs is passed to __workerMain())
+__processContext = multiprocessing.get_context("spawn")
+
+def __workerMain(workerIndex, workerSocket, serverSettings):
+    """
+    The entry point of a worker process
+    :param serverSettings: The front-end's config.server values so any command line overrides apply to the worker too
+    """
+    for key, value in serverSettings.items():
+        setattr(config.server, key, value)
+
+    from .wsServer import runWorker
+    runWorker(workerIndex, workerSocket)
+
+async def __sendToWorker(stream, kind, connID, payload=None):
+    """
+    Sends a frame to a worker, ignoring the error if the worker has gone down
+    """
+    try:
+        await stream.send(kind, connID, payload)
+    except ConnectionError:
+        pass
+
+async def __startWorker(aWorker):
+    """
+    Starts a worker process and connects to it
+    """
+    serverSettings = {key: value for key, value in vars(config.server).items()
+                      if not key.startswith("_") and not isinstance(value, type)}
+
+    frontEndSocket, workerSocket = socket.socketpair()
+    aWorker.process = __processContext.Process(target=__workerMain,
+                                               args=(aWorker.index, workerSocket, serverSettings), daemon=True)
+    aWorker.process.start()
+    workerSocket.close()
+
+    reader, writer = await asyncio.open_connection(sock=frontEndSocket)
+    aWorker.stream = ipc.ipcStream(reader, writer)
+    logPrint("Worker " + str(aWorker.index) + " started (pid: " + str(aWorker.process.pid) + ")", 1)
+
+async def __pingClient(aWorker, stream, connID):
+    """
+    Pings a client for its worker and reports back when the pong comes in
+    """
+    try:
+        pong = await aWorker.sockets[connID].ping()
+        await pong
+    except (websockets.exceptions.ConnectionClosed, KeyError):
+        return
+
+    await __sendToWorker(stream, ipc.pongKind, connID)
+
+async def __superviseWorker(aWorker):
+    """
+    Runs a worker, forwarding the frames it sends, and restarts it if it exits
+    """
+    while True:
+        await __startWorker(aWorker)
+        stream = aWorker.stream
+
+        while True:
+            frame = await stream.receive()
+            if frame is None:
+                break
+
+            kind, connID, payload = frame
+            if kind == ipc.statsKind:
+                aWorker.stats = json.loads(payload)
+            elif connID not in aWorker.outgoing:
+                # The client has already disconnected
+                continue
+            elif kind == ipc.messageKind:
+                aWorker.outgoing[connID].put_nowait(payload)
+            elif kind == ipc.closeKind:
+                aWorker.outgoing[connID].put_nowait(None)
+            elif kind == ipc.pingKind:
+                asyncio.get_event_loop().create_task(__pingClient(aWorker, stream, connID))
+
+        # The worker has exited so disconnect its clients and start a new one
+        aWorker.stream = None
+        aWorker.stats = dict()
+        stream.close()
+
+        for queue in aWorker.outgoing.values():
+            queue.put_nowait("[Fatal Error] The server hit an error while running your game - please reconnect")
+            queue.put_nowait(None)
+
+        await asyncio.get_event_loop().run_in_executor(None, aWorker.process.join)
+        logPrint("Worker " + str(aWorker.index) + " exited with code " + str(aWorker.process.exitcode) +
+                 " - restarting it", 1)
+        aWorker.restarts += 1
+
+        await asyncio.sleep(1)
+
+async def __logStats():
+    """
+    Logs the aggregate stats of the workers every fpsLogRate seconds
+    """
+    while True:
+        await asyncio.sleep(config.server.fpsLogRate)
+
+        allStats = [aWorker.stats for aWorker in __workers]
+        logPrint("Workers: up=" + str(len([aWorker for aWorker in __workers if aWorker.isUp()])) + "/" +
+                 str(len(__workers)) + ", restarts=" + str(sum([aWorker.restarts for aWorker in __workers])) +
+                 "; Clients: players=" + str(sum([stats.get("players", 0) for stats in allStats])) +
+                 ", viewers=" + str(sum([stats.get("viewers", 0) for stats in allStats])) +
+                 ", arenas=" + str(sum([len(stats.get("arenas", ())) for stats in allStats])), 3)
+
+def __workerSamples():
+    """
+    :return: The metrics samples the workers last reported with a worker label added (See metrics.addSource())
+    """
+    samples = list()
+    for aWorker in __workers:
+        for name, labels, value in aWorker.stats.get("metrics", list()):
+            labels = tuple(sorted([tuple(pair) for pair in labels] + [("worker", str(aWorker.index))]))
+            samples.append((name, labels, value))
+
+    return samples
+
+async def runWorkers():
+    """
+    Starts config.server.workerCount workers and keeps them running
+    """
+    for index in range(0, config.server.workerCount):
+        __workers.append(worker(index))
+
+    metrics.addSource(__workerSamples)
+
+    tasks = [__superviseWorker(aWorker) for aWorker in __workers]
+    if config.server.logLevel >= 3:
+        tasks.append(__logStats())
+
+    await asyncio.gather(*tasks)
+
+def __routeClient(isPlayer, arenaName):
+    """
+    Picks the worker for a new client
+    :param arenaName: The name of the arena the client asked for or None
+    :return: The worker or None if there isn't one that can take the client
+    """
+    if arenaName is not None:
+        # Names made by a worker's matchmaker start with its index and any others are hashed
+        prefix = arenaName.partition("-")[0]
+        if prefix.isdigit() and int(prefix) < len(__workers):
+            aWorker = __workers[int(prefix)]
+        else:
+            aWorker = __workers[zlib.crc32(arenaName.encode("utf-8")) % len(__workers)]
+
+        return aWorker if aWorker.isUp() else None
+
+    candidates = [aWorker for aWorker in __workers if aWorker.isUp()]
+    if isPlayer:
+        capacity = min(config.server.maxArenas * config.server.maxPlayers, len(config.server.tankNames))
+        candidates = [aWorker for aWorker in candidates if aWorker.players < capacity]
+
+    if len(candidates) == 0:
+        return None
+    elif isPlayer:
+        partlyFilled = [aWorker for aWorker in candidates if aWorker.players % config.server.maxPlayers != 0]
+        if len(partlyFilled) != 0:
+            return max(partlyFilled, key=lambda aWorker: aWorker.players)
+        else:
+            return min(candidates, key=lambda aWorker: aWorker.players)
+    else:
+        return max(candidates, key=lambda aWorker: aWorker.players)
+
+async def __forwardTask(aWorker, stream, connID):
+    """
+    Sends the messages a worker forwards to a client and acknowledges each one once it's sent
+        Exits and closes the websocket when it gets None from the queue.
+    """
+    websocket = aWorker.sockets[connID]
+    queue = aWorker.outgoing[connID]
+
+    while True:
+        message = await queue.get()
+        if message is None:
+            break
+
+        try:
+            await websocket.send(message)
+        except websockets.exceptions.ConnectionClosed:
+            break
+
+        await __sendToWorker(stream, ipc.sentKind, connID)
+
+    await websocket.close()
+
+async def frontEndHandler(websocket, path):
+    """
+    Routes a client to a worker and passes messages between the two until either side disconnects
+    """
+    basePath, query = path.partition("?")[::2]
+    isPlayer = basePath.startswith(config.server.apiPaths.player)
+    aWorker = __routeClient(isPlayer, parse_qs(query).get("arena", [None])[0])
+
+    if aWorker is None:
+        logPrint("A client tried to connect but no worker has room for it - connection refused", 1)
+        metrics.increment("pytanks_connections_refused_total", reason="full")
+        await websocket.send("[Fatal Error] Server full; please try again later")
+        return  # Returning from this function disconnects the client
+
+    connID = next(__connIDs)
+    stream = aWorker.stream
+    aWorker.sockets[connID] = websocket
+    aWorker.outgoing[connID] = asyncio.Queue()
+    if isPlayer:
+        aWorker.players += 1
+
+    logPrint("Client #" + str(connID) + " routed to worker " + str(aWorker.index), 2)
+
+    await __sendToWorker(stream, ipc.connectKind, connID, path)
+    forwardTask = asyncio.get_event_loop().create_task(__forwardTask(aWorker, stream, connID))
+
+    try:
+        while True:
+            message = await websocket.recv()
+            await __sendToWorker(stream, ipc.messageKind, connID, message)
+    except websockets.exceptions.ConnectionClosed:
+        pass
+
+    # Clean up after the client
+    await __sendToWorker(stream, ipc.closeKind, connID)
+    aWorker.outgoing[connID].put_nowait(None)
+    await forwardTask
+
+    del aWorker.sockets[connID]
+    del aWorker.outgoing[connID]
+    if isPlayer:
+        aWorker.players -= 1
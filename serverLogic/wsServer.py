@@ -6,13 +6,60 @@ The pyTanks server backend and asyncio code
 import asyncio
 import websockets
 import random
+import json
+import time
+from urllib.parse import parse_qs
 
 import config
 import dataModels
-from . import serverData
+from . import serverData, ipc, metrics, workerPool
+from . import logging as serverLogging
 from .logging import logPrint
 from gameLogic.gameClock import gameClock
-from gameLogic import gameData
+from gameLogic import gameData, matchmaker
+
+# Maps each valid API path to the type of client and the update format it's for
+__apiPaths = {
+    config.server.apiPaths.viewer: (config.server.clientTypes.viewer, config.server.updateFormats.json),
+    config.server.apiPaths.viewerDelta: (config.server.clientTypes.viewer, config.server.updateFormats.delta),
+    config.server.apiPaths.viewerBinary: (config.server.clientTypes.viewer, config.server.updateFormats.binary),
+    config.server.apiPaths.player: (config.server.clientTypes.player, config.server.updateFormats.json),
+    config.server.apiPaths.playerDelta: (config.server.clientTypes.player, config.server.updateFormats.delta),
+    config.server.apiPaths.playerBinary: (config.server.clientTypes.player, config.server.updateFormats.binary)
+}
+
+def __historyOptions(clientType, updateFormat, query):
+    """
+    Parses the options for watching from an arena's history out of a viewer's query string
+        "delay=n" puts the viewer's updates n seconds behind the game and "catchUp=1" sends it the updates from the
+        arena's history when it connects. (See config.server.viewerHistorySeconds) Only the viewer paths that share
+        their updates between viewers support them.
+    :return: A tuple of (delay, catchUp)
+    :raise: ValueError if the options are invalid
+    """
+    delay = query.get("delay", ["0"])[0]
+    catchUp = query.get("catchUp", ["0"])[0]
+    if delay == "0" and catchUp == "0":
+        return 0, False
+
+    if (clientType != config.server.clientTypes.viewer or updateFormat == config.server.updateFormats.delta or
+            config.server.viewerHistorySeconds <= 0):
+        raise ValueError("delay and catchUp aren't supported on this API path")
+
+    if not delay.isdigit() or int(delay) > config.server.viewerHistorySeconds:
+        raise ValueError("delay must be a whole number of seconds from 0 to " +
+                         str(config.server.viewerHistorySeconds))
+
+    if catchUp not in ["0", "1"]:
+        raise ValueError("catchUp must be 0 or 1")
+
+    return int(delay), catchUp == "1"
+
+def __messageSize(message):
+    """
+    :return: The size of a str or bytes message in bytes
+    """
+    return len(message.encode("utf-8")) if isinstance(message, str) else len(message)
 
 async def __playerReceiveTask(clientID):
     """
@@ -21,6 +68,9 @@ async def __playerReceiveTask(clientID):
     try:
         while clientID in serverData.clients:
             message = await serverData.clients[clientID].socket.recv()
+            metrics.increment("pytanks_messages_received_total", type=config.server.clientTypes.player)
+            metrics.increment("pytanks_bytes_received_total", __messageSize(message),
+                              type=config.server.clientTypes.player)
 
             if isinstance(message, str):
                 logPrint("Got message from " + str(clientID) + ": " + message, 4)
@@ -29,8 +79,16 @@ async def __playerReceiveTask(clientID):
 
                 if command.action == config.server.commands.setInfo:
                     serverData.clients[clientID].tank.info = command.arg
-                else:
-                    serverData.clients[clientID].incoming.append(command)
+                elif command.action == config.server.commands.keyframe:
+                    serverData.clients[clientID].requestKeyframe()
+                elif not serverData.clients[clientID].incoming.push(command):
+                    # The player has sent more commands than fit in its buffer since the last frame
+                    metrics.increment("pytanks_commands_dropped_total", type=config.server.clientTypes.player)
+
+                    if serverData.clients[clientID].incoming.droppedCount == 1:
+                        # (Only the first time so the warnings can't pile up in the client's queue)
+                        serverData.reportClientError(clientID, "Too many commands sent in one frame - extra commands "
+                                                               "are being dropped", False)
             else:
                 raise ValueError("Only strings are supported")
     except websockets.exceptions.ConnectionClosed:
@@ -38,42 +96,115 @@ async def __playerReceiveTask(clientID):
         pass
     except ValueError as e:
         # Bad command so send error to client and disconnect
+        metrics.increment("pytanks_commands_rejected_total", type=config.server.clientTypes.player)
         serverData.reportClientError(clientID, e.args[0], True)
 
     logPrint("playerReceiveTask for client #" + str(clientID) + " exited", 2)
 
+async def __viewerReceiveTask(clientID):
+    """
+    Handles incoming messages from a viewer on the delta API path
+        The only message viewers can send is a keyframe request.
+    """
+    try:
+        while clientID in serverData.clients:
+            message = await serverData.clients[clientID].socket.recv()
+            metrics.increment("pytanks_messages_received_total", type=config.server.clientTypes.viewer)
+            metrics.increment("pytanks_bytes_received_total", __messageSize(message),
+                              type=config.server.clientTypes.viewer)
+            logPrint("Got message from " + str(clientID) + ": " + str(message), 4)
+
+            if not isinstance(message, str) or dataModels.command(message).action != config.server.commands.keyframe:
+                raise ValueError("Viewers can only send " + config.server.commands.keyframe + " commands")
+
+            serverData.clients[clientID].receivedMsg()
+            serverData.clients[clientID].requestKeyframe()
+    except websockets.exceptions.ConnectionClosed:
+        # The socket closed
+        pass
+    except ValueError as e:
+        # Bad command so send error to client and disconnect
+        metrics.increment("pytanks_commands_rejected_total", type=config.server.clientTypes.viewer)
+        serverData.reportClientError(clientID, e.args[0], True)
+
+    logPrint("viewerReceiveTask for client #" + str(clientID) + " exited", 2)
+
+def __checkTimeout(clientID, client):
+    """
+    Called by serverData.timers once a client may have been quiet for config.server.timeout seconds
+        The first time that happens the client's send task is asked to ping it. If the client still hasn't sent
+        anything (including the pong) after another timeout the send task is told to disconnect it.
+    """
+    if serverData.clients.get(clientID) is not client:
+        # The client has disconnected
+        return
+
+    now = time.monotonic()
+
+    if client.pingSentAt is not None:
+        if client.lastReceived < client.pingSentAt:
+            # The ping went unanswered
+            metrics.increment("pytanks_ping_timeouts_total", type=client.type)
+            client.timedOut = True
+            client.wakeUp.set()
+            return
+        else:
+            # Pong came back so client is alive
+            client.pingSentAt = None
+
+    if client.lastReceived + config.server.timeout > now:
+        # Heard from the client since this check was scheduled so check again a timeout after that
+        deadline = client.lastReceived + config.server.timeout
+    else:
+        # Check that the client is still around
+        client.pingDue = True
+        client.pingSentAt = now
+        client.wakeUp.set()
+        deadline = now + config.server.timeout
+
+    serverData.timers.schedule(deadline, lambda: __checkTimeout(clientID, client))
+
 async def __clientSendTask(clientID):
     """
-    Handles sending queued messages to a client
+    Handles sending queued messages and keep-alive pings to a client
     """
-    pendingPing = None
+    client = serverData.clients[clientID]
+
+    def onPong(future, sentAt):
+        # A pong counts as hearing from the client (See __checkTimeout())
+        if not future.cancelled() and future.exception() is None:
+            client.receivedMsg()
+            client.pingRTT = client.lastReceived - sentAt
+            metrics.observePing(client.pingRTT)
 
     try:
         while clientID in serverData.clients:
-            if len(serverData.clients[clientID].outgoing) != 0:
-                message = serverData.clients[clientID].outgoing.pop(0)
-                await serverData.clients[clientID].socket.send(message)
+            if client.timedOut:
+                logPrint("clientSendTask for client #" + str(clientID) + " exited due to connection timeout", 2)
+                return
+
+            if client.pingDue:
+                client.pingDue = False
+                sentAt = time.monotonic()
+                pong = await client.socket.ping()
+                pong.add_done_callback(lambda future, sentAt=sentAt: onPong(future, sentAt))
+                metrics.increment("pytanks_pings_sent_total", type=client.type)
+                logPrint("Sent keep-alive ping to client #" + str(clientID), 4)
+
+            message = client.nextMessage()
 
-                if message.startswith("[Fatal Error]"):
+            if message is not None:
+                await client.socket.send(message)
+                metrics.increment("pytanks_messages_sent_total", type=client.type)
+                metrics.increment("pytanks_bytes_sent_total", __messageSize(message), type=client.type)
+
+                if isinstance(message, str) and message.startswith("[Fatal Error]"):
                     # This is a fatal error message so break out of loop to disconnect the client
                     break
-
-                if serverData.clients[clientID].hasTimedOut():
-                    # Check that the client is still around
-                    if pendingPing is None:
-                        pendingPing = await serverData.clients[clientID].socket.ping()
-                        logPrint("Sent keep-alive ping to client #" + str(clientID), 4)
-                        # (When the timeout finishes for a second time pendingPing is checked by the logic below)
-                    elif not pendingPing.done():
-                        logPrint("clientSendTask for client #" + str(clientID) + " exited due to connection timeout", 2)
-                        return
-                    else:
-                        # Pong came back so client is alive
-                        pendingPing = None
-
-                    serverData.clients[clientID].receivedMsg()
             else:
-                await asyncio.sleep(0.05)
+                # Wait for a message to be queued or published on the client's channel (or for a ping to be due)
+                client.wakeUp.clear()
+                await client.wakeUp.wait()
     except websockets.exceptions.ConnectionClosed:
         pass
 
@@ -84,19 +215,32 @@ async def __clientHandler(websocket, path):
     Registers a client and starts the io task(s) for it
     """
     # Check the client's connection path and set API type
-    if path == config.server.apiPaths.viewer:
-        clientType = config.server.clientTypes.viewer
-    elif path == config.server.apiPaths.player:
-        if gameData.playerCount < config.server.maxPlayers:
-            clientType = config.server.clientTypes.player
-        else:
-            # Too many players
-            logPrint("A player tried to connect but the game is full - connection refused", 1)
+    #   (The path can end with a query string like "?arena=name" to pick an arena. See matchmaker.py)
+    path, query = path.partition("?")[::2]
+    if path in __apiPaths:
+        clientType, updateFormat = __apiPaths[path]
+        query = parse_qs(query)
+        arenaName = query.get("arena", [None])[0]
+
+        try:
+            delay, catchUp = __historyOptions(clientType, updateFormat, query)
+        except ValueError as e:
+            logPrint("A client tried to connect with invalid options - connection refused", 1)
+            metrics.increment("pytanks_connections_refused_total", reason="badOptions")
+            await websocket.send("[Fatal Error] " + e.args[0])
+            return  # Returning from this function disconnects the client
+
+        anArena = matchmaker.findArena(clientType, arenaName)
+        if anArena is None:
+            # Too many players or arenas
+            logPrint("A client tried to connect but there's no room for it - connection refused", 1)
+            metrics.increment("pytanks_connections_refused_total", reason="full")
             await websocket.send("[Fatal Error] Server full; please try again later")
             return  # Returning from this function disconnects the client
     else:
         # Invalid client
         logPrint("A client tried to connect using an invalid API path - connection refused", 1)
+        metrics.increment("pytanks_connections_refused_total", reason="badPath")
         await websocket.send("[Fatal Error] Invalid API path - Please update your fork of the player client")
         return  # Returning from this function disconnects the client
 
@@ -111,30 +255,114 @@ async def __clientHandler(websocket, path):
         if clientID not in serverData.clients:
             break
 
-    # Add the client to the dictionary of active clients
-    serverData.clients[clientID] = dataModels.client(websocket, clientType)
+    # Add the client to its arena and the dictionary of active clients and start checking that it stays connected
+    client = dataModels.client(websocket, clientType, updateFormat)
+    client.delay = delay
+    matchmaker.joinArena(anArena, clientID, client)
 
-    logPrint("Client (clientID: " + str(clientID) + ", type: " + serverData.clients[clientID].type + ") connected", 1)
+    if catchUp:
+        gameData.sendViewerStrings(anArena, clientID)
+        client.catchUp.extend(gameData.pastViewerStates(anArena, updateFormat, delay))
+        client.wakeUp.set()
+
+    metrics.increment("pytanks_connections_total", type=clientType)
+    serverData.timers.schedule(client.lastReceived + config.server.timeout, lambda: __checkTimeout(clientID, client))
+
+    logPrint("Client (clientID: " + str(clientID) + ", type: " + serverData.clients[clientID].type + ", arena: " +
+             anArena.name + ") connected", 1)
 
     # Player-only logic
     if serverData.clients[clientID].isPlayer():
-        gameData.playerCount += 1
         asyncio.get_event_loop().create_task(__playerReceiveTask(clientID))
+    elif updateFormat == config.server.updateFormats.delta:
+        asyncio.get_event_loop().create_task(__viewerReceiveTask(clientID))
 
     await __clientSendTask(clientID)
     # (When clientSendTask returns the client's connection has ended or they have been marked for disconnection.)
 
     # Clean up data for this client
-    del serverData.clients[clientID]
-    if clientType == config.server.clientTypes.player:
-        gameData.playerCount -= 1
+    logPrint("Send queue stats for client #" + str(clientID) + ": " + str(client.queueDepth()) + " messages left, " +
+             str(client.conflatedCount) + " updates skipped, " + str(client.droppedCount) + " messages dropped, " +
+             str(client.incoming.droppedCount) + " commands dropped", 2)
+    matchmaker.leaveArena(clientID)
+    metrics.increment("pytanks_disconnections_total", type=clientType)
 
     logPrint("handler for client #" + str(clientID) + " exited (connection closed)", 1)
     # (When this function returns the socket dies)
 
+async def __workerReceiveTask(stream):
+    """
+    Handles the frames coming in from the front-end process when running as a worker
+        Each client the front-end routes here gets the same handler as in single process mode with an ipc.pipeSocket
+        standing in for its websocket.
+    """
+    sockets = dict()    # The pipeSocket for each of the front-end's connections keyed by connID
+
+    async def connectionTask(connID, path):
+        await __clientHandler(sockets[connID], path)
+
+        # Tell the front-end to disconnect the client (if it isn't already gone)
+        if not sockets[connID].isClosed:
+            await stream.send(ipc.closeKind, connID)
+        del sockets[connID]
+
+    while True:
+        frame = await stream.receive()
+        if frame is None:
+            # The front-end process has exited
+            return
+
+        kind, connID, payload = frame
+        if kind == ipc.connectKind:
+            sockets[connID] = ipc.pipeSocket(stream, connID)
+            asyncio.get_event_loop().create_task(connectionTask(connID, payload))
+        elif connID in sockets:
+            sockets[connID].received(kind, payload)
+
+async def __workerStatsTask(stream):
+    """
+    Sends the worker's stats to the front-end process every fpsLogRate seconds
+    """
+    while True:
+        await asyncio.sleep(config.server.fpsLogRate)
+
+        playerCount = matchmaker.playerCount()
+        await stream.send(ipc.statsKind, 0, json.dumps({
+            "players": playerCount,
+            "viewers": len(serverData.clients) - playerCount,
+            "arenas": {name: anArena.playerCount for name, anArena in gameData.arenas.items()},
+            "metrics": metrics.samples()
+        }))
+
+def runWorker(workerIndex, workerSocket):
+    """
+    Runs a worker process's asyncio loop (See workerPool.py)
+        The worker hosts its own arenas for the clients the front-end process routes to it and exits once the
+        front-end closes its end of the socket.
+    :param workerIndex: The worker's index in the pool
+    :param workerSocket: The worker's end of the socket pair connecting it to the front-end
+    """
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    loop = asyncio.get_event_loop()
+
+    serverLogging.prefix = "[Worker " + str(workerIndex) + "] "
+    matchmaker.namePrefix = str(workerIndex) + "-"
+
+    try:
+        reader, writer = loop.run_until_complete(asyncio.open_connection(sock=workerSocket))
+        stream = ipc.ipcStream(reader, writer)
+
+        loop.create_task(gameClock())
+        loop.create_task(__workerStatsTask(stream))
+        loop.run_until_complete(__workerReceiveTask(stream))
+    except KeyboardInterrupt:
+        # Exit cleanly on ctrl-C
+        return
+
 def runServer():
     """
     Starts the sever and asyncio loop
+        If config.server.workerCount is set this process only runs the front-end and the game runs in the workers.
     """
     # Configure websocket server logging
     if config.server.logLevel >= 5:
@@ -144,16 +372,24 @@ def runServer():
         logger.addHandler(logging.StreamHandler())
         asyncio.get_event_loop().set_debug(True)
 
+    if config.server.workerCount > 0:
+        handler = workerPool.frontEndHandler
+        mainTask = workerPool.runWorkers()
+    else:
+        handler = __clientHandler
+        mainTask = gameClock()
+
     # Start the sever and asyncio loop
     try:
         ipAndPort = config.server.ipAndPort.split(":")
-        start_server = websockets.serve(__clientHandler, ipAndPort[0], ipAndPort[1], timeout=3)
+        start_server = websockets.serve(handler, ipAndPort[0], ipAndPort[1], timeout=3)
         asyncio.get_event_loop().run_until_complete(start_server)
+        asyncio.get_event_loop().run_until_complete(metrics.serve())
         logPrint("Server started", 1)
 
-        asyncio.get_event_loop().run_until_complete(gameClock())
+        asyncio.get_event_loop().run_until_complete(mainTask)
     except OSError:
         print("Invalid ip and/or port")
     except KeyboardInterrupt:
         # Exit cleanly on ctrl-C
-        return
\ No newline at end of file
+        return
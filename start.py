@@ -4,6 +4,7 @@ Startup script for the pyTanks server
 Requirements:
     Python 3.5 or newer
     websockets 7.0 (pip install websockets==7.0)
+    numpy (only if config.server.useNumPy is set)
 
 Usage:
     python start.py
@@ -11,6 +12,9 @@ Usage:
     The pyTanks server uses the settings found in config.py to control how the server works. Those values can be
     changed directly or be overridden by appending one or more of these command line args:
         log=n - Overrides the default logging level. (See the usage section of the readme.)
+        workers=n - Runs the game in n worker processes. (See serverLogic/workerPool.py)
+        metrics=ip:port - Overrides where the Prometheus metrics are served. (metrics=off turns them off.)
+        record=dir - Records every game to a file in dir. (See gameLogic/matchRecorder.py. record=off turns it off.)
         ip:port - Overrides the ip and port used to host the server.
 """
 
@@ -33,6 +37,11 @@ def main():
         print("The websockets module is required to run the pyTanks server")
         return
 
+    # Check for numpy if the NumPy shell backend is enabled
+    if config.server.useNumPy and util.find_spec("numpy") is None:
+        print("The numpy module is required when config.server.useNumPy is set")
+        return
+
     # Import the code that requires the above things
     from serverLogic.wsServer import runServer
 
@@ -56,6 +65,22 @@ def main():
             except ValueError:
                 print("Invalid min player count")
                 return
+        elif arg.startswith("workers="):
+            try:
+                num = int(arg[len("workers="):])
+                if num < 0:
+                    print("workers can't be negative")
+                    return
+                config.server.workerCount = num
+            except ValueError:
+                print("Invalid worker count")
+                return
+        elif arg.startswith("metrics="):
+            value = arg[len("metrics="):]
+            config.server.metricsIpAndPort = None if value == "off" else value
+        elif arg.startswith("record="):
+            value = arg[len("record="):]
+            config.server.recordingDir = None if value == "off" else value
         elif ":" in arg:
             config.server.ipAndPort = arg
         else: